@@ -0,0 +1,110 @@
+"""
+Compare wall time and peak RSS of the hybrid writer modes on one template.
+
+    python -m backend.benchmarks.hybrid_writer --pdf form.pdf --schema schema.json \\
+        --values values.json [--runs 20] [--flatten]
+
+`schema.json` holds a serialized FormSchema and `values.json` a {field_id: value} map.
+Each mode runs in a fresh process so peak RSS is attributable to that mode alone.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import time
+from typing import Any
+
+
+class _DiscardStorage:
+    """Storage stand-in that only records output sizes, so disk I/O is not measured."""
+
+    def __init__(self) -> None:
+        self.last_size = 0
+
+    def save_bytes_sync(self, data: bytes, kind: str, suffix: str) -> str:
+        self.last_size = len(data)
+        return f"discard://{kind}/output{suffix}"
+
+
+def _run_mode(
+    mode: str,
+    pdf_path: str,
+    schema_data: dict[str, Any],
+    values: dict[str, Any],
+    runs: int,
+    flatten: bool,
+    results: multiprocessing.Queue,
+) -> None:
+    from backend.services import pdf_writer_hybrid
+    from backend.services.compiled_schema import compiled_schema_cache
+
+    writer = pdf_writer_hybrid._WRITERS[mode]
+    schema = compiled_schema_cache.get(schema_data)
+    storage = _DiscardStorage()
+
+    # Warm the template cache and imports so runs measure the fill itself
+    writer("bench", schema, values, pdf_path, storage, flatten, "bench")
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        writer("bench", schema, values, pdf_path, storage, flatten, "bench")
+        timings.append(time.perf_counter() - start)
+
+    results.put(
+        {
+            "mode": mode,
+            "mean_ms": statistics.mean(timings) * 1000,
+            "p50_ms": statistics.median(timings) * 1000,
+            "max_ms": max(timings) * 1000,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "output_bytes": storage.last_size,
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--schema", required=True)
+    parser.add_argument("--values", required=True)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--flatten", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.schema, encoding="utf-8") as fh:
+        schema_data = json.load(fh)
+    with open(args.values, encoding="utf-8") as fh:
+        values = json.load(fh)
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for mode in ("legacy", "single_pass"):
+        results = ctx.Queue()
+        proc = ctx.Process(
+            target=_run_mode,
+            args=(mode, args.pdf, schema_data, values, args.runs, args.flatten, results),
+        )
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"{'mode':<12} {'mean ms':>10} {'p50 ms':>10} {'max ms':>10} {'peak RSS MB':>12} {'output B':>10}")
+    for row in rows:
+        print(
+            f"{row['mode']:<12} {row['mean_ms']:>10.1f} {row['p50_ms']:>10.1f} {row['max_ms']:>10.1f}"
+            f" {row['peak_rss_mb']:>12.1f} {row['output_bytes']:>10}"
+        )
+    legacy, single = rows
+    print(
+        f"single_pass saves {legacy['p50_ms'] - single['p50_ms']:.1f} ms p50"
+        f" ({1 - single['p50_ms'] / legacy['p50_ms']:.0%}) and"
+        f" {legacy['peak_rss_mb'] - single['peak_rss_mb']:.1f} MB peak RSS"
+    )
+
+
+if __name__ == "__main__":
+    main()
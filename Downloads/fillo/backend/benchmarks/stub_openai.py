@@ -0,0 +1,195 @@
+"""
+Local OpenAI-compatible chat completions server for benchmarking LlmMapper offline.
+
+    python -m backend.benchmarks.stub_openai [--port 8765] [--latency-ms 300] [--token-ms 5]
+
+Point the mapper at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 and any
+OPENAI_API_KEY.  Utterances are mapped deterministically: each clause of the form
+"<field label> is <value>" maps to the candidate field with that label in the
+schema sent (the user turn's schema, or the "Schema:" system message and the
+candidate_fields list); every other clause is reported as unmatched.  Clauses are
+separated by ";" or ",", so values cannot contain either.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+# Characters per token for the usage estimates
+_CHARS_PER_TOKEN = 4
+_CHUNK_CHARS = 12
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // _CHARS_PER_TOKEN)
+
+
+def map_utterance(
+    schema_payload: dict[str, Any],
+    utterance: str,
+    candidate_ids: list[str] | None = None,
+) -> dict[str, Any]:
+    """The {"applied": ..., "unmatched": ...} mapping the stub answers with."""
+    by_label = {
+        str(field.get("label", "")).strip().lower(): field["id"]
+        for field in schema_payload.get("fields", [])
+        if field.get("label") and (candidate_ids is None or field["id"] in candidate_ids)
+    }
+    applied: dict[str, Any] = {}
+    unmatched: list[str] = []
+    for clause in (part.strip() for part in re.split(r"[;,]", utterance)):
+        if not clause:
+            continue
+        label, sep, value = clause.partition(" is ")
+        field_id = by_label.get(label.strip().lower()) if sep else None
+        if field_id is None:
+            unmatched.append(clause)
+        else:
+            applied[field_id] = value.strip()
+    return {"applied": applied, "unmatched": unmatched}
+
+
+class StubState:
+    """Latency settings plus the prompt prefixes seen so far, to report cached tokens."""
+
+    def __init__(self, latency: float, token_latency: float) -> None:
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._prefixes: set[str] = set()
+        self._lock = threading.Lock()
+
+    def usage(self, messages: list[dict[str, str]], completion: str) -> dict[str, Any]:
+        prefix = "".join(message["content"] for message in messages if message["role"] == "system")
+        prompt = "".join(message["content"] for message in messages)
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self._lock:
+            self.requests += 1
+            cached = digest in self._prefixes
+            self._prefixes.add(digest)
+        return {
+            "prompt_tokens": _tokens(prompt),
+            "completion_tokens": _tokens(completion),
+            "total_tokens": _tokens(prompt) + _tokens(completion),
+            "prompt_tokens_details": {"cached_tokens": _tokens(prefix) if cached else 0},
+        }
+
+
+def _handler(state: StubState) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            messages = request["messages"]
+            request_body = json.loads(messages[-1]["content"])
+            schema_payload: dict[str, Any] = request_body.get("schema", {})
+            for message in messages:
+                if message["role"] == "system" and message["content"].startswith("Schema: "):
+                    schema_payload = json.loads(message["content"].removeprefix("Schema: "))
+            content = json.dumps(
+                map_utterance(schema_payload, request_body.get("utterance", ""), request_body.get("candidate_fields")),
+                separators=(",", ":"),
+            )
+            usage = state.usage(messages, content)
+
+            time.sleep(state.latency)
+            base = {
+                "id": f"chatcmpl-stub-{state.requests}",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+            }
+            if request.get("stream"):
+                self._stream(base, content, usage, bool(request.get("stream_options", {}).get("include_usage")))
+            else:
+                time.sleep(state.token_latency * _tokens(content))
+                self._send_json(
+                    {
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": usage,
+                    }
+                )
+
+        def _send_json(self, body: dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, base: dict[str, Any], content: str, usage: dict[str, Any], include_usage: bool) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(payload: dict[str, Any] | str) -> None:
+                text = payload if isinstance(payload, str) else json.dumps({**base, "object": "chat.completion.chunk", **payload})
+                data = f"data: {text}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            for start in range(0, len(content), _CHUNK_CHARS):
+                piece = content[start:start + _CHUNK_CHARS]
+                time.sleep(state.token_latency * _tokens(piece))
+                send({"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}], "usage": None})
+            send({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": None})
+            if include_usage:
+                send({"choices": [], "usage": usage})
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def start_server(
+    port: int = 0,
+    latency: float = 0.3,
+    token_latency: float = 0.005,
+) -> tuple[ThreadingHTTPServer, StubState]:
+    """Serve on 127.0.0.1:`port` (0 picks a free port) from a daemon thread."""
+    state = StubState(latency, token_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server, state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300, help="delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=5, help="delay per completion token")
+    args = parser.parse_args()
+
+    server, _ = start_server(args.port, args.latency_ms / 1000, args.token_ms / 1000)
+    print(f"Stub OpenAI server on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
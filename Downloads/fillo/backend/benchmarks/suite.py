@@ -0,0 +1,289 @@
+"""
+Reproducible writer and mapper benchmarks on synthetic forms, with baseline comparison.
+
+    python -m backend.benchmarks.suite [--forms small,medium,large] [--runs 30] \\
+        [--concurrency 1] [--no-mapper] [--out results.json] \\
+        [--baseline baseline.json [--tolerance 0.15]] [--save-baseline baseline.json]
+
+Every (form, target) pair runs in a fresh process against a local filesystem
+storage in a temporary directory and reports throughput, p50/p99 latency, peak RSS
+and output size.  The mapper targets talk to `stub_openai` on a local port, so they
+measure our side of the round trip plus the stub's fixed latency.
+
+With --baseline, results are compared against a previous run and the exit status
+is 1 if any p50/p99 latency, peak RSS or output size grew by more than the
+tolerance.  Baselines are machine-specific; record one per machine with
+--save-baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from backend.benchmarks.synthetic_form import FormSpec, generate_form, sample_values
+
+FORMS = {
+    "small": FormSpec(pages=1, text_fields=20, checkboxes=6, radios=2),
+    "medium": FormSpec(pages=4, text_fields=80, checkboxes=20, radios=5, kid_groups=4),
+    "large": FormSpec(pages=20, text_fields=400, checkboxes=120, radios=20, kid_groups=10, embed_font=True),
+}
+WRITER_TARGETS = ("pdf_writer", "hybrid_single_pass", "hybrid_legacy")
+MAPPER_TARGETS = ("mapper", "mapper_stream")
+# Metrics where a larger value is a regression
+COMPARED_METRICS = ("p50_ms", "p99_ms", "peak_rss_mb", "output_bytes")
+
+
+class LocalStorage:
+    """Filesystem storage rooted at a directory, with file:// URIs."""
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        self.last_size = 0
+
+    def path_from_uri(self, uri: str) -> Path:
+        return Path(uri.removeprefix("file://"))
+
+    def save_bytes_sync(self, data: bytes, kind: str, suffix: str) -> str:
+        path = self.root / kind / f"{uuid.uuid4().hex}{suffix}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self.last_size = len(data)
+        return f"file://{path}"
+
+
+def _percentile(timings: list[float], q: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def _summarize(timings: list[float], wall: float) -> dict[str, Any]:
+    return {
+        "runs": len(timings),
+        "throughput_per_s": len(timings) / wall if wall else 0.0,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": _percentile(timings, 0.5) * 1000,
+        "p99_ms": _percentile(timings, 0.99) * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+async def _timed_runs(call: Any, runs: int, concurrency: int) -> tuple[list[float], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: list[float] = []
+
+    async def one(run: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await call(run)
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(run) for run in range(runs)))
+    return timings, time.perf_counter() - start
+
+
+async def _bench_writer(target: str, form: dict[str, Any], runs: int, concurrency: int, workdir: str) -> dict[str, Any]:
+    from backend.services import pdf_writer, pdf_writer_hybrid
+    from backend.services.compiled_schema import compiled_schema_cache
+
+    schema = compiled_schema_cache.get(form["schema"])
+    storage = LocalStorage(workdir)
+    orig_uri = f"file://{form['pdf']}"
+    if target == "pdf_writer":
+        write = pdf_writer.write_filled_pdf
+    else:
+        mode = target.removeprefix("hybrid_")
+
+        async def write(*args: Any, **kwargs: Any) -> str:
+            return await pdf_writer_hybrid.write_filled_pdf(*args, mode=mode, **kwargs)
+
+    async def call(_: int) -> None:
+        uri = await write("bench", schema, form["values"], orig_uri, storage, flatten=True)
+        storage.path_from_uri(uri).unlink()
+
+    # Warm the template cache and imports so runs measure the fill itself
+    await call(-1)
+    timings, wall = await _timed_runs(call, runs, concurrency)
+    return {**_summarize(timings, wall), "output_bytes": storage.last_size}
+
+
+async def _bench_mapper(target: str, form: dict[str, Any], runs: int, concurrency: int) -> dict[str, Any]:
+    from backend.services.compiled_schema import compiled_schema_cache
+    from backend.services.instrumentation import metrics
+    from backend.services.llm_mapper import LlmMapper
+
+    schema = compiled_schema_cache.get(form["schema"])
+    mapper = LlmMapper()
+    text_fields = [field for field in schema.fields if field.type == "text"][:40]
+    mapped = 0
+
+    async def call(run: int) -> None:
+        nonlocal mapped
+        # A distinct utterance per run so the mapping cache never answers
+        picked = [text_fields[(run * 7 + offset) % len(text_fields)] for offset in range(5)]
+        utterance = "; ".join(f"{field.label} is value {run}-{offset}" for offset, field in enumerate(picked))
+        if target == "mapper_stream":
+            async def ignore(values: dict[str, Any]) -> None:
+                pass
+
+            result = await mapper.stream_values(schema, {}, utterance, ignore)
+            mapped += len(result.applied)
+        else:
+            applied, _ = await mapper.map_values(schema, {}, utterance)
+            mapped += len(applied)
+
+    await call(-1)
+    metrics.reset()
+    mapped = 0
+    timings, wall = await _timed_runs(call, runs, concurrency)
+    return {
+        **_summarize(timings, wall),
+        "fields_mapped": mapped,
+        "counters": metrics.snapshot()["counters"],
+    }
+
+
+def _run_target(
+    target: str,
+    form: dict[str, Any],
+    runs: int,
+    concurrency: int,
+    workdir: str,
+    stub_url: str,
+    results: multiprocessing.Queue,
+) -> None:
+    os.environ["OPENAI_BASE_URL"] = stub_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    if target in MAPPER_TARGETS:
+        result = asyncio.run(_bench_mapper(target, form, runs, concurrency))
+    else:
+        result = asyncio.run(_bench_writer(target, form, runs, concurrency, workdir))
+    results.put(result)
+
+
+def run_suite(
+    form_names: list[str],
+    runs: int,
+    concurrency: int,
+    include_mapper: bool,
+) -> dict[str, Any]:
+    from backend.benchmarks.stub_openai import start_server
+
+    server, _ = start_server()
+    stub_url = f"http://127.0.0.1:{server.server_port}/v1"
+    ctx = multiprocessing.get_context("spawn")
+    results: dict[str, Any] = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="fillo-bench-") as workdir:
+            for name in form_names:
+                spec = FORMS[name]
+                pdf_path = os.path.join(workdir, f"{name}.pdf")
+                schema_data = generate_form(spec, pdf_path)
+                form = {"pdf": pdf_path, "schema": schema_data, "values": sample_values(schema_data)}
+                targets = WRITER_TARGETS + (MAPPER_TARGETS if include_mapper and name == form_names[0] else ())
+                for target in targets:
+                    queue = ctx.Queue()
+                    proc = ctx.Process(
+                        target=_run_target,
+                        args=(target, form, runs, concurrency, workdir, stub_url, queue),
+                    )
+                    proc.start()
+                    results[f"{name}/{target}"] = queue.get()
+                    proc.join()
+    finally:
+        server.shutdown()
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pdf_executor": os.getenv("PDF_EXECUTOR", "thread"),
+            "save_profile": os.getenv("PDF_SAVE_PROFILE", "delivery"),
+            "runs": runs,
+            "concurrency": concurrency,
+        },
+        "forms": {name: asdict(FORMS[name]) for name in form_names},
+        "results": results,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Print current vs baseline per benchmark and return the regressions found."""
+    regressions = []
+    print(f"\n{'benchmark':<30} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, result in current["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None:
+            print(f"{key:<30} (not in baseline)")
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in result or not previous.get(metric):
+                continue
+            change = result[metric] / previous[metric] - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            print(f"{key:<30} {metric:<12} {previous[metric]:>12.1f} {result[metric]:>12.1f} {change:>+8.0%}{flag}")
+            if flag:
+                regressions.append(f"{key} {metric} {change:+.0%}")
+    return regressions
+
+
+def _print_results(suite: dict[str, Any]) -> None:
+    print(
+        f"{'benchmark':<30} {'ops/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12} {'output B':>10}"
+    )
+    for key, row in suite["results"].items():
+        print(
+            f"{key:<30} {row['throughput_per_s']:>8.1f} {row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+            f" {row['peak_rss_mb']:>12.1f} {row.get('output_bytes', '-'):>10}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--forms", default="small,medium,large")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--no-mapper", action="store_true")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against a stored results file")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--save-baseline", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    form_names = [name.strip() for name in args.forms.split(",") if name.strip()]
+    unknown = sorted(set(form_names) - set(FORMS))
+    if unknown:
+        parser.error(f"unknown form(s) {unknown}; choose from {sorted(FORMS)}")
+
+    suite = run_suite(form_names, args.runs, args.concurrency, not args.no_mapper)
+    _print_results(suite)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(suite, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(suite, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Generate synthetic fillable PDFs (and their schema and sample values) for benchmarks.
+
+    python -m backend.benchmarks.synthetic_form --out /tmp/bench/form \\
+        [--pages 4] [--text 80] [--checkboxes 20] [--radios 5] [--kids 4] [--embed-font]
+
+Writes form.pdf, form.schema.json and form.values.json.  Generation is deterministic:
+the same options always give the same bytes, so timings stay comparable over time.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+from dataclasses import dataclass
+from typing import Any
+
+import pikepdf
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+_MARGIN = 54
+_ROW_HEIGHT = 26
+_ROWS_PER_PAGE = (PAGE_HEIGHT - 2 * _MARGIN) // _ROW_HEIGHT
+_COLUMNS = 2
+
+_RADIO_FLAG = 1 << 15
+_NO_TOGGLE_TO_OFF_FLAG = 1 << 14
+
+
+@dataclass
+class FormSpec:
+    pages: int = 4
+    text_fields: int = 80
+    checkboxes: int = 20
+    radios: int = 5
+    radio_options: int = 3
+    # Text fields are nested under this many parent fields via /Kids (0 keeps them flat)
+    kid_groups: int = 0
+    embed_font: bool = False
+
+    @property
+    def slots(self) -> int:
+        return self.text_fields + self.checkboxes + self.radios * self.radio_options
+
+    def capacity(self) -> int:
+        return self.pages * _ROWS_PER_PAGE * _COLUMNS
+
+
+def _vera_path() -> str:
+    import reportlab
+
+    return os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")
+
+
+def _embedded_font(pdf: pikepdf.Pdf) -> pikepdf.Dictionary:
+    """A TrueType font dictionary with the font program embedded as /FontFile2."""
+    from reportlab.pdfbase.ttfonts import TTFontFile
+
+    path = _vera_path()
+    face = TTFontFile(path)
+    with open(path, "rb") as fh:
+        data = fh.read()
+    font_file = pikepdf.Stream(pdf, data)
+    font_file.Length1 = len(data)
+    descriptor = pikepdf.Dictionary(
+        Type=pikepdf.Name.FontDescriptor,
+        FontName=pikepdf.Name("/" + face.name.decode("ascii")),
+        Flags=32,
+        FontBBox=[round(value) for value in face.bbox],
+        ItalicAngle=face.italicAngle,
+        Ascent=round(face.ascent),
+        Descent=round(face.descent),
+        CapHeight=round(face.capHeight),
+        StemV=face.stemV,
+        FontFile2=font_file,
+    )
+    widths = [round(face.charWidths.get(code, face.defaultWidth)) for code in range(32, 127)]
+    return pdf.make_indirect(
+        pikepdf.Dictionary(
+            Type=pikepdf.Name.Font,
+            Subtype=pikepdf.Name.TrueType,
+            BaseFont=pikepdf.Name("/" + face.name.decode("ascii")),
+            FirstChar=32,
+            LastChar=126,
+            Widths=widths,
+            Encoding=pikepdf.Name.WinAnsiEncoding,
+            FontDescriptor=pdf.make_indirect(descriptor),
+        )
+    )
+
+
+def _standard_font(pdf: pikepdf.Pdf, base_font: str) -> pikepdf.Dictionary:
+    return pdf.make_indirect(
+        pikepdf.Dictionary(
+            Type=pikepdf.Name.Font,
+            Subtype=pikepdf.Name.Type1,
+            BaseFont=pikepdf.Name("/" + base_font),
+            Encoding=pikepdf.Name.WinAnsiEncoding,
+        )
+    )
+
+
+def _check_appearances(pdf: pikepdf.Pdf, zapf: pikepdf.Dictionary, on_state: str, size: float) -> pikepdf.Dictionary:
+    resources = pikepdf.Dictionary(Font=pikepdf.Dictionary(ZaDb=zapf))
+    bbox = [0, 0, size, size]
+    font_size = size * 0.8
+    on = pikepdf.Stream(
+        pdf,
+        f"q 0 g BT /ZaDb {font_size:.2f} Tf {size * 0.15:.2f} {size * 0.2:.2f} Td (4) Tj ET Q".encode("ascii"),
+    )
+    off = pikepdf.Stream(pdf, b"")
+    for stream in (on, off):
+        stream.Type = pikepdf.Name.XObject
+        stream.Subtype = pikepdf.Name.Form
+        stream.BBox = bbox
+        stream.Resources = resources
+    return pikepdf.Dictionary({"/" + on_state: on, "/Off": off})
+
+
+def _slot_rect(slot: int, width: float, height: float = 16) -> tuple[int, list[float]]:
+    """Page number (1-based) and rect of the n-th layout slot."""
+    per_page = _ROWS_PER_PAGE * _COLUMNS
+    page = slot // per_page + 1
+    row, column = divmod(slot % per_page, _COLUMNS)
+    x = _MARGIN + column * (PAGE_WIDTH - 2 * _MARGIN) / _COLUMNS + 90
+    y = PAGE_HEIGHT - _MARGIN - (row + 1) * _ROW_HEIGHT
+    return page, [x, y, x + width, y + height]
+
+
+def _label_ops(label: str, rect: list[float], font_name: str) -> str:
+    escaped = label.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"BT /{font_name} 9 Tf {rect[0] - 88:.2f} {rect[1] + 4:.2f} Td ({escaped}) Tj ET\n"
+
+
+def generate_form(spec: FormSpec, out_path: str) -> dict[str, Any]:
+    """
+    Write a fillable PDF built from `spec` to `out_path` and return its schema as a
+    serialized FormSchema ({"fields": [...]}).
+
+    Text fields are laid out first, then checkboxes, then radio groups, two columns
+    per page.  With `kid_groups`, text fields become /Kids of parent fields named
+    "section_NN"; with `embed_font`, labels and field text use an embedded TrueType
+    font instead of Helvetica.
+    """
+    if spec.slots > spec.capacity():
+        raise ValueError(
+            f"{spec.slots} widgets do not fit on {spec.pages} page(s); at most {spec.capacity()}"
+        )
+
+    pdf = pikepdf.new()
+    font_name = "Vera" if spec.embed_font else "Helv"
+    font = _embedded_font(pdf) if spec.embed_font else _standard_font(pdf, "Helvetica")
+    zapf = _standard_font(pdf, "ZapfDingbats")
+    default_appearance = f"/{font_name} 10 Tf 0 g"
+
+    pages = []
+    for _ in range(spec.pages):
+        page = pdf.add_blank_page(page_size=(PAGE_WIDTH, PAGE_HEIGHT))
+        page.obj.Resources = pikepdf.Dictionary(Font=pikepdf.Dictionary({"/" + font_name: font}))
+        page.obj.Annots = pdf.make_indirect(pikepdf.Array())
+        pages.append(page)
+    labels: list[list[str]] = [[] for _ in pages]
+
+    fields_out: list[dict[str, Any]] = []
+    top_level = pikepdf.Array()
+    parents = [
+        pdf.make_indirect(pikepdf.Dictionary(T=f"section_{group + 1:02d}", FT=pikepdf.Name.Tx, Kids=pikepdf.Array()))
+        for group in range(spec.kid_groups)
+    ]
+    top_level.extend(parents)
+
+    def add_widget(widget: pikepdf.Dictionary, page_number: int, label: str, rect: list[float]) -> pikepdf.Dictionary:
+        page = pages[page_number - 1]
+        widget.Type = pikepdf.Name.Annot
+        widget.Subtype = pikepdf.Name.Widget
+        widget.Rect = rect
+        widget.F = 4
+        widget.P = page.obj
+        widget = pdf.make_indirect(widget)
+        page.obj.Annots.append(widget)
+        labels[page_number - 1].append(_label_ops(label, rect, font_name))
+        return widget
+
+    slot = 0
+    for number in range(1, spec.text_fields + 1):
+        field_id = f"text_{number:04d}"
+        label = f"Text field {number}"
+        page_number, rect = _slot_rect(slot, 160)
+        slot += 1
+        widget = add_widget(
+            pikepdf.Dictionary(T=field_id, TU=label, FT=pikepdf.Name.Tx, DA=default_appearance),
+            page_number,
+            label,
+            rect,
+        )
+        if parents:
+            parent = parents[(number - 1) % len(parents)]
+            widget.Parent = parent
+            parent.Kids.append(widget)
+        else:
+            top_level.append(widget)
+        fields_out.append({"id": field_id, "label": label, "type": "text", "page": page_number, "rect": rect})
+
+    for number in range(1, spec.checkboxes + 1):
+        field_id = f"check_{number:04d}"
+        label = f"Checkbox {number}"
+        page_number, rect = _slot_rect(slot, 14, 14)
+        slot += 1
+        widget = add_widget(
+            pikepdf.Dictionary(
+                T=field_id,
+                TU=label,
+                FT=pikepdf.Name.Btn,
+                V=pikepdf.Name.Off,
+                AS=pikepdf.Name.Off,
+                AP=pikepdf.Dictionary(N=_check_appearances(pdf, zapf, "Yes", 14)),
+            ),
+            page_number,
+            label,
+            rect,
+        )
+        top_level.append(widget)
+        fields_out.append({"id": field_id, "label": label, "type": "checkbox", "page": page_number, "rect": rect})
+
+    for number in range(1, spec.radios + 1):
+        field_id = f"radio_{number:04d}"
+        group = pdf.make_indirect(
+            pikepdf.Dictionary(
+                T=field_id,
+                TU=f"Radio group {number}",
+                FT=pikepdf.Name.Btn,
+                Ff=_RADIO_FLAG | _NO_TOGGLE_TO_OFF_FLAG,
+                V=pikepdf.Name.Off,
+                Kids=pikepdf.Array(),
+            )
+        )
+        top_level.append(group)
+        for option in range(1, spec.radio_options + 1):
+            label = f"Radio {number} option {option}"
+            page_number, rect = _slot_rect(slot, 14, 14)
+            slot += 1
+            widget = add_widget(
+                pikepdf.Dictionary(
+                    Parent=group,
+                    AS=pikepdf.Name.Off,
+                    AP=pikepdf.Dictionary(N=_check_appearances(pdf, zapf, f"Choice{option}", 14)),
+                ),
+                page_number,
+                label,
+                rect,
+            )
+            group.Kids.append(widget)
+            if option == 1:
+                fields_out.append(
+                    {"id": field_id, "label": f"Radio group {number}", "type": "radio", "page": page_number, "rect": rect}
+                )
+
+    for page, page_labels in zip(pages, labels):
+        page.contents_add(pikepdf.Stream(pdf, "".join(page_labels).encode("latin-1")))
+
+    pdf.Root.AcroForm = pdf.make_indirect(
+        pikepdf.Dictionary(
+            Fields=top_level,
+            DA=default_appearance,
+            DR=pikepdf.Dictionary(Font=pikepdf.Dictionary({"/" + font_name: font, "/ZaDb": zapf})),
+        )
+    )
+    pdf.save(out_path, deterministic_id=True)
+    return {"fields": fields_out}
+
+
+def sample_values(schema_data: dict[str, Any], fill_ratio: float = 1.0, seed: int = 0) -> dict[str, Any]:
+    """A deterministic {field_id: value} map covering `fill_ratio` of the schema's fields."""
+    rng = random.Random(seed)
+    values: dict[str, Any] = {}
+    for field in schema_data["fields"]:
+        if rng.random() >= fill_ratio:
+            continue
+        if field["type"] in {"checkbox", "radio"}:
+            values[field["id"]] = rng.random() < 0.5
+        else:
+            values[field["id"]] = f"{field['label']} value {rng.randrange(10_000)}"
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True, help="output path prefix")
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--text", type=int, default=80)
+    parser.add_argument("--checkboxes", type=int, default=20)
+    parser.add_argument("--radios", type=int, default=5)
+    parser.add_argument("--kids", type=int, default=0, help="number of /Kids parent fields")
+    parser.add_argument("--embed-font", action="store_true")
+    parser.add_argument("--fill-ratio", type=float, default=1.0)
+    args = parser.parse_args()
+
+    spec = FormSpec(
+        pages=args.pages,
+        text_fields=args.text,
+        checkboxes=args.checkboxes,
+        radios=args.radios,
+        kid_groups=args.kids,
+        embed_font=args.embed_font,
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    schema_data = generate_form(spec, f"{args.out}.pdf")
+    with open(f"{args.out}.schema.json", "w", encoding="utf-8") as fh:
+        json.dump(schema_data, fh, indent=2)
+    with open(f"{args.out}.values.json", "w", encoding="utf-8") as fh:
+        json.dump(sample_values(schema_data, args.fill_ratio), fh, indent=2)
+    print(f"Wrote {args.out}.pdf with {len(schema_data['fields'])} schema fields")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, Text, Uuid, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from backend.models.form import Form
+
+
+# Mapped on the same registry, so it shares Form's metadata and create_all
+@Form.registry.mapped
+class FillJob:
+    """
+    A queued /fill: the PDF for a form's values at run time, produced by a worker.
+
+    status moves queued -> running -> succeeded | failed; a running job whose lease
+    expires (worker crashed or hung) is claimable again.  Failed attempts go back to
+    queued with a backoff until max_attempts is reached.
+    """
+
+    __tablename__ = "fill_jobs"
+    __table_args__ = (
+        # The claim query: runnable jobs by priority, oldest first
+        Index("ix_fill_jobs_claim", "status", "priority", "run_after"),
+        # At most one queued keyless job per form and flatten setting; concurrent
+        # keyless requests coalesce onto it (see fill_jobs.enqueue_fill)
+        Index(
+            "uq_fill_jobs_queued",
+            "form_id",
+            "flatten",
+            unique=True,
+            postgresql_where=text("status = 'queued' AND idempotency_key IS NULL"),
+            sqlite_where=text("status = 'queued' AND idempotency_key IS NULL"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    form_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("forms.id", ondelete="CASCADE"), index=True)
+    flatten: Mapped[bool] = mapped_column(Boolean, default=True)
+    status: Mapped[str] = mapped_column(String(16), default="queued")
+    # Higher runs first
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    idempotency_key: Mapped[str | None] = mapped_column(String(255), unique=True, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    worker_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    filled_pdf_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import uuid
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.form import Form
+from backend.schemas.batch_schema import BatchFillRequest, BatchProgressResponse
+from backend.services.batch_fill import (
+    BATCH_MAX_ROWS,
+    batch_registry,
+    rows_from_csv,
+    stream_merged_pdf,
+    stream_zip,
+    unmatched_keys,
+)
+from backend.services.compiled_schema import CompiledSchema, compiled_schema_cache
+from backend.services.db import get_session
+from backend.services.pdf_executor import PdfExecutorBusy, PdfTaskTimeout, pdf_executor
+from backend.services.storage import storage_service
+from backend.services.template_cache import template_cache
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+async def _load_form(form_id: str, db: AsyncSession) -> Form:
+    try:
+        form_uuid = uuid.UUID(form_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid form_id") from exc
+
+    form_result = await db.execute(select(Form).where(Form.id == form_uuid))
+    form_row = form_result.scalar_one_or_none()
+    if not form_row:
+        raise HTTPException(status_code=404, detail="Form not found")
+    return form_row
+
+
+async def _start_batch(
+    form_row: Form,
+    schema: CompiledSchema,
+    rows: list[dict[str, Any]],
+    output: str,
+    flatten: bool,
+    include_current_values: bool,
+    unmatched: list[str],
+) -> StreamingResponse:
+    if not rows:
+        raise HTTPException(status_code=400, detail="Batch has no rows")
+    if len(rows) > BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"Batch exceeds the {BATCH_MAX_ROWS} row limit"
+        )
+    if include_current_values:
+        base_values = form_row.current_values or {}
+        rows = [{**base_values, **row} for row in rows]
+
+    # Parse the template once up front; every row then reuses the cached entry
+    orig_path = str(storage_service.path_from_uri(form_row.orig_pdf_url))
+    try:
+        await pdf_executor.run(template_cache.get, orig_path)
+    except PdfExecutorBusy as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="PDF workers are busy, try again shortly",
+            headers={"Retry-After": "2"},
+        ) from exc
+    except PdfTaskTimeout as exc:
+        raise HTTPException(status_code=504, detail="PDF generation timed out") from exc
+
+    form_id = str(form_row.id)
+    progress = batch_registry.create(form_id, output, len(rows), unmatched)
+    logger.info("Batch %s: %d rows for form %s as %s", progress.batch_id, len(rows), form_id, output)
+    if output == "pdf":
+        body = stream_merged_pdf(progress, schema, rows, orig_path, flatten)
+        media_type, filename = "application/pdf", f"{form_id}-batch.pdf"
+    else:
+        body = stream_zip(progress, schema, rows, orig_path, flatten)
+        media_type, filename = "application/zip", f"{form_id}-batch.zip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "X-Batch-Id": progress.batch_id,
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        },
+    )
+
+
+@router.post("/fill/batch")
+async def fill_batch(
+    payload: BatchFillRequest,
+    db: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    form_row = await _load_form(payload.form_id, db)
+    schema = compiled_schema_cache.get(form_row.parsed_schema)
+    return await _start_batch(
+        form_row,
+        schema,
+        payload.rows,
+        payload.output,
+        payload.flatten,
+        payload.include_current_values,
+        unmatched_keys(schema, payload.rows),
+    )
+
+
+@router.post("/fill/batch/csv")
+async def fill_batch_csv(
+    form_id: str,
+    file: UploadFile = File(...),
+    output: Literal["zip", "pdf"] = "zip",
+    flatten: bool = True,
+    include_current_values: bool = False,
+    db: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    form_row = await _load_form(form_id, db)
+    schema = compiled_schema_cache.get(form_row.parsed_schema)
+    try:
+        rows, unmatched = rows_from_csv(await file.read(), schema)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {exc}") from exc
+    return await _start_batch(
+        form_row, schema, rows, output, flatten, include_current_values, unmatched
+    )
+
+
+@router.get("/fill/batch/{batch_id}", response_model=BatchProgressResponse)
+async def batch_progress(batch_id: str) -> BatchProgressResponse:
+    progress = batch_registry.get(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return BatchProgressResponse.model_validate(progress.snapshot())
+
+
+@router.get("/fill/batch/{batch_id}/events")
+async def batch_events(batch_id: str) -> StreamingResponse:
+    """Server-sent events: one progress snapshot per update until the batch is done."""
+    progress = batch_registry.get(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    async def events():
+        while True:
+            yield f"data: {json.dumps(progress.snapshot())}\n\n"
+            if progress.done:
+                return
+            await progress.wait_changed(15)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -1,56 +1,198 @@
 from __future__ import annotations
 
-import asyncio
 import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.models.fill_job import FillJob
 from backend.models.form import Form
-from backend.schemas.form_schema import FillRequest, FillResponse, FormSchema
-from backend.services import pdf_writer_hybrid as pdf_writer
+from backend.schemas.fill_job_schema import FillJobResponse
+from backend.schemas.form_schema import FillRequest, FillResponse
+from backend.services.compiled_schema import compiled_schema_cache
 from backend.services.db import get_session
-from backend.services.preview_refresh import refresh_preview
+from backend.services.fill_cache import fill_result_cache
+from backend.services.fill_jobs import FILL_MODE, IdempotencyConflict, enqueue_fill, get_job
+from backend.services.form_fill import produce_filled_pdf
+from backend.services.instrumentation import configure_logging, span
+from backend.services.pdf_executor import PdfExecutorBusy, PdfTaskTimeout, pdf_executor
+from backend.services.pdf_incremental import iter_incremental
+from backend.services.preview_scheduler import preview_scheduler
 from backend.services.storage import storage_service
 
-router = APIRouter()
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Configure logging and warm the PDF executor before the first fill; merged into
+    the app's lifespan.
+    """
+    configure_logging()
+    await pdf_executor.start()
+    try:
+        yield
+    finally:
+        pdf_executor.shutdown()
+
+
+router = APIRouter(lifespan=_lifespan)
 
 
-@router.post("/fill", response_model=FillResponse)
+def _job_response(job: FillJob) -> FillJobResponse:
+    return FillJobResponse(
+        job_id=str(job.id),
+        form_id=str(job.form_id),
+        status=job.status,
+        priority=job.priority,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        filled_pdf_url=job.filled_pdf_url,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+@router.post(
+    "/fill",
+    response_model=FillResponse,
+    responses={202: {"model": FillJobResponse, "description": "Fill queued as a job"}},
+)
 async def fill_form(
     payload: FillRequest,
+    mode: Literal["sync", "job"] | None = None,
+    priority: int = 0,
+    idempotency_key: str | None = Header(default=None, max_length=255),
     db: AsyncSession = Depends(get_session),
-) -> FillResponse:
+) -> FillResponse | JSONResponse:
+    """
+    Fill the form's PDF in the request ("sync"), or with mode=job (FILL_MODE sets the
+    default) queue it for the fill workers and answer 202 with the job right away.
+    Job status is at GET /fill/jobs/{job_id} and is also pushed over the preview
+    channel.  In job mode, higher `priority` runs first and a repeated
+    Idempotency-Key header returns the job created with it (409 if that job was for
+    another form or flatten setting).
+    """
     try:
         form_uuid = uuid.UUID(payload.form_id)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail="Invalid form_id") from exc
 
-    form_stmt = select(Form).where(Form.id == form_uuid)
-    form_result = await db.execute(form_stmt)
-    form_row = form_result.scalar_one_or_none()
+    with span("fill.db_load"):
+        form_stmt = select(Form).where(Form.id == form_uuid)
+        form_result = await db.execute(form_stmt)
+        form_row = form_result.scalar_one_or_none()
     if not form_row:
         raise HTTPException(status_code=404, detail="Form not found")
 
-    schema = FormSchema.model_validate(form_row.parsed_schema)
-    filled_pdf_uri = await pdf_writer.write_filled_pdf(
-        payload.form_id,
-        schema,
-        form_row.current_values or {},
-        form_row.orig_pdf_url,
-        storage_service,
-        flatten=payload.flatten,
-    )
+    if (mode or FILL_MODE) == "job":
+        try:
+            with span("fill.enqueue"):
+                job, _ = await enqueue_fill(
+                    db,
+                    form_uuid,
+                    flatten=payload.flatten,
+                    priority=priority,
+                    idempotency_key=idempotency_key,
+                )
+        except IdempotencyConflict as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+        return JSONResponse(status_code=202, content=_job_response(job).model_dump(mode="json"))
+
+    with span("fill.schema"):
+        schema = compiled_schema_cache.get(form_row.parsed_schema)
+    current_values = form_row.current_values or {}
+    try:
+        key, filled_pdf_uri, preview_source = await produce_filled_pdf(
+            payload.form_id, schema, current_values, form_row.orig_pdf_url, payload.flatten
+        )
+    except PdfExecutorBusy as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="PDF workers are busy, try again shortly",
+            headers={"Retry-After": "2"},
+        ) from exc
+    except PdfTaskTimeout as exc:
+        raise HTTPException(status_code=504, detail="PDF generation timed out") from exc
 
+    previous_uri = form_row.filled_pdf_url
     form_row.filled_pdf_url = filled_pdf_uri
     form_row.status = "filled"
-    db.add(form_row)
-    await db.commit()
-    await db.refresh(form_row)
+    try:
+        with span("fill.db_commit"):
+            db.add(form_row)
+            await db.commit()
+            await db.refresh(form_row)
+    except BaseException:
+        fill_result_cache.release(filled_pdf_uri, storage_service)
+        raise
+    fill_result_cache.record(payload.form_id, key, filled_pdf_uri, previous_uri, storage_service)
 
-    asyncio.create_task(
-        refresh_preview(payload.form_id, schema, form_row.current_values or {}, form_row.orig_pdf_url)
+    # Rendered after the response, from the document this fill already produced
+    preview_scheduler.schedule(
+        payload.form_id, schema, current_values, form_row.orig_pdf_url, preview_source
     )
 
     return FillResponse(filled_pdf_url=filled_pdf_uri, status=form_row.status)
+
+
+@router.get("/fill/jobs/{job_id}", response_model=FillJobResponse)
+async def fill_job_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_session),
+) -> FillJobResponse:
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid job_id") from exc
+
+    job = await get_job(db, job_uuid)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Fill job not found")
+    return _job_response(job)
+
+
+@router.get("/fill/{form_id}/pdf")
+async def download_filled_pdf(
+    form_id: str,
+    db: AsyncSession = Depends(get_session),
+) -> Response:
+    """
+    Stream the form's filled PDF from storage in chunks; the file is never read into
+    memory as a whole.  A stored incremental delta is streamed as the template
+    followed by the delta, which is the complete PDF.
+    """
+    try:
+        form_uuid = uuid.UUID(form_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid form_id") from exc
+
+    form_result = await db.execute(select(Form).where(Form.id == form_uuid))
+    form_row = form_result.scalar_one_or_none()
+    if not form_row:
+        raise HTTPException(status_code=404, detail="Form not found")
+    if not form_row.filled_pdf_url:
+        raise HTTPException(status_code=404, detail="Form has not been filled yet")
+
+    filename = f"{form_id}-filled.pdf"
+    path = Path(storage_service.path_from_uri(form_row.filled_pdf_url))
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Filled PDF is no longer stored")
+    if path.suffix != ".pdfdelta":
+        return FileResponse(path, media_type="application/pdf", filename=filename)
+
+    orig_path = Path(storage_service.path_from_uri(form_row.orig_pdf_url))
+    return StreamingResponse(
+        iter_incremental(orig_path, path),
+        media_type="application/pdf",
+        headers={
+            "Content-Length": str(orig_path.stat().st_size + path.stat().st_size),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        },
+    )
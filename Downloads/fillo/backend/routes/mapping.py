@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.form import Form
+from backend.schemas.mapping_schema import MapStreamRequest
+from backend.services.compiled_schema import compiled_schema_cache
+from backend.services.db import get_session
+from backend.services.llm_mapper import MappingResult
+from backend.services.mapping_preview import stream_mapping_to_preview
+from backend.services.preview_scheduler import preview_scheduler
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+session_scope = asynccontextmanager(get_session)
+
+
+def _event(payload: dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload, default=str)}\n\n"
+
+
+@router.post("/map/stream")
+async def map_stream(
+    payload: MapStreamRequest,
+    db: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    """
+    Append-mode mapping as server-sent events.  Each `values` event carries fields
+    as the model produces them (the same batches go out on the preview channel);
+    the closing `result` event has the shape of a /map response plus the saved
+    `current_values`, and is sent once the values are stored and the rendered
+    preview is scheduled.  A failure ends the stream with an `error` event.
+    """
+    try:
+        form_uuid = uuid.UUID(payload.form_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid form_id") from exc
+    form_row = (await db.execute(select(Form).where(Form.id == form_uuid))).scalar_one_or_none()
+    if not form_row:
+        raise HTTPException(status_code=404, detail="Form not found")
+    form_id = str(form_row.id)
+    schema = compiled_schema_cache.get(form_row.parsed_schema)
+    current_values = form_row.current_values or {}
+    orig_pdf_uri = form_row.orig_pdf_url
+
+    async def events() -> AsyncIterator[str]:
+        queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+        async def run() -> MappingResult:
+            try:
+                return await stream_mapping_to_preview(
+                    form_id, schema, current_values, payload.text, queue.put
+                )
+            finally:
+                queue.put_nowait(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while (values := await queue.get()) is not None:
+                yield _event({"type": "values", "values": values})
+            try:
+                result = await task
+                async with session_scope() as session:
+                    row = (
+                        await session.execute(select(Form).where(Form.id == form_uuid))
+                    ).scalar_one_or_none()
+                    if row is None:
+                        raise LookupError(f"Form {form_id} not found")
+                    # Layer over the stored values, not the ones read before mapping
+                    merged = {**(row.current_values or {}), **result.applied}
+                    row.current_values = merged
+                    await session.commit()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Streamed mapping failed for form %s", form_id)
+                yield _event({"type": "error", "detail": str(exc)})
+                return
+            preview_scheduler.schedule(form_id, schema, merged, orig_pdf_uri)
+            yield _event(
+                {
+                    "type": "result",
+                    "applied_values": result.applied,
+                    "unmatched_entities": result.unmatched,
+                    "current_values": merged,
+                }
+            )
+        finally:
+            # The client went away mid-stream: stop the completion
+            task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
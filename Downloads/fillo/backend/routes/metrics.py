@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter
+
+from backend.services.compiled_schema import compiled_schema_cache
+from backend.services.fill_cache import fill_result_cache
+from backend.services.fill_worker import fill_worker
+from backend.services.instrumentation import metrics
+from backend.services.llm_mapper import mapping_cache
+from backend.services.pdf_executor import pdf_executor
+from backend.services.preview_pages import page_preview_cache
+from backend.services.preview_scheduler import preview_scheduler
+from backend.services.template_cache import template_cache
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics() -> dict[str, Any]:
+    """
+    Per-stage latency histograms and counters, plus cache, executor, preview
+    scheduler and in-process fill worker statistics.  With the process executor
+    backend, spans recorded inside workers (writer.*, preview.render) are not
+    included.
+    """
+    return {
+        **metrics.snapshot(),
+        "caches": {
+            "template": template_cache.stats(),
+            "fill_result": fill_result_cache.stats(),
+            "page_preview": page_preview_cache.stats(),
+            "mapping": mapping_cache.stats(),
+            "compiled_schema": compiled_schema_cache.stats(),
+        },
+        "pdf_executor": pdf_executor.metrics(),
+        "preview_scheduler": preview_scheduler.metrics(),
+        "fill_worker": fill_worker.metrics(),
+    }
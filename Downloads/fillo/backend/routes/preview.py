@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
+
+from backend.services.preview_pages import page_preview_cache
+
+router = APIRouter()
+
+
+@router.get("/preview/{form_id}/state")
+async def preview_state(form_id: str) -> dict[str, Any]:
+    """
+    The full preview last broadcast for a form: page URIs, values and the sequence
+    number of that broadcast.  Clients load this when they connect, or when a delta
+    arrives whose base_sequence is not the last sequence they applied, then apply
+    deltas from there.
+    """
+    state = page_preview_cache.broadcast_state(form_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No preview broadcast for this form yet")
+    return state
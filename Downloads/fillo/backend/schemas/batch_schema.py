@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field
+
+
+class BatchFillRequest(BaseModel):
+    form_id: str
+    rows: list[dict[str, Any]] = Field(min_length=1)
+    output: Literal["zip", "pdf"] = "zip"
+    flatten: bool = True
+    # Layer each row over the form's saved values instead of starting empty
+    include_current_values: bool = False
+
+
+class BatchRowError(BaseModel):
+    row: int
+    error: str
+
+
+class BatchProgressResponse(BaseModel):
+    batch_id: str
+    form_id: str
+    output: str
+    total: int
+    completed: int
+    failed: int
+    done: bool
+    errors: list[BatchRowError]
+    unmatched_columns: list[str]
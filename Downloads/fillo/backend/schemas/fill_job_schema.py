@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class FillJobResponse(BaseModel):
+    job_id: str
+    form_id: str
+    status: str
+    priority: int
+    attempts: int
+    max_attempts: int
+    filled_pdf_url: str | None = None
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, Field
+
+
+class MapStreamRequest(BaseModel):
+    form_id: str
+    text: str = Field(min_length=1)
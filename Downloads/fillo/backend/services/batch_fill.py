@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import uuid
+import zipfile
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from backend.services import pdf_writer_hybrid as pdf_writer
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.pdf_executor import PdfExecutorBusy, pdf_executor
+
+
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "5000"))
+BATCH_STREAM_CHUNK_BYTES = 256 * 1024
+BATCH_BUSY_RETRIES = 20
+
+logger = logging.getLogger(__name__)
+
+
+class BatchFillError(RuntimeError):
+    """Raised when a batch produced no output at all."""
+
+
+@dataclass
+class BatchProgress:
+    batch_id: str
+    form_id: str
+    output: str
+    total: int
+    unmatched_columns: list[str] = field(default_factory=list)
+    completed: int = 0
+    failed: int = 0
+    done: bool = False
+    errors: list[dict[str, Any]] = field(default_factory=list)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "batch_id": self.batch_id,
+            "form_id": self.form_id,
+            "output": self.output,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "done": self.done,
+            "errors": list(self.errors),
+            "unmatched_columns": list(self.unmatched_columns),
+        }
+
+    def record_success(self) -> None:
+        self.completed += 1
+        self._notify()
+
+    def record_failure(self, index: int, exc: BaseException) -> None:
+        self.failed += 1
+        self.errors.append({"row": index + 1, "error": str(exc) or type(exc).__name__})
+        self._notify()
+
+    def finish(self) -> None:
+        if not self.done:
+            self.done = True
+            self._notify()
+
+    async def wait_changed(self, timeout: float) -> None:
+        """Wait until the next progress update, or `timeout` seconds, whichever comes first."""
+        event = self._changed
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify(self) -> None:
+        # Wake every current waiter, then hand out a fresh event for the next update
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class BatchRegistry:
+    """Progress of recent batches by id; the oldest finished batches are forgotten first."""
+
+    def __init__(self, max_batches: int) -> None:
+        self.max_batches = max_batches
+        self._batches: OrderedDict[str, BatchProgress] = OrderedDict()
+
+    def create(
+        self,
+        form_id: str,
+        output: str,
+        total: int,
+        unmatched_columns: list[str],
+    ) -> BatchProgress:
+        progress = BatchProgress(
+            batch_id=uuid.uuid4().hex,
+            form_id=form_id,
+            output=output,
+            total=total,
+            unmatched_columns=unmatched_columns,
+        )
+        self._batches[progress.batch_id] = progress
+        for batch_id in [batch_id for batch_id, batch in self._batches.items() if batch.done]:
+            if len(self._batches) <= self.max_batches:
+                break
+            del self._batches[batch_id]
+        return progress
+
+    def get(self, batch_id: str) -> BatchProgress | None:
+        return self._batches.get(batch_id)
+
+
+def rows_from_csv(data: bytes, schema: CompiledSchema) -> tuple[list[dict[str, Any]], list[str]]:
+    """
+    Parse a CSV upload into value rows.
+
+    Headers are matched to field ids case-insensitively; columns that match no field
+    are returned separately and ignored.  Empty cells leave the field unset.
+    """
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    field_ids = {field_id.lower(): field_id for field_id in schema.ids}
+    columns: dict[str, str] = {}
+    unmatched: list[str] = []
+    for header in reader.fieldnames or []:
+        field_id = field_ids.get(header.strip().lower())
+        if field_id is None:
+            unmatched.append(header)
+        else:
+            columns[header] = field_id
+
+    rows = [
+        {columns[header]: value for header, value in record.items() if header in columns and value}
+        for record in reader
+    ]
+    return rows, unmatched
+
+
+def unmatched_keys(schema: CompiledSchema, rows: list[dict[str, Any]]) -> list[str]:
+    return sorted({key for row in rows for key in row if key not in schema.ids})
+
+
+async def _fill_row(
+    schema: CompiledSchema,
+    values: dict[str, Any],
+    orig_path: str,
+    flatten: bool,
+    out_path: Path,
+    profile: str | None,
+) -> int:
+    # A batch shares the executor with interactive requests, so back off instead of failing
+    attempt = 0
+    while True:
+        try:
+            return await pdf_executor.run(
+                pdf_writer.fill_to_path_sync, schema, values, orig_path, flatten, str(out_path), profile
+            )
+        except PdfExecutorBusy:
+            attempt += 1
+            if attempt >= BATCH_BUSY_RETRIES:
+                raise
+            await asyncio.sleep(min(0.05 * 2**attempt, 2.0))
+
+
+async def _fill_rows(
+    progress: BatchProgress,
+    schema: CompiledSchema,
+    rows: list[dict[str, Any]],
+    orig_path: str,
+    flatten: bool,
+    workdir: Path,
+    profile: str | None = None,
+) -> AsyncIterator[tuple[int, Path | None]]:
+    """
+    Fill rows on the PDF executor and yield (row index, output path or None) in row order.
+    Row files are saved with save profile `profile`.
+
+    At most a window of rows is in flight, so outputs waiting to be consumed stay
+    bounded no matter how large the batch is.
+    """
+    window = max(1, min(pdf_executor.max_workers * 2, pdf_executor.max_pending // 2))
+    pending: dict[int, asyncio.Task] = {}
+    next_row = 0
+    try:
+        for index in range(len(rows)):
+            while next_row < len(rows) and next_row - index < window:
+                pending[next_row] = asyncio.create_task(
+                    _fill_row(
+                        schema, rows[next_row], orig_path, flatten, workdir / f"{next_row:06d}.pdf", profile
+                    )
+                )
+                next_row += 1
+            try:
+                await pending.pop(index)
+            except Exception as exc:
+                logger.warning("Batch %s row %d failed: %s", progress.batch_id, index + 1, exc)
+                progress.record_failure(index, exc)
+                yield index, None
+            else:
+                progress.record_success()
+                yield index, workdir / f"{index:06d}.pdf"
+    finally:
+        for task in pending.values():
+            task.cancel()
+
+
+class _ChunkSink:
+    """
+    Write-only, non-seekable file object.  zipfile notices it cannot seek and writes
+    each entry with a trailing data descriptor, so the archive can be drained as it grows.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def stream_zip(
+    progress: BatchProgress,
+    schema: CompiledSchema,
+    rows: list[dict[str, Any]],
+    orig_path: str,
+    flatten: bool,
+) -> AsyncIterator[bytes]:
+    """
+    Stream a ZIP with one PDF per successful row (row-00001.pdf, ...) and a
+    manifest.json holding the final progress, including per-row errors.
+    """
+    try:
+        with tempfile.TemporaryDirectory(prefix="fillo-batch-") as workdir:
+            sink = _ChunkSink()
+            with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+                async for index, path in _fill_rows(
+                    progress, schema, rows, orig_path, flatten, Path(workdir)
+                ):
+                    if path is None:
+                        continue
+                    with archive.open(f"row-{index + 1:05d}.pdf", "w") as member, open(path, "rb") as fh:
+                        while chunk := fh.read(BATCH_STREAM_CHUNK_BYTES):
+                            member.write(chunk)
+                            yield sink.drain()
+                    path.unlink()
+                    if data := sink.drain():
+                        yield data
+
+                progress.finish()
+                archive.writestr("manifest.json", json.dumps(progress.snapshot(), indent=2))
+            yield sink.drain()
+    finally:
+        progress.finish()
+
+
+async def stream_merged_pdf(
+    progress: BatchProgress,
+    schema: CompiledSchema,
+    rows: list[dict[str, Any]],
+    orig_path: str,
+    flatten: bool,
+) -> AsyncIterator[bytes]:
+    """
+    Stream one PDF holding the pages of every successful row, in row order.
+
+    Rows are spooled to disk and merged once all are filled; failed rows are left
+    out and reported through the batch progress.
+    """
+    try:
+        with tempfile.TemporaryDirectory(prefix="fillo-batch-") as workdir:
+            # Row files only feed the merge, which applies the configured save profile
+            paths = [
+                str(path)
+                async for _, path in _fill_rows(
+                    progress, schema, rows, orig_path, flatten, Path(workdir), profile="preview"
+                )
+                if path is not None
+            ]
+            if not paths:
+                raise BatchFillError(f"Batch {progress.batch_id} produced no documents")
+
+            merged_path = os.path.join(workdir, "merged.pdf")
+            await pdf_executor.run(pdf_writer.merge_pdfs_sync, paths, merged_path)
+            progress.finish()
+            with open(merged_path, "rb") as fh:
+                while chunk := fh.read(BATCH_STREAM_CHUNK_BYTES):
+                    yield chunk
+    finally:
+        progress.finish()
+
+
+batch_registry = BatchRegistry(
+    max_batches=int(os.getenv("BATCH_PROGRESS_RETAIN", "256")),
+)
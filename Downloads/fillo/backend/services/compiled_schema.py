@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from backend.schemas.form_schema import FormSchema
+from backend.services.field_retriever import FieldRetriever
+
+
+# Field types written as text by the PDF writers
+TEXT_TYPES = frozenset({"text", "date", "number", "phone", "ssn"})
+CHOICE_TYPES = frozenset({"checkbox", "radio"})
+
+# Words a checkbox value may be written as
+_CHECKED_WORDS = frozenset({"true", "1", "yes", "on", "x", "checked"})
+_UNCHECKED_WORDS = frozenset({"false", "0", "no", "off", "", "unchecked"})
+
+
+class InvalidValue(ValueError):
+    """Raised by a normalizer when a value cannot be written to a field of its type."""
+
+
+def _normalize_text(value: Any) -> str:
+    if value is None or isinstance(value, (dict, list)):
+        raise InvalidValue(f"expected a scalar, got {type(value).__name__}")
+    return str(value)
+
+
+def _normalize_ssn(value: Any) -> str:
+    # SSN boxes are laid out for NNN-NN-NNNN, so nine digits are written that way
+    text = _normalize_text(value).strip()
+    digits = re.sub(r"\D", "", text)
+    if len(digits) == 9:
+        return f"{digits[:3]}-{digits[3:5]}-{digits[5:]}"
+    return text
+
+
+def _normalize_number(value: Any) -> str:
+    # Numeric fields format plain numbers themselves; currency marks and grouping break that
+    if isinstance(value, bool):
+        raise InvalidValue("expected a number, got a boolean")
+    text = _normalize_text(value).strip().replace("$", "").replace(",", "")
+    try:
+        float(text)
+    except ValueError as exc:
+        raise InvalidValue(f"{text!r} is not a number") from exc
+    return text
+
+
+def _normalize_checkbox(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, str)):
+        word = str(value).strip().lower()
+        if word in _CHECKED_WORDS:
+            return True
+        if word in _UNCHECKED_WORDS:
+            return False
+        raise InvalidValue(f"{value!r} is not a checkbox state")
+    raise InvalidValue(f"expected a boolean, got {type(value).__name__}")
+
+
+def _normalize_radio(value: Any) -> bool | int | str:
+    # An option name ("Female") or an on/off state, kept as given
+    if isinstance(value, (bool, int, str)):
+        return value
+    raise InvalidValue(f"expected an option or a boolean, got {type(value).__name__}")
+
+
+# Types without an entry (text, date, phone) keep the value as written; dates and
+# phone numbers are not reformatted, since forms and users differ on the format
+NORMALIZERS: dict[str, Callable[[Any], Any]] = {
+    "ssn": _normalize_ssn,
+    "number": _normalize_number,
+    "checkbox": _normalize_checkbox,
+    "radio": _normalize_radio,
+}
+
+
+class CompiledField:
+    """Compact, read-only field record; stands in for FieldDefinition in the hot paths."""
+
+    __slots__ = ("index", "id", "label", "type", "page", "rect", "normalizer")
+
+    def __init__(self, index: int, definition: Any) -> None:
+        self.index = index
+        self.id: str = definition.id
+        self.label: str = definition.label or ""
+        self.type: str = definition.type
+        self.page: int = definition.page
+        self.rect: tuple[float, ...] = tuple(definition.rect)
+        self.normalizer = NORMALIZERS.get(definition.type, _normalize_text)
+
+    def __repr__(self) -> str:
+        return f"CompiledField({self.id!r}, type={self.type!r}, page={self.page})"
+
+
+class CompiledSchema:
+    """
+    Immutable, precomputed view of a FormSchema shared by the mapper, the writers and
+    the previewer: field records in schema order, an id lookup, groupings by page
+    and type, and per-type value normalizers.  Build it once per schema version via
+    `compiled_schema_cache` rather than per request.
+    """
+
+    __slots__ = (
+        "schema",
+        "digest",
+        "fields",
+        "by_id",
+        "ids",
+        "by_page",
+        "by_type",
+        "text_fields",
+        "choice_fields",
+        "_retriever",
+        "_lock",
+    )
+
+    def __init__(self, schema: FormSchema, digest: str) -> None:
+        fields = tuple(CompiledField(index, field) for index, field in enumerate(schema.fields))
+        by_page: dict[int, list[CompiledField]] = {}
+        by_type: dict[str, list[CompiledField]] = {}
+        for field in fields:
+            by_page.setdefault(field.page, []).append(field)
+            by_type.setdefault(field.type, []).append(field)
+
+        init = super().__setattr__
+        init("schema", schema)
+        init("digest", digest)
+        init("fields", fields)
+        init("by_id", {field.id: field for field in fields})
+        init("ids", frozenset(field.id for field in fields))
+        init("by_page", {page: tuple(group) for page, group in sorted(by_page.items())})
+        init("by_type", {field_type: tuple(group) for field_type, group in by_type.items()})
+        init("text_fields", tuple(field for field in fields if field.type in TEXT_TYPES))
+        init("choice_fields", tuple(field for field in fields if field.type in CHOICE_TYPES))
+        init("_retriever", None)
+        init("_lock", threading.Lock())
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("CompiledSchema is immutable")
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Shipped to process-pool workers as the source schema; see _unpickle
+        return (_unpickle, (self.schema, self.digest))
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def normalize(self, field_id: str, value: Any) -> Any:
+        """
+        The value to store for a field: as given, except where the field's type needs
+        a canonical form (SSN, number, checkbox).  None (clear the field) is kept.
+        Raises KeyError for an unknown field and InvalidValue when the value does not
+        fit the type.
+        """
+        field = self.by_id[field_id]
+        if value is None:
+            return None
+        return field.normalizer(value)
+
+    def known_values(self, values: dict[str, Any]) -> dict[str, Any]:
+        return {key: value for key, value in values.items() if key in self.ids}
+
+    @property
+    def retriever(self) -> FieldRetriever:
+        """BM25 field retriever over this schema, built on first use."""
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    super().__setattr__("_retriever", FieldRetriever(self))
+        return self._retriever
+
+
+def schema_digest(parsed_schema: dict[str, Any] | FormSchema) -> str:
+    """
+    Content hash of a schema.  A FormSchema is hashed as its JSON-mode dump, with
+    the same canonical encoding as a stored dict, so a model and the dict it was
+    saved as share one digest (and one cache entry).
+    """
+    if isinstance(parsed_schema, FormSchema):
+        parsed_schema = parsed_schema.model_dump(mode="json")
+    canonical = json.dumps(
+        parsed_schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompiledSchemaCache:
+    """
+    LRU of compiled schemas keyed by a hash of the stored schema, so every version
+    of a form's schema is validated and compiled once per process.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._schemas: OrderedDict[str, CompiledSchema] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, parsed_schema: dict[str, Any] | FormSchema) -> CompiledSchema:
+        return self.get_or_compile(parsed_schema, schema_digest(parsed_schema))
+
+    def get_or_compile(self, parsed_schema: dict[str, Any] | FormSchema, digest: str) -> CompiledSchema:
+        with self._lock:
+            compiled = self._schemas.get(digest)
+            if compiled is not None:
+                self._schemas.move_to_end(digest)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        schema = (
+            parsed_schema
+            if isinstance(parsed_schema, FormSchema)
+            else FormSchema.model_validate(parsed_schema)
+        )
+        compiled = CompiledSchema(schema, digest)
+        with self._lock:
+            self._schemas[digest] = compiled
+            while len(self._schemas) > self.max_entries:
+                self._schemas.popitem(last=False)
+        return compiled
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._schemas),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _unpickle(schema: FormSchema, digest: str) -> CompiledSchema:
+    return compiled_schema_cache.get_or_compile(schema, digest)
+
+
+compiled_schema_cache = CompiledSchemaCache(
+    max_entries=int(os.getenv("COMPILED_SCHEMA_CACHE_ENTRIES", "256")),
+)
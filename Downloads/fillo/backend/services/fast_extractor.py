@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.field_retriever import FieldRetriever, tokenize
+
+
+VALUE_SOURCE_FAST_PATH = "fast_path"
+VALUE_SOURCE_MODEL = "model"
+
+# Value shapes in match order: the most specific pattern wins within a clause
+_SSN_RE = re.compile(r"(?<!\d)(\d{3})[- ]?(\d{2})[- ]?(\d{4})(?!\d)")
+_DATE_RE = re.compile(
+    r"(?<![\d/])(?:(\d{1,2})/(\d{1,2})/(\d{4}|\d{2})|(\d{4})-(\d{2})-(\d{2}))(?![\d/])"
+)
+_PHONE_RE = re.compile(
+    r"(?<!\d)(?:\+?1[\s.-]?)?(?:\((\d{3})\)\s?|(\d{3})[\s.-])?(\d{3})[\s.-](\d{4})(?!\d)"
+)
+_SSN_CUE_RE = re.compile(r"\bssn\b|\bsocial\b", re.I)
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\$?\d[\d,]*(?:\.\d+)?(?![\w/-])")
+# Digits joined by commas, and the one reading of them as a number: thousands groups
+_DIGIT_RUN_RE = re.compile(r"\d[\d,]*\d")
+_GROUPED_RE = re.compile(r"\d{1,3}(?:,\d{3})+")
+
+_CHECK_RE = re.compile(r"^(?:please\s+)?(check|tick|mark|select|uncheck|untick|clear|deselect)\s+(.+)$", re.I)
+# A comma directly before a digit ("$85,000", "1,2") does not split clauses
+_CLAUSE_RE = re.compile(r"(?:,(?!\d)|[;\n])+|\s+and\s+|\s+also\s+", re.I)
+
+# Common abbreviations mapped onto the words forms usually spell out
+_ALIASES = {
+    "dob": ("birth",),
+    "birthday": ("birth",),
+    "born": ("birth",),
+    "ssn": ("social", "security"),
+    "tel": ("phone",),
+    "telephone": ("phone",),
+    "cell": ("phone", "mobile"),
+    "mobile": ("phone", "cell"),
+    "zip": ("postal",),
+    "postcode": ("postal",),
+}
+
+# Words naming a kind of value rather than a field ("Date signed" and "Date of
+# birth" are both dates); they neither identify a field nor rule one out
+_GENERIC_TERMS = frozenset("date number num no phone telephone tel".split())
+# Instruction words around a value ("set DOB to ...")
+_FILLER_TERMS = frozenset("please set put enter change update field box".split())
+
+
+@dataclass
+class FastExtraction:
+    applied: dict[str, Any] = field(default_factory=dict)
+    # Indices into the schema's fields that the fast path assigned
+    claimed: set[int] = field(default_factory=set)
+    # Clauses the fast path could not resolve, joined back together
+    leftover: str = ""
+
+    @property
+    def needs_model(self) -> bool:
+        return bool(tokenize(self.leftover))
+
+
+def _cue(text: str) -> list[frozenset[str]]:
+    """
+    The words of `text` that can identify a field, each with its aliases.  Generic
+    value words, filler and stray letters ("spouse's" -> "spouse", "s") are left out.
+    """
+    cue = []
+    for term in dict.fromkeys(tokenize(text)):
+        if len(term) < 2 or term in _GENERIC_TERMS or term in _FILLER_TERMS:
+            continue
+        cue.append(frozenset((term, *_ALIASES.get(term, ()))) - _GENERIC_TERMS)
+    return cue
+
+
+def _ambiguous_number(clause: str) -> bool:
+    """
+    Whether the clause holds digits joined by commas that are not thousands groups
+    ("1,2", "1,2345"): a decimal comma or a list, which only the model can tell.
+    """
+    return any(
+        "," in run and not _GROUPED_RE.fullmatch(run)
+        for run in (match.group(0) for match in _DIGIT_RUN_RE.finditer(clause))
+    )
+
+
+def _match_typed(clause: str) -> tuple[str, re.Match[str]] | None:
+    """The first typed value in a clause as (field type, match)."""
+    match = _SSN_RE.search(clause)
+    # Nine bare digits only count as an SSN when the clause says so
+    if match and ("-" in match.group(0) or _SSN_CUE_RE.search(clause)):
+        return "ssn", match
+    match = _DATE_RE.search(clause)
+    if match:
+        month, day = (match.group(1), match.group(2)) if match.group(1) else (match.group(5), match.group(6))
+        if 1 <= int(month) <= 12 and 1 <= int(day) <= 31:
+            return "date", match
+    match = _PHONE_RE.search(clause)
+    if match:
+        return "phone", match
+    match = _NUMBER_RE.search(clause)
+    if match:
+        return "number", match
+    return None
+
+
+def _best_field(
+    retriever: FieldRetriever,
+    cue: list[frozenset[str]],
+    types: set[str],
+    claimed: set[int],
+) -> int | None:
+    """
+    The field of one of `types` that every cue word names, provided no other field
+    of those types is named by any of them.  None when the cue is empty, matches
+    nothing, or could mean another field: those clauses go to the model.
+    """
+    if not cue:
+        return None
+    full: list[int] = []
+    partial = 0
+    for index, field_type in enumerate(retriever.field_types):
+        if field_type not in types:
+            continue
+        terms = retriever.field_terms[index]
+        matched = sum(1 for words in cue if words & terms)
+        if matched == len(cue):
+            full.append(index)
+        elif matched:
+            partial += 1
+    if len(full) != 1 or partial or full[0] in claimed:
+        return None
+    return full[0]
+
+
+def extract(schema: CompiledSchema, utterance: str) -> FastExtraction:
+    """
+    Resolve unambiguous assignments to typed fields (ssn, date, phone, number,
+    checkbox/radio) without the model.
+
+    The utterance is split into clauses ("SSN 123-45-6789, DOB 4/1/1990, check
+    married").  A clause is resolved when it holds one typed value and every one of
+    its remaining words names the same single field of that type (and no other
+    field of that type), or when it is "check"/"uncheck" plus words naming exactly
+    one checkbox.  A comma only groups thousands when exactly three digits follow
+    it; a clause with any other comma between digits is not resolved.  Values go
+    through the schema's normalizers.  Everything else is left over for the model.
+    """
+    retriever = schema.retriever
+    result = FastExtraction()
+    leftover: list[str] = []
+    for clause in (part.strip() for part in _CLAUSE_RE.split(utterance)):
+        if not clause:
+            continue
+        index, value = None, None
+
+        check = _CHECK_RE.match(clause)
+        if check:
+            index = _best_field(retriever, _cue(check.group(2)), {"checkbox", "radio"}, result.claimed)
+            value = check.group(1).lower() in {"check", "tick", "mark", "select"}
+        elif not _ambiguous_number(clause):
+            typed = _match_typed(clause)
+            if typed is not None:
+                field_type, match = typed
+                cue = _cue(clause[: match.start()] + " " + clause[match.end():])
+                index = _best_field(retriever, cue, {field_type}, result.claimed)
+                value = match.group(0)
+
+        if index is None:
+            leftover.append(clause)
+            continue
+        field_id = retriever.field_ids[index]
+        result.applied[field_id] = schema.normalize(field_id, value)
+        result.claimed.add(index)
+
+    result.leftover = ", ".join(leftover)
+    return result
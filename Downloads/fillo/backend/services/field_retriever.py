@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections import Counter
+from functools import cached_property
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from backend.services.compiled_schema import CompiledSchema
+
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from i in is it its me my of on or our the this to "
+    "was we with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased word tokens; splits snake_case, camelCase and digit runs and folds
+    simple plurals so "PhoneNumbers" and "phone_number" share tokens.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        token = word.lower()
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class FieldRetriever:
+    """
+    Offline BM25 index over a schema's fields, used to point the model at the
+    fields an utterance is likely about.
+
+    Each field is a document made of its id, label, type and page.  Built once per
+    schema (see `CompiledSchema.retriever`); `top_k` is cheap enough to run on every
+    utterance.
+    """
+
+    def __init__(self, schema: CompiledSchema) -> None:
+        self.digest = schema.digest
+        dumped = json.loads(schema.schema.model_dump_json())
+        self.field_payloads: list[dict[str, Any]] = dumped.pop("fields")
+        self.schema_extra: dict[str, Any] = dumped
+        self.field_ids = [field.id for field in schema.fields]
+        self.id_set = schema.ids
+        self.field_types = [field.type for field in schema.fields]
+
+        self._term_freqs: list[Counter[str]] = []
+        # Words naming each field (id and label; type and page aside)
+        self.field_terms: list[frozenset[str]] = []
+        doc_freqs: Counter[str] = Counter()
+        for field in schema.fields:
+            names = tokenize(field.id) + tokenize(field.label)
+            terms = Counter(names + [field.type.lower(), f"page{field.page}"])
+            self._term_freqs.append(terms)
+            self.field_terms.append(frozenset(names))
+            doc_freqs.update(terms.keys())
+
+        self._lengths = [sum(terms.values()) for terms in self._term_freqs]
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        count = len(self._term_freqs)
+        self._idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in doc_freqs.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.field_ids)
+
+    def scores(self, query: str) -> list[float]:
+        query_terms = set(tokenize(query))
+        query_terms.update(f"page{number}" for number in re.findall(r"\bpage\s*(\d+)", query, re.I))
+        scores = []
+        for terms, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length)
+            for term in query_terms & terms.keys():
+                freq = terms[term]
+                score += self._idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def top_k(self, query: str, k: int) -> list[int] | None:
+        """
+        Indices of up to `k` fields matching the query, in schema order, or None when
+        the query matches no field at all and the whole schema should be used.
+        """
+        return self.top_k_scored(query, k)[0]
+
+    def top_k_scored(self, query: str, k: int) -> tuple[list[int] | None, float]:
+        """`top_k` plus the best field's score (inf when every field is returned anyway)."""
+        if k >= len(self):
+            return list(range(len(self))), math.inf
+        scores = self.scores(query)
+        ranked = sorted(
+            (index for index, score in enumerate(scores) if score > 0),
+            key=lambda index: -scores[index],
+        )
+        if not ranked:
+            return None, 0.0
+        return sorted(ranked[:k]), scores[ranked[0]]
+
+    @cached_property
+    def schema_json(self) -> str:
+        """The whole schema, serialized canonically once for the mapper's optional schema prefix."""
+        return json.dumps(
+            self.schema_payload(None), ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+
+    def schema_payload(self, indices: list[int] | None) -> dict[str, Any]:
+        fields = self.field_payloads if indices is None else [self.field_payloads[i] for i in indices]
+        return {**self.schema_extra, "fields": fields}
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from backend.services.storage import StorageService
+
+
+def fill_key(
+    template_digest: str,
+    schema_digest: str,
+    current_values: dict[str, Any],
+    flatten: bool,
+    writer_version: str,
+) -> str:
+    """
+    Deterministic key of a /fill result: same key, same output bytes.
+    The schema is part of the key because field rects and types shape the output.
+    """
+    canonical = json.dumps(
+        {
+            "template": template_digest,
+            "schema": schema_digest,
+            "values": current_values,
+            "flatten": flatten,
+            "writer": writer_version,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class FillResultCache:
+    """
+    Maps fill keys to stored output URIs and garbage-collects outputs nothing uses.
+
+    An output is referenced while it is cached or while it is the current filled
+    PDF of some form.  Only outputs recorded by this process are ever deleted, so a
+    URI another worker or an earlier process handed out is never removed from
+    under a form that still points at it.  A URI returned by `lookup` or passed to
+    `produced` is pinned until the caller records it (or releases it, if the fill
+    is abandoned), so an eviction in between cannot delete it before the form
+    points at it.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._results: OrderedDict[str, str] = OrderedDict()
+        self._form_refs: dict[str, set[str]] = {}
+        # URI -> lookups and fresh outputs handed out and not yet recorded or released
+        self._pins: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.collected = 0
+
+    def lookup(self, key: str, storage: StorageService) -> str | None:
+        """
+        The stored output for `key`, pinned until passed to `record` or `release`;
+        None when not cached or the file is gone.
+        """
+        with self._lock:
+            uri = self._results.get(key)
+            if uri is not None:
+                self._results.move_to_end(key)
+                self._pins[uri] = self._pins.get(uri, 0) + 1
+        if uri is not None and storage.path_from_uri(uri).exists():
+            with self._lock:
+                self.hits += 1
+            return uri
+        with self._lock:
+            if uri is not None:
+                self._unpin(uri)
+                if self._results.get(key) == uri:
+                    del self._results[key]
+            self.misses += 1
+        return None
+
+    def produced(self, uri: str) -> None:
+        """
+        Pin a freshly written output until `record` or `release`.  The output belongs
+        to this process, so `release` deletes it unless something else uses it.
+        """
+        with self._lock:
+            self._form_refs.setdefault(uri, set())
+            self._pins[uri] = self._pins.get(uri, 0) + 1
+
+    def release(self, uri: str, storage: StorageService) -> None:
+        """
+        Drop the pin of a looked-up or produced `uri` whose fill was abandoned before
+        `record`, deleting the file when nothing references it any more.
+        """
+        with self._lock:
+            if uri not in self._pins:
+                return
+            self._unpin(uri)
+            collect = self._collectable(uri)
+            if collect:
+                del self._form_refs[uri]
+        if collect:
+            storage.path_from_uri(uri).unlink(missing_ok=True)
+            with self._lock:
+                self.collected += 1
+
+    def record(
+        self,
+        form_id: str,
+        key: str,
+        uri: str,
+        previous_uri: str | None,
+        storage: StorageService,
+    ) -> None:
+        """Remember `uri` as the result for `key` and as `form_id`'s current output."""
+        with self._lock:
+            self._unpin(uri)
+            self._results[key] = uri
+            self._results.move_to_end(key)
+            self._form_refs.setdefault(uri, set()).add(form_id)
+            released = []
+            if previous_uri and previous_uri != uri:
+                refs = self._form_refs.get(previous_uri)
+                if refs is not None:
+                    refs.discard(form_id)
+                    released.append(previous_uri)
+            while len(self._results) > self.max_entries:
+                _, evicted_uri = self._results.popitem(last=False)
+                released.append(evicted_uri)
+            garbage = [candidate for candidate in dict.fromkeys(released) if self._collectable(candidate)]
+            for candidate in garbage:
+                del self._form_refs[candidate]
+
+        for candidate in garbage:
+            storage.path_from_uri(candidate).unlink(missing_ok=True)
+        with self._lock:
+            self.collected += len(garbage)
+
+    def _unpin(self, uri: str) -> None:
+        count = self._pins.get(uri, 0)
+        if count > 1:
+            self._pins[uri] = count - 1
+        else:
+            self._pins.pop(uri, None)
+
+    def _collectable(self, uri: str) -> bool:
+        return (
+            uri in self._form_refs
+            and not self._form_refs[uri]
+            and uri not in self._pins
+            and uri not in self._results.values()
+        )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "max_entries": self.max_entries,
+                "pinned": len(self._pins),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "collected": self.collected,
+            }
+
+
+fill_result_cache = FillResultCache(
+    max_entries=int(os.getenv("FILL_RESULT_CACHE_ENTRIES", "1024")),
+)
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.fill_job import FillJob
+from backend.services.instrumentation import metrics
+
+
+# "sync" fills inside the /fill request; "job" enqueues and returns a job id
+FILL_MODE = os.getenv("FILL_MODE", "sync")
+FILL_JOB_MAX_ATTEMPTS = int(os.getenv("FILL_JOB_MAX_ATTEMPTS", "3"))
+FILL_JOB_LEASE_SECONDS = float(os.getenv("FILL_JOB_LEASE_SECONDS", "120"))
+FILL_JOB_RETRY_BASE_SECONDS = float(os.getenv("FILL_JOB_RETRY_BASE_SECONDS", "2"))
+FILL_JOB_RETRY_MAX_SECONDS = float(os.getenv("FILL_JOB_RETRY_MAX_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different form or flatten setting."""
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    """What a worker needs of a job it leased, detached from the claiming session."""
+
+    id: uuid.UUID
+    form_id: uuid.UUID
+    flatten: bool
+    attempts: int
+    max_attempts: int
+    created_at: datetime
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes for timezone-aware columns
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+async def _find_by_key(
+    db: AsyncSession, idempotency_key: str, form_id: uuid.UUID, flatten: bool
+) -> FillJob | None:
+    """
+    The job created with `idempotency_key`.  Keys are unique across forms, so one
+    created for another form or flatten setting raises IdempotencyConflict instead
+    of handing that job back.
+    """
+    result = await db.execute(select(FillJob).where(FillJob.idempotency_key == idempotency_key))
+    existing = result.scalar_one_or_none()
+    if existing is not None and (existing.form_id != form_id or existing.flatten != flatten):
+        raise IdempotencyConflict(
+            f"Idempotency key {idempotency_key!r} was used for a different fill request"
+        )
+    return existing
+
+
+async def _coalesce(db: AsyncSession, form_id: uuid.UUID, flatten: bool, priority: int) -> FillJob | None:
+    """The job still queued for the form and flatten setting, at least at `priority`."""
+    result = await db.execute(
+        select(FillJob)
+        .where(FillJob.form_id == form_id, FillJob.flatten == flatten, FillJob.status == "queued")
+        .order_by(FillJob.created_at)
+        .limit(1)
+    )
+    existing = result.scalar_one_or_none()
+    if existing is None:
+        return None
+    if priority > existing.priority:
+        existing.priority = priority
+        existing.updated_at = _now()
+        await db.commit()
+        await db.refresh(existing)
+    metrics.increment("fill_jobs.coalesced")
+    return existing
+
+
+async def enqueue_fill(
+    db: AsyncSession,
+    form_id: uuid.UUID,
+    *,
+    flatten: bool,
+    priority: int = 0,
+    idempotency_key: str | None = None,
+) -> tuple[FillJob, bool]:
+    """
+    Queue a fill for `form_id` and return (job, created).
+
+    A repeated `idempotency_key` returns the job first created with it, whatever its
+    state; reusing it for another form or flatten setting raises IdempotencyConflict.  Without a key, a job still queued for the same form and flatten setting
+    absorbs the request (raising its priority if needed): the worker fills the
+    values current when it runs, so one pending job per form is enough.  A unique
+    index allows one queued keyless job per form and flatten setting, so when
+    concurrent requests both miss it, the losing insert returns the winner's job.
+    """
+    if idempotency_key is not None:
+        existing = await _find_by_key(db, idempotency_key, form_id, flatten)
+        if existing is not None:
+            metrics.increment("fill_jobs.idempotent_hits")
+            return existing, False
+    else:
+        existing = await _coalesce(db, form_id, flatten, priority)
+        if existing is not None:
+            return existing, False
+
+    now = _now()
+    job = FillJob(
+        id=uuid.uuid4(),
+        form_id=form_id,
+        flatten=flatten,
+        status="queued",
+        priority=priority,
+        idempotency_key=idempotency_key,
+        attempts=0,
+        max_attempts=FILL_JOB_MAX_ATTEMPTS,
+        run_after=now,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request inserted the same idempotency key, or the form's queued
+        # keyless job, first
+        await db.rollback()
+        if idempotency_key is not None:
+            existing = await _find_by_key(db, idempotency_key, form_id, flatten)
+            if existing is not None:
+                metrics.increment("fill_jobs.idempotent_hits")
+        else:
+            existing = await _coalesce(db, form_id, flatten, priority)
+        if existing is None:
+            raise
+        return existing, False
+    await db.refresh(job)
+    metrics.increment("fill_jobs.enqueued")
+    logger.info("Queued fill job %s for form %s (priority %d)", job.id, form_id, priority)
+    return job, True
+
+
+async def get_job(db: AsyncSession, job_id: uuid.UUID) -> FillJob | None:
+    result = await db.execute(select(FillJob).where(FillJob.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def _fail_exhausted(db: AsyncSession, now: datetime) -> None:
+    result = await db.execute(
+        update(FillJob)
+        .where(
+            FillJob.status == "running",
+            FillJob.lease_expires_at < now,
+            FillJob.attempts >= FillJob.max_attempts,
+        )
+        .values(
+            status="failed",
+            error="Lease expired on the final attempt; the worker did not finish the job",
+            lease_expires_at=None,
+            updated_at=now,
+        )
+    )
+    if result.rowcount:
+        await db.commit()
+        logger.warning("Failed %d fill job(s) whose lease expired on the last attempt", result.rowcount)
+        metrics.increment("fill_jobs.failed", result.rowcount)
+        metrics.increment("fill_jobs.lease_expired", result.rowcount)
+
+
+async def claim_job(db: AsyncSession, worker_id: str) -> ClaimedJob | None:
+    """
+    Lease the next runnable job to `worker_id`: the highest priority, oldest queued
+    job that is due, or a running job whose lease expired.
+
+    The candidate row is locked with FOR UPDATE SKIP LOCKED, so concurrent workers
+    never wait on each other or claim the same job.  (SQLite ignores the lock
+    clause; run a single worker there.)  Expired jobs that already used all their
+    attempts (their worker keeps dying on them) are marked failed, not re-run.
+    """
+    now = _now()
+    await _fail_exhausted(db, now)
+    result = await db.execute(
+        select(FillJob)
+        .where(
+            or_(
+                and_(FillJob.status == "queued", FillJob.run_after <= now),
+                and_(
+                    FillJob.status == "running",
+                    FillJob.lease_expires_at < now,
+                    FillJob.attempts < FillJob.max_attempts,
+                ),
+            )
+        )
+        .order_by(FillJob.priority.desc(), FillJob.run_after, FillJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = result.scalar_one_or_none()
+    if job is None:
+        await db.rollback()
+        return None
+    if job.status == "running":
+        logger.warning("Reclaiming fill job %s from expired worker %s", job.id, job.worker_id)
+        metrics.increment("fill_jobs.lease_expired")
+    job.status = "running"
+    job.worker_id = worker_id
+    job.attempts += 1
+    job.lease_expires_at = now + timedelta(seconds=FILL_JOB_LEASE_SECONDS)
+    job.updated_at = now
+    claimed = ClaimedJob(
+        id=job.id,
+        form_id=job.form_id,
+        flatten=job.flatten,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        created_at=_aware(job.created_at),
+    )
+    await db.commit()
+    return claimed
+
+
+async def renew_lease(db: AsyncSession, job_id: uuid.UUID, worker_id: str) -> bool:
+    """Extend a running job's lease; False when `worker_id` no longer holds it."""
+    now = _now()
+    result = await db.execute(
+        update(FillJob)
+        .where(FillJob.id == job_id, FillJob.worker_id == worker_id, FillJob.status == "running")
+        .values(lease_expires_at=now + timedelta(seconds=FILL_JOB_LEASE_SECONDS), updated_at=now)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def complete_job(db: AsyncSession, job_id: uuid.UUID, worker_id: str, filled_pdf_url: str) -> bool:
+    """
+    Mark a job succeeded; False (and no change) when the lease was lost meanwhile.
+    Not committed, so the caller can commit it together with the form update.
+    """
+    result = await db.execute(
+        update(FillJob)
+        .where(FillJob.id == job_id, FillJob.worker_id == worker_id, FillJob.status == "running")
+        .values(
+            status="succeeded",
+            filled_pdf_url=filled_pdf_url,
+            error=None,
+            lease_expires_at=None,
+            updated_at=_now(),
+        )
+    )
+    return result.rowcount == 1
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff before attempt `attempts + 1`."""
+    return min(FILL_JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), FILL_JOB_RETRY_MAX_SECONDS)
+
+
+async def fail_job(
+    db: AsyncSession,
+    job: ClaimedJob,
+    worker_id: str,
+    error: str,
+    *,
+    retry: bool = True,
+    count_attempt: bool = True,
+) -> str | None:
+    """
+    Record a failed attempt: requeue with backoff while attempts remain (and `retry`),
+    else mark the job failed.  `count_attempt=False` requeues without using up an
+    attempt, for transient capacity errors.  Returns the new status, or None when the
+    lease was lost meanwhile.
+    """
+    attempts = job.attempts if count_attempt else job.attempts - 1
+    requeue = retry and attempts < job.max_attempts
+    now = _now()
+    values = {
+        "status": "queued" if requeue else "failed",
+        "attempts": attempts,
+        "error": error[:2000],
+        "lease_expires_at": None,
+        "updated_at": now,
+    }
+    if requeue:
+        values["run_after"] = now + timedelta(seconds=retry_delay(max(attempts, 1)))
+    owned = (FillJob.id == job.id, FillJob.worker_id == worker_id, FillJob.status == "running")
+    try:
+        result = await db.execute(update(FillJob).where(*owned).values(**values))
+        await db.commit()
+    except IntegrityError:
+        # A keyless job already queued for the form fills the same values: retry there
+        await db.rollback()
+        values.update(status="failed", error=f"{error[:1900]} (not retried: a newer fill is queued)")
+        values.pop("run_after")
+        requeue = False
+        result = await db.execute(update(FillJob).where(*owned).values(**values))
+        await db.commit()
+    if result.rowcount != 1:
+        return None
+    metrics.increment("fill_jobs.retried" if requeue else "fill_jobs.failed")
+    return values["status"]
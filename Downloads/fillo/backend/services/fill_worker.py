@@ -0,0 +1,286 @@
+"""
+Fill job worker pool.
+
+    python -m backend.services.fill_worker [--concurrency N]
+
+Claims queued /fill jobs from the database, runs the writer and records the result
+on the form.  Any number of worker processes (or hosts) can run against the same
+database; jobs are leased with SKIP LOCKED, so each runs once at a time, and a job
+whose worker dies is picked up again when its lease expires.  The API process can
+also run a pool in-process with `await fill_worker.start()`.
+
+Job outcomes are pushed over the preview broadcast channel of the process running
+the worker, so a standalone pool only reaches clients connected to it if that
+channel is shared between processes.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any
+
+from sqlalchemy import select
+
+from backend.models.form import Form
+from backend.services.compiled_schema import compiled_schema_cache
+from backend.services.db import get_session
+from backend.services.fill_cache import fill_result_cache
+from backend.services.fill_jobs import (
+    FILL_JOB_LEASE_SECONDS,
+    ClaimedJob,
+    claim_job,
+    complete_job,
+    fail_job,
+    renew_lease,
+)
+from backend.services.form_fill import produce_filled_pdf
+from backend.services.instrumentation import configure_logging, metrics, span
+from backend.services.pdf_executor import PdfExecutorBusy, pdf_executor
+from backend.services.preview_pages import page_preview_cache
+from backend.services.preview_scheduler import preview_scheduler
+from backend.services.previewer import broadcast_preview
+from backend.services.storage import storage_service
+
+FILL_JOB_CONCURRENCY = int(os.getenv("FILL_JOB_CONCURRENCY", str(pdf_executor.max_workers)))
+FILL_JOB_POLL_SECONDS = float(os.getenv("FILL_JOB_POLL_SECONDS", "0.5"))
+FILL_JOB_POLL_MAX_SECONDS = float(os.getenv("FILL_JOB_POLL_MAX_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+session_scope = asynccontextmanager(get_session)
+
+
+class FormGone(LookupError):
+    """The job's form was deleted before the job ran."""
+
+
+class FillWorker:
+    """
+    `concurrency` claim loops in one process.  Each loop leases a job, keeps the
+    lease alive while the fill runs on the PDF executor and polls with exponential
+    backoff (up to `max_poll_interval`) while the queue is empty.  DB sessions are
+    held only around the claim and the result update, never across PDF generation.
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float, max_poll_interval: float) -> None:
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stopping = asyncio.Event()
+        self._loops: list[asyncio.Task] = []
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def start(self) -> None:
+        if self._loops:
+            return
+        self._stopping.clear()
+        self._loops = [
+            asyncio.create_task(self._loop(), name=f"fill-worker-{slot}") for slot in range(self.concurrency)
+        ]
+        logger.info("Fill worker %s started with %d slot(s)", self.worker_id, self.concurrency)
+
+    async def stop(self) -> None:
+        """Stop claiming and wait for jobs in flight to finish."""
+        self._stopping.set()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops = []
+
+    async def _loop(self) -> None:
+        idle_wait = self.poll_interval
+        while not self._stopping.is_set():
+            try:
+                ran = await self.run_once()
+            except Exception:  # noqa: BLE001
+                logger.exception("Fill worker %s failed to claim a job", self.worker_id)
+                ran = False
+            if ran:
+                idle_wait = self.poll_interval
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), idle_wait)
+            except asyncio.TimeoutError:
+                pass
+            idle_wait = min(idle_wait * 2, self.max_poll_interval)
+
+    async def run_once(self) -> bool:
+        """Claim and run one job; False when nothing was runnable."""
+        async with session_scope() as db:
+            job = await claim_job(db, self.worker_id)
+        if job is None:
+            return False
+
+        metrics.observe("fill_jobs.queue_wait", (time.time() - job.created_at.timestamp()) * 1000)
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            with span("fill_jobs.run"):
+                await self._run(job)
+        except PdfExecutorBusy as exc:
+            # Capacity, not a fault of the job: retry without using up an attempt
+            await self._fail(job, exc, count_attempt=False)
+        except FormGone as exc:
+            await self._fail(job, exc, retry=False)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Fill job %s failed (attempt %d/%d)", job.id, job.attempts, job.max_attempts)
+            await self._fail(job, exc)
+        finally:
+            heartbeat.cancel()
+            self.running -= 1
+        return True
+
+    async def _heartbeat(self, job: ClaimedJob) -> None:
+        while True:
+            await asyncio.sleep(FILL_JOB_LEASE_SECONDS / 3)
+            async with session_scope() as db:
+                if not await renew_lease(db, job.id, self.worker_id):
+                    logger.warning("Fill worker %s lost the lease on job %s", self.worker_id, job.id)
+                    return
+
+    async def _run(self, job: ClaimedJob) -> None:
+        form_id = str(job.form_id)
+        async with session_scope() as db:
+            form_row = (await db.execute(select(Form).where(Form.id == job.form_id))).scalar_one_or_none()
+            if form_row is None:
+                raise FormGone(f"Form {form_id} not found")
+            schema = compiled_schema_cache.get(form_row.parsed_schema)
+            current_values = form_row.current_values or {}
+            orig_pdf_uri = form_row.orig_pdf_url
+
+        key, filled_pdf_uri, preview_source = await produce_filled_pdf(
+            form_id, schema, current_values, orig_pdf_uri, job.flatten
+        )
+
+        try:
+            async with session_scope() as db:
+                form_row = (await db.execute(select(Form).where(Form.id == job.form_id))).scalar_one_or_none()
+                if form_row is None:
+                    raise FormGone(f"Form {form_id} not found")
+                previous_uri = form_row.filled_pdf_url
+                form_row.filled_pdf_url = filled_pdf_uri
+                form_row.status = "filled"
+                if not await complete_job(db, job.id, self.worker_id, filled_pdf_uri):
+                    # Another worker reclaimed the job after our lease expired; it owns the result
+                    await db.rollback()
+                    logger.warning("Dropping result of job %s: lease lost", job.id)
+                    fill_result_cache.release(filled_pdf_uri, storage_service)
+                    return
+                with span("fill.db_commit"):
+                    await db.commit()
+        except BaseException:
+            fill_result_cache.release(filled_pdf_uri, storage_service)
+            raise
+        fill_result_cache.record(form_id, key, filled_pdf_uri, previous_uri, storage_service)
+        self.succeeded += 1
+        metrics.increment("fill_jobs.succeeded")
+        logger.info("Fill job %s done for form %s", job.id, form_id)
+
+        preview_scheduler.schedule(form_id, schema, current_values, orig_pdf_uri, preview_source)
+        await self._notify(job, "succeeded", filled_pdf_url=filled_pdf_uri, values=current_values)
+
+    async def _fail(
+        self,
+        job: ClaimedJob,
+        exc: BaseException,
+        *,
+        retry: bool = True,
+        count_attempt: bool = True,
+    ) -> None:
+        async with session_scope() as db:
+            status = await fail_job(
+                db, job, self.worker_id, f"{type(exc).__name__}: {exc}", retry=retry, count_attempt=count_attempt
+            )
+        if status == "failed":
+            self.failed += 1
+            await self._notify(job, "failed", error=str(exc))
+        elif status == "queued":
+            self.retried += 1
+
+    async def _notify(
+        self,
+        job: ClaimedJob,
+        status: str,
+        *,
+        filled_pdf_url: str | None = None,
+        error: str | None = None,
+        values: dict[str, Any] | None = None,
+    ) -> None:
+        form_id = str(job.form_id)
+        try:
+            delta = page_preview_cache.record_broadcast(form_id, None, {}, values, storage_service)
+            with span("preview.broadcast_partial"):
+                await broadcast_preview(
+                    form_id,
+                    [],
+                    delta.values,
+                    partial=True,
+                    streamed_fields=[],
+                    changed_pages=[],
+                    delta=True,
+                    sequence=delta.sequence,
+                    base_sequence=delta.base_sequence,
+                    page_count=delta.page_count,
+                    removed_fields=delta.removed_fields,
+                    fill_job={
+                        "job_id": str(job.id),
+                        "status": status,
+                        "filled_pdf_url": filled_pdf_url,
+                        "error": error,
+                    },
+                )
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to broadcast fill job %s status", job.id)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "active": bool(self._loops),
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+fill_worker = FillWorker(
+    concurrency=FILL_JOB_CONCURRENCY,
+    poll_interval=FILL_JOB_POLL_SECONDS,
+    max_poll_interval=FILL_JOB_POLL_MAX_SECONDS,
+)
+
+
+async def _serve(worker: FillWorker) -> None:
+    await pdf_executor.start()
+    await worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        pdf_executor.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=FILL_JOB_CONCURRENCY)
+    args = parser.parse_args()
+
+    configure_logging()
+    worker = FillWorker(args.concurrency, FILL_JOB_POLL_SECONDS, FILL_JOB_POLL_MAX_SECONDS)
+    try:
+        asyncio.run(_serve(worker))
+    except KeyboardInterrupt:
+        logger.info("Fill worker %s stopped", worker.worker_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Any
+
+from backend.services import pdf_writer_hybrid as pdf_writer
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.fill_cache import fill_key, fill_result_cache
+from backend.services.instrumentation import span
+from backend.services.pdf_executor import pdf_executor
+from backend.services.preview_refresh import fill_with_preview
+from backend.services.storage import storage_service
+from backend.services.template_cache import template_summary
+
+
+async def produce_filled_pdf(
+    form_id: str,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_pdf_uri: str,
+    flatten: bool,
+) -> tuple[str, str, bytes | None]:
+    """
+    The filled PDF for a form's values as (fill cache key, stored URI, preview
+    document), shared by the synchronous /fill route and the job workers.
+
+    Identical fills are answered from the fill result cache.  Otherwise the
+    single_pass writer also returns the filled interactive document when preview
+    pages still need rendering (see `fill_with_preview`), for the caller to pass to
+    `preview_scheduler.schedule`; it is None otherwise.  The URI comes back pinned
+    in the fill result cache: callers hand it to `fill_result_cache.record` once the
+    form points at it, or to `fill_result_cache.release` if they drop it.
+    """
+    with span("fill.template"):
+        template_digest, page_count = await pdf_executor.run(
+            template_summary, str(storage_service.path_from_uri(orig_pdf_uri))
+        )
+    key = fill_key(
+        template_digest,
+        schema.digest,
+        current_values,
+        flatten,
+        pdf_writer.writer_version(),
+    )
+    filled_pdf_uri = fill_result_cache.lookup(key, storage_service)
+    cached = filled_pdf_uri is not None
+    preview_source = None
+    if filled_pdf_uri is None and pdf_writer.writer_mode() == "single_pass":
+        # Render the preview pages from the same fill as the delivered PDF
+        with span("fill.write"):
+            filled_pdf_uri, preview_source = await fill_with_preview(
+                form_id,
+                schema,
+                current_values,
+                orig_pdf_uri,
+                template_digest,
+                page_count,
+                flatten=flatten,
+            )
+    elif filled_pdf_uri is None:
+        with span("fill.write"):
+            filled_pdf_uri = await pdf_writer.write_filled_pdf(
+                form_id,
+                schema,
+                current_values,
+                orig_pdf_uri,
+                storage_service,
+                flatten=flatten,
+            )
+    if not cached:
+        fill_result_cache.produced(filled_pdf_uri)
+    return key, filled_pdf_uri, preview_source
@@ -1,19 +1,40 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
 from typing import Any
 
 from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from backend.schemas.form_schema import FormSchema
+from backend.services.compiled_schema import CompiledSchema, InvalidValue
+from backend.services.fast_extractor import VALUE_SOURCE_FAST_PATH, VALUE_SOURCE_MODEL, extract
+from backend.services.field_retriever import FieldRetriever
+from backend.services.instrumentation import metrics, span
+from backend.services.mapping_stream import MappingStreamParser
 
 
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
 SYSTEM_PROMPT = (
-    "You transform user natural-language into a JSON map of {field_id: value} "
-    "given a PDF field schema. Return ONLY compact JSON. Respect field data types "
-    "and formats. If a value is not present, omit it.\n\n"
+    "You transform user natural-language into values for a PDF form, given the form's "
+    "field schema. Return ONLY compact JSON of the shape "
+    "{\"applied\": {field_id: value}, \"unmatched\": [text]}. "
+    "The user message may list candidate_fields: fill only those field ids (any schema "
+    "field when it is absent). "
+    "In \"applied\", respect field data types and formats; if a value is not present, omit "
+    "the field. In \"unmatched\", quote each piece of information from the user's text "
+    "that no candidate field fits, or return [] when everything was placed. Never "
+    "drop information silently: if unsure which field fits, list it as unmatched.\n\n"
     "IMPORTANT: Use ONLY the exact field IDs from the schema's 'fields' array. "
     "Do NOT modify or extend field IDs (e.g., don't add '_radio_button_1' or '_checkbox' suffixes). "
     "The field_id in your response must exactly match the 'id' property in the schema.\n\n"
@@ -21,6 +42,113 @@ SYSTEM_PROMPT = (
 )
 
 
+def normalize_utterance(utterance: str) -> str:
+    """
+    Whitespace-insensitive form of an utterance, minus trailing punctuation.  Case is
+    kept: values are copied from the utterance as written.
+    """
+    return " ".join(utterance.split()).rstrip(".!?;, ")
+
+
+def mapping_key(
+    schema_digest: str,
+    model: str,
+    indices: list[int] | None,
+    relevant_values: dict[str, Any],
+    utterance: str,
+) -> str:
+    canonical = json.dumps(
+        {
+            "schema": schema_digest,
+            "model": model,
+            "candidates": indices,
+            "values": relevant_values,
+            "utterance": normalize_utterance(utterance),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MappingCache:
+    """
+    LRU cache of model mappings with a time-to-live.
+
+    Keyed by schema hash, normalized utterance and the current values of the
+    candidate fields sent, so retries and repeated utterances skip the model.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, tuple[dict[str, Any], list[str]]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: str) -> tuple[dict[str, Any], list[str]] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        applied, unmatched = entry[1]
+        return dict(applied), list(unmatched)
+
+    def put(self, key: str, result: tuple[dict[str, Any], list[str]]) -> None:
+        applied, unmatched = result
+        with self._lock:
+            self._entries[key] = (time.monotonic(), (dict(applied), list(unmatched)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+mapping_cache = MappingCache(
+    max_entries=int(os.getenv("MAPPING_CACHE_ENTRIES", "2048")),
+    ttl=float(os.getenv("MAPPING_CACHE_TTL_SECONDS", "600")),
+)
+
+
+@dataclass
+class MappingResult:
+    applied: dict[str, Any] = field(default_factory=dict)
+    unmatched: list[str] = field(default_factory=list)
+    # field_id -> VALUE_SOURCE_FAST_PATH or VALUE_SOURCE_MODEL
+    sources: dict[str, str] = field(default_factory=dict)
+
+    def add(self, values: dict[str, Any], source: str) -> None:
+        for key, value in values.items():
+            # Deterministic fast-path values are never overridden by the model
+            if self.sources.get(key) == VALUE_SOURCE_FAST_PATH and source != VALUE_SOURCE_FAST_PATH:
+                continue
+            self.applied[key] = value
+            self.sources[key] = source
+
+
 class LlmMapper:
     def __init__(self) -> None:
         api_key = os.getenv("OPENAI_API_KEY")
@@ -28,52 +156,350 @@ class LlmMapper:
             raise RuntimeError("OPENAI_API_KEY is required for mapping.")
         self.model = os.getenv("OPENAI_MAPPING_MODEL", "gpt-4o-mini")
         self.client = AsyncOpenAI(api_key=api_key)
+        self.top_k = int(os.getenv("OPENAI_MAPPING_TOP_K", "40"))
+        self.fallback_factor = int(os.getenv("OPENAI_MAPPING_FALLBACK_FACTOR", "4"))
+        # Below this best BM25 score the top-k is a guess; start from the wider set
+        self.min_score = float(os.getenv("OPENAI_MAPPING_MIN_SCORE", "2.0"))
+        # Send the whole schema as a cacheable prefix instead of only the candidates
+        self.schema_prefix = os.getenv("OPENAI_MAPPING_SCHEMA_PREFIX", "0") == "1"
 
-    @retry(wait=wait_exponential(multiplier=1, min=1, max=8), stop=stop_after_attempt(3))
     async def map_values(
         self,
-        schema: FormSchema,
+        schema: CompiledSchema,
         current_values: dict[str, Any],
         utterance: str,
     ) -> tuple[dict[str, Any], list[str]]:
-        payload = {
-            "schema": json.loads(schema.model_dump_json()),
-            "current_values": current_values,
-            "utterance": utterance,
-        }
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
-            ],
-            temperature=0,
+        with span("mapper.total"):
+            result = await self.map_with_sources(schema, current_values, utterance)
+        return result.applied, result.unmatched
+
+    async def map_with_sources(
+        self,
+        schema: CompiledSchema,
+        current_values: dict[str, Any],
+        utterance: str,
+    ) -> MappingResult:
+        """
+        Typed values the fast path can resolve on its own (see
+        `fast_extractor.extract`) are applied without the model.  Only the leftover
+        text goes to the model, and the fields the fast path claimed are left out.
+
+        The model is shown the `top_k` fields most relevant to the utterance, with
+        their current values, or `fallback_factor` times as many when even the best
+        field scores below `min_score`.  If the model reports content it could not
+        place, the request is repeated once with up to `fallback_factor` times more
+        candidates, or the whole schema when the retriever has no further matches.
+        """
+        retriever = schema.retriever
+        with span("mapper.fast_path"):
+            fast = extract(schema, utterance)
+        result = MappingResult()
+        result.add(fast.applied, VALUE_SOURCE_FAST_PATH)
+        if not fast.needs_model:
+            logger.debug("Fast path resolved fields: %s", list(fast.applied))
+            return result
+
+        indices = self._candidates(retriever, fast.leftover, self.top_k, fast.claimed)
+        applied, unmatched = await self._map_candidates(
+            retriever, indices, current_values, fast.leftover
+        )
+
+        wider = self._wider(retriever, fast.leftover, indices, fast.claimed)
+        if unmatched and wider is not None:
+            logger.debug("Unmatched content %s, retrying with %d fields", unmatched, len(wider))
+            applied, unmatched = await self._map_candidates(
+                retriever, wider, current_values, fast.leftover
+            )
+
+        result.add(_accept(schema, applied.items()), VALUE_SOURCE_MODEL)
+        result.unmatched = unmatched
+        logger.debug("LLM returned fields: %s", list(result.applied))
+        return result
+
+    async def stream_values(
+        self,
+        schema: CompiledSchema,
+        current_values: dict[str, Any],
+        utterance: str,
+        on_values: Callable[[dict[str, Any]], Awaitable[None]],
+    ) -> MappingResult:
+        """
+        Streaming variant of `map_with_sources`.  Fast-path values are delivered
+        first; the completion for the leftover text is then consumed as a stream and
+        each {field_id: value} pair is normalized against the schema and passed to
+        `on_values` as soon as the model finishes writing it.  A cached mapping is
+        delivered in a single call.  The streamed request is not retried, since its
+        values may already have been delivered.
+        """
+        retriever = schema.retriever
+        result = MappingResult()
+
+        async def deliver(pairs: Iterable[tuple[str, Any]]) -> None:
+            accepted = {
+                key: value
+                for key, value in _accept(schema, pairs).items()
+                if result.sources.get(key) != VALUE_SOURCE_FAST_PATH
+                and result.applied.get(key, _MISSING) != value
+            }
+            if accepted:
+                result.add(accepted, VALUE_SOURCE_MODEL)
+                await on_values(accepted)
+
+        with span("mapper.fast_path"):
+            fast = extract(schema, utterance)
+        if fast.applied:
+            result.add(fast.applied, VALUE_SOURCE_FAST_PATH)
+            await on_values(dict(fast.applied))
+        if not fast.needs_model:
+            return result
+
+        indices = self._candidates(retriever, fast.leftover, self.top_k, fast.claimed)
+        candidate_ids, relevant_values, key = self._prepare(
+            retriever, indices, current_values, fast.leftover
+        )
+        outside: list[str] = []
+
+        async def deliver_candidates(pairs: Iterable[tuple[str, Any]]) -> None:
+            kept, extra = _restrict(pairs, candidate_ids)
+            outside.extend(extra)
+            await deliver(kept.items())
+
+        cached = mapping_cache.get(key)
+        if cached is not None:
+            await deliver_candidates(cached[0].items())
+            unmatched = cached[1]
+        else:
+            parser = MappingStreamParser()
+            streamed: dict[str, Any] = {}
+            with span("mapper.llm_stream"):
+                started = time.perf_counter()
+                first_token = True
+                stream = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._messages(retriever, indices, relevant_values, fast.leftover),
+                    temperature=0,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    _record_usage(chunk.usage)
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if first_token:
+                        first_token = False
+                        metrics.observe("mapper.llm_first_token", (time.perf_counter() - started) * 1000)
+                    pairs = parser.feed(chunk.choices[0].delta.content)
+                    streamed.update(pairs)
+                    await deliver_candidates(pairs)
+            unmatched = parser.unmatched
+            if parser.complete:
+                mapping_cache.put(key, (streamed, unmatched))
+        unmatched = unmatched + outside
+
+        wider = self._wider(retriever, fast.leftover, indices, fast.claimed)
+        if unmatched and wider is not None:
+            logger.debug("Unmatched content %s, retrying without streaming", unmatched)
+            wider_applied, unmatched = await self._map_candidates(
+                retriever, wider, current_values, fast.leftover
+            )
+            await deliver(wider_applied.items())
+
+        result.unmatched = unmatched
+        logger.debug("LLM streamed fields: %s", list(result.applied))
+        return result
+
+    def _candidates(
+        self,
+        retriever: FieldRetriever,
+        utterance: str,
+        k: int,
+        claimed: set[int],
+    ) -> list[int] | None:
+        """
+        Top-k candidates minus fields the fast path already claimed; None is the whole
+        schema.  A weak best match widens k by `fallback_factor`.
+        """
+        indices, best = retriever.top_k_scored(utterance, k)
+        if indices is not None and best < self.min_score:
+            metrics.increment("mapper.weak_retrieval")
+            indices = retriever.top_k(utterance, k * self.fallback_factor)
+        if not claimed:
+            return indices
+        return [
+            index
+            for index in (range(len(retriever)) if indices is None else indices)
+            if index not in claimed
+        ]
+
+    def _wider(
+        self,
+        retriever: FieldRetriever,
+        utterance: str,
+        indices: list[int] | None,
+        claimed: set[int],
+    ) -> list[int] | None:
+        """The fallback candidate set, or None when `indices` already cover everything."""
+        remaining = len(retriever) - len(claimed)
+        if indices is None or len(indices) >= remaining:
+            return None
+        wider = self._candidates(retriever, utterance, self.top_k * self.fallback_factor, claimed)
+        if wider is None or wider == indices:
+            # Every lexical match was already sent; widen to the whole schema
+            wider = [index for index in range(len(retriever)) if index not in claimed]
+        return wider
+
+    def _prepare(
+        self,
+        retriever: FieldRetriever,
+        indices: list[int] | None,
+        current_values: dict[str, Any],
+        utterance: str,
+    ) -> tuple[list[str] | None, dict[str, Any], str]:
+        """Candidate field ids (None: all), their current values and the cache key."""
+        candidate_ids = None if indices is None else [retriever.field_ids[index] for index in indices]
+        relevant_values = (
+            dict(current_values)
+            if candidate_ids is None
+            else {key: value for key, value in current_values.items() if key in set(candidate_ids)}
+        )
+        key = mapping_key(retriever.digest, self.model, indices, relevant_values, utterance)
+        return candidate_ids, relevant_values, key
+
+    async def _map_candidates(
+        self,
+        retriever: FieldRetriever,
+        indices: list[int] | None,
+        current_values: dict[str, Any],
+        utterance: str,
+    ) -> tuple[dict[str, Any], list[str]]:
+        candidate_ids, relevant_values, key = self._prepare(
+            retriever, indices, current_values, utterance
         )
-        text = response.choices[0].message.content.strip()
+        result = mapping_cache.get(key)
+        if result is None:
+            result = await self._complete(retriever, indices, relevant_values, utterance)
+            mapping_cache.put(key, result)
+        applied, unmatched = result
+        kept, outside = _restrict(applied.items(), candidate_ids)
+        return kept, unmatched + outside
+
+    @retry(wait=wait_exponential(multiplier=1, min=1, max=8), stop=stop_after_attempt(3))
+    async def _complete(
+        self,
+        retriever: FieldRetriever,
+        indices: list[int] | None,
+        current_values: dict[str, Any],
+        utterance: str,
+    ) -> tuple[dict[str, Any], list[str]]:
+        with span("mapper.llm"):
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(retriever, indices, current_values, utterance),
+                temperature=0,
+            )
+        _record_usage(response.usage)
+        return _parse_mapping(response.choices[0].message.content.strip())
+
+    def _messages(
+        self,
+        retriever: FieldRetriever,
+        indices: list[int] | None,
+        current_values: dict[str, Any],
+        utterance: str,
+    ) -> list[dict[str, str]]:
+        """
+        The system prompt is the byte-stable prefix; the user turn carries the
+        candidate fields (the whole schema when `indices` is None), their current
+        values and the utterance, so the prompt grows with the candidates and not
+        with the form.
+
+        With OPENAI_MAPPING_SCHEMA_PREFIX=1 the whole schema follows the system
+        prompt as a second, equally stable system message and the user turn only
+        lists the candidate ids.  Every request then pays prompt tokens for every
+        field of the form; that only beats the pruned payload when the provider's
+        cached-token discount covers the extra fields, i.e. for schemas well past
+        its caching threshold that see many utterances in a row.
+        """
+        request: dict[str, Any] = {"current_values": current_values, "utterance": utterance}
+        if not self.schema_prefix:
+            request = {"schema": retriever.schema_payload(indices), **request}
+            return [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(request, ensure_ascii=False)},
+            ]
+        if indices is not None:
+            request = {"candidate_fields": [retriever.field_ids[index] for index in indices], **request}
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": "Schema: " + retriever.schema_json},
+            {"role": "user", "content": json.dumps(request, ensure_ascii=False)},
+        ]
+
+
+def _record_usage(usage: Any) -> None:
+    """Count prompt, cached-prompt and completion tokens reported by the API."""
+    if usage is None:
+        return
+    metrics.increment("llm.requests")
+    metrics.increment("llm.prompt_tokens", usage.prompt_tokens or 0)
+    metrics.increment("llm.completion_tokens", usage.completion_tokens or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and details.cached_tokens:
+        metrics.increment("llm.cached_prompt_tokens", details.cached_tokens)
+
+
+def _accept(schema: CompiledSchema, pairs: Iterable[tuple[str, Any]]) -> dict[str, Any]:
+    """Normalized values for known fields; unknown fields and invalid values are dropped."""
+    accepted = {}
+    for key, value in pairs:
+        if key not in schema.ids:
+            continue
         try:
-            parsed = json.loads(text)
-        except json.JSONDecodeError:
-            parsed = {}
-        if isinstance(parsed, dict):
-            if "applied" in parsed and isinstance(parsed["applied"], dict):
-                applied = parsed.get("applied", {})
-                unmatched = parsed.get("unmatched", [])
-            else:
-                applied = parsed
-                unmatched = []
+            accepted[key] = schema.normalize(key, value)
+        except InvalidValue as exc:
+            logger.warning("Dropping value for %s: %s", key, exc)
+    return accepted
+
+
+def _restrict(
+    pairs: Iterable[tuple[str, Any]],
+    candidate_ids: list[str] | None,
+) -> tuple[dict[str, Any], list[str]]:
+    """
+    Split model output into values for the candidate fields and, as unmatched text,
+    values it put anywhere else, so the wider retry can place them.
+    """
+    if candidate_ids is None:
+        return dict(pairs), []
+    allowed = set(candidate_ids)
+    kept: dict[str, Any] = {}
+    outside: list[str] = []
+    for key, value in pairs:
+        if key in allowed:
+            kept[key] = value
         else:
-            applied = {}
-            unmatched = []
-        applied = {
-            key: value
-            for key, value in applied.items()
-            if any(field.id == key for field in schema.fields)
-        }
-        if not isinstance(unmatched, list):
-            unmatched = []
+            outside.append(str(value))
+    return kept, outside
+
 
-        print(f"[DEBUG] LLM returned fields: {list(applied.keys())}")
-        return applied, [str(item) for item in unmatched]
+def _parse_mapping(text: str) -> tuple[dict[str, Any], list[str]]:
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = {}
+    if isinstance(parsed, dict):
+        if "applied" in parsed and isinstance(parsed["applied"], dict):
+            applied = parsed.get("applied", {})
+            unmatched = parsed.get("unmatched", [])
+        else:
+            applied = parsed
+            unmatched = []
+    else:
+        applied = {}
+        unmatched = []
+    if not isinstance(unmatched, list):
+        unmatched = []
+    return applied, [str(item) for item in unmatched]
 
 
 _llm_mapper: LlmMapper | None = None
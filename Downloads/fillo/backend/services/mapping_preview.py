@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.instrumentation import span
+from backend.services.llm_mapper import MappingResult, get_mapper
+from backend.services.preview_pages import page_preview_cache
+from backend.services.previewer import broadcast_preview
+from backend.services.storage import storage_service
+
+
+STREAM_BROADCAST_INTERVAL = float(os.getenv("MAPPING_STREAM_BROADCAST_SECONDS", "0.15"))
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewBatcher:
+    """
+    Pushes streamed values to the preview channel in batches, at most one broadcast
+    per `interval` seconds.  Broadcasts carry only the values changed since the
+    form's previous broadcast (no re-rendered pages).
+    """
+
+    def __init__(self, form_id: str, current_values: dict[str, Any], interval: float) -> None:
+        self.form_id = form_id
+        self.values = dict(current_values)
+        self.interval = interval
+        self._pending: list[str] = []
+        self._last_flush = 0.0
+        self.broadcasts = 0
+
+    async def add(self, values: dict[str, Any]) -> None:
+        self.values.update(values)
+        self._pending.extend(key for key in values if key not in self._pending)
+        if time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        streamed, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        self.broadcasts += 1
+        delta = page_preview_cache.record_broadcast(self.form_id, None, {}, self.values, storage_service)
+        with span("preview.broadcast_partial"):
+            await broadcast_preview(
+                self.form_id,
+                [],
+                delta.values,
+                partial=True,
+                streamed_fields=streamed,
+                changed_pages=[],
+                delta=True,
+                sequence=delta.sequence,
+                base_sequence=delta.base_sequence,
+                page_count=delta.page_count,
+                removed_fields=delta.removed_fields,
+            )
+
+
+async def stream_mapping_to_preview(
+    form_id: str,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    utterance: str,
+    on_values: Callable[[dict[str, Any]], Awaitable[None]] | None = None,
+) -> MappingResult:
+    """
+    Map an utterance with a streamed completion, broadcasting fields as the model
+    produces them.  `on_values`, if given, also receives every streamed batch as it
+    arrives.  Returns the final mapping with per-field value sources; the caller
+    still saves the values and schedules the rendered preview afterwards.
+    """
+    batcher = PreviewBatcher(form_id, current_values, STREAM_BROADCAST_INTERVAL)
+
+    async def deliver(values: dict[str, Any]) -> None:
+        await batcher.add(values)
+        if on_values is not None:
+            await on_values(values)
+
+    with span("mapper.stream_total"):
+        result = await get_mapper().stream_values(schema, current_values, utterance, deliver)
+        await batcher.flush()
+    logger.debug("Streamed %d fields in %d preview broadcasts", len(result.applied), batcher.broadcasts)
+    return result
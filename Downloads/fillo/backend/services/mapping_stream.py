@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any
+
+
+_KEY_RE = re.compile(r'\s*("(?:[^"\\]|\\.)*")\s*:\s*$', re.S)
+
+
+class MappingStreamParser:
+    """
+    Incremental parser for a streamed mapping response.
+
+    Fed the completion text chunk by chunk, `feed` returns each {field_id: value}
+    member as soon as its value is complete, for both the flat {field_id: value}
+    shape and the {"applied": {...}, "unmatched": [...]} shape.  Text outside the
+    outermost object (code fences, prose) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._stack: list[str] = []
+        self._member_start: list[int] = []
+        self._in_string = False
+        self._escape = False
+        self._applied_depth: int | None = None
+        self.unmatched: list[str] = []
+        self.complete = False
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        self._text += chunk
+        pairs: list[tuple[str, Any]] = []
+        text = self._text
+        while self._pos < len(text) and not self.complete:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._stack:
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and len(self._stack) == 1 and self._member_key(1) == "applied":
+                    self._applied_depth = 2
+                self._stack.append(char)
+                self._member_start.append(self._pos + 1)
+            elif char in "}]" and self._stack:
+                self._end_member(pairs)
+                self._stack.pop()
+                self._member_start.pop()
+                if self._applied_depth is not None and len(self._stack) < self._applied_depth:
+                    self._applied_depth = None
+                if not self._stack:
+                    self.complete = True
+            elif char == "," and self._stack:
+                self._end_member(pairs)
+                self._member_start[-1] = self._pos + 1
+            self._pos += 1
+        return pairs
+
+    def _member_key(self, depth: int) -> str | None:
+        match = _KEY_RE.match(self._text, self._member_start[depth - 1], self._pos)
+        return json.loads(match.group(1)) if match else None
+
+    def _end_member(self, pairs: list[tuple[str, Any]]) -> None:
+        depth = len(self._stack)
+        if self._stack[-1] != "{" or depth not in (1, self._applied_depth):
+            return
+        member = self._text[self._member_start[-1]:self._pos]
+        if not member.strip():
+            return
+        try:
+            ((key, value),) = json.loads("{" + member + "}").items()
+        except (json.JSONDecodeError, ValueError):
+            return
+        if depth == 1 and key == "unmatched" and isinstance(value, list):
+            self.unmatched = [str(item) for item in value]
+        elif depth == 1 and key == "applied" and isinstance(value, dict):
+            pass  # members were already emitted one by one
+        else:
+            pairs.append((key, value))
@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+import pikepdf
+from reportlab.pdfbase import pdfmetrics
+
+from backend.services.pdf_field_index import ObjGen
+from backend.services.pdf_incremental import page_objgens
+
+
+# "merge" draws widget appearances into page content; "strip" only drops /AcroForm
+FLATTEN_MODE = os.getenv("PDF_FLATTEN_MODE", "merge")
+
+# Field flags (ISO 32000-1 table 228) and annotation flags (table 165)
+_FF_MULTILINE = 1 << 12
+_FF_PASSWORD = 1 << 13
+_FF_COMB = 1 << 24
+_F_HIDDEN = 1 << 1
+_F_NOVIEW = 1 << 5
+
+_PADDING = 2.0
+_AUTO_SIZE_MAX = 12.0
+_AUTO_SIZE_MIN = 4.0
+_LINE_SPACING = 1.15
+_DEFAULT_DA = "/Helv 0 Tf 0 g"
+
+# Acrobat's customary /DR names for the standard fonts
+_STANDARD_ALIASES = {"Helv": "Helvetica", "HeBo": "Helvetica-Bold", "Cour": "Courier", "TiRo": "Times-Roman"}
+
+
+@dataclass
+class _FontMetrics:
+    resource: pikepdf.Object
+    ascent: float
+    descent: float
+    # Glyph widths in 1/1000 em for codes first_char.., or None for a standard font
+    widths: list[float] | None = None
+    first_char: int = 0
+    standard_name: str | None = None
+    missing_width: float = 500.0
+
+    def width(self, encoded: bytes, size: float) -> float:
+        if self.standard_name is not None:
+            return pdfmetrics.stringWidth(encoded.decode("cp1252"), self.standard_name, size)
+        total = 0.0
+        for code in encoded:
+            index = code - self.first_char
+            total += self.widths[index] if 0 <= index < len(self.widths) else self.missing_width
+        return total * size / 1000
+
+
+def _inherited(obj: pikepdf.Dictionary, key: str) -> pikepdf.Object | None:
+    """A field attribute looked up through the /Parent chain."""
+    seen: set[ObjGen] = set()
+    while isinstance(obj, pikepdf.Dictionary) and obj.objgen not in seen:
+        if key in obj:
+            return obj[key]
+        seen.add(obj.objgen)
+        obj = obj.get("/Parent")
+    return None
+
+
+def _widgets(field: pikepdf.Dictionary) -> list[pikepdf.Dictionary]:
+    """The widget annotations of a terminal field: itself when merged, else its kids."""
+    if field.get("/Subtype") == pikepdf.Name.Widget:
+        return [field]
+    return [
+        kid
+        for kid in field.get("/Kids", [])
+        if isinstance(kid, pikepdf.Dictionary) and "/T" not in kid
+    ]
+
+
+def _encode(text: str) -> bytes:
+    """WinAnsi bytes of `text`; raises UnicodeEncodeError for characters outside it."""
+    return text.encode("cp1252")
+
+
+def _literal(encoded: bytes) -> str:
+    escaped = encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return "(" + escaped.decode("latin-1") + ")"
+
+
+def _parse_da(da: str) -> tuple[str, float, str]:
+    """(font resource name, size, remaining color operators) of a /DA string."""
+    tokens = da.split()
+    if "Tf" not in tokens:
+        return "Helv", 0.0, da
+    index = len(tokens) - 1 - tokens[::-1].index("Tf")
+    if index < 2:
+        return "Helv", 0.0, da
+    try:
+        size = float(tokens[index - 1])
+    except ValueError:
+        size = 0.0
+    rest = tokens[: index - 2] + tokens[index + 1:]
+    return tokens[index - 2].lstrip("/"), size, " ".join(rest)
+
+
+class AppearanceBuilder:
+    """
+    Builds normal appearance streams (/AP /N) for filled text fields of one document,
+    the way a viewer would: font and size from /DA (0 means auto-size), /Q alignment,
+    comb, multiline and password flags.  Font metrics are resolved once per font.
+
+    Fields it cannot lay out faithfully (composite fonts, rotated widgets, values
+    with characters outside WinAnsi) keep the previous behaviour: their /AP is
+    dropped and /NeedAppearances asks the viewer to regenerate it.
+    """
+
+    def __init__(self, pdf: pikepdf.Pdf) -> None:
+        self.pdf = pdf
+        acroform = pdf.Root.get("/AcroForm")
+        self._acroform = acroform if isinstance(acroform, pikepdf.Dictionary) else None
+        self._dr_fonts = self._acroform.get("/DR", {}).get("/Font", {}) if self._acroform else {}
+        self._fonts: dict[str, _FontMetrics | None] = {}
+        # One shared /Resources dictionary per font across the generated streams
+        self._resources: dict[str, pikepdf.Object] = {}
+
+    def apply(self, field: pikepdf.Dictionary, value: str, changed: set[ObjGen] | None = None) -> int:
+        """Set appearances for every widget of `field`; returns how many were generated."""
+        generated = 0
+        for widget in _widgets(field):
+            stream = self._build(field, widget, value)
+            if stream is None:
+                if "/AP" in widget:
+                    del widget["/AP"]
+                self._need_appearances(changed)
+            else:
+                widget.AP = pikepdf.Dictionary(N=stream)
+                generated += 1
+            if changed is not None and widget.objgen != (0, 0):
+                changed.add(widget.objgen)
+        return generated
+
+    def _need_appearances(self, changed: set[ObjGen] | None) -> None:
+        if self._acroform is not None and not self._acroform.get("/NeedAppearances", False):
+            self._acroform.NeedAppearances = True
+            if changed is not None and self._acroform.objgen != (0, 0):
+                changed.add(self._acroform.objgen)
+
+    def _font(self, name: str) -> _FontMetrics | None:
+        if name not in self._fonts:
+            self._fonts[name] = self._load_font(name)
+        return self._fonts[name]
+
+    def _load_font(self, name: str) -> _FontMetrics | None:
+        font = self._dr_fonts.get("/" + name)
+        if font is None:
+            # Not in /DR: fall back to the standard font the name conventionally stands for
+            base = _STANDARD_ALIASES.get(name, "Helvetica")
+            font = self.pdf.make_indirect(
+                pikepdf.Dictionary(
+                    Type=pikepdf.Name.Font,
+                    Subtype=pikepdf.Name.Type1,
+                    BaseFont=pikepdf.Name("/" + base),
+                    Encoding=pikepdf.Name.WinAnsiEncoding,
+                )
+            )
+        if font.get("/Subtype") not in (pikepdf.Name.Type1, pikepdf.Name.TrueType, pikepdf.Name.MMType1):
+            return None
+
+        base_font = str(font.get("/BaseFont", "/Helvetica")).lstrip("/")
+        descriptor = font.get("/FontDescriptor")
+        if "/Widths" not in font and base_font in pdfmetrics.standardFonts:
+            face = pdfmetrics.getFont(base_font).face
+            return _FontMetrics(font, face.ascent, face.descent, standard_name=base_font)
+        if "/Widths" not in font or descriptor is None:
+            return None
+        return _FontMetrics(
+            font,
+            float(descriptor.get("/Ascent", 750)),
+            float(descriptor.get("/Descent", -250)),
+            widths=[float(width) for width in font.Widths],
+            first_char=int(font.get("/FirstChar", 0)),
+            missing_width=float(descriptor.get("/MissingWidth", 500)),
+        )
+
+    def _build(self, field: pikepdf.Dictionary, widget: pikepdf.Dictionary, value: str) -> pikepdf.Stream | None:
+        if int(widget.get("/MK", {}).get("/R", 0)) % 360:
+            return None
+        x1, y1, x2, y2 = (float(v) for v in widget.Rect)
+        width, height = abs(x2 - x1), abs(y2 - y1)
+
+        da = _inherited(widget, "/DA")
+        if da is None and self._acroform is not None:
+            da = self._acroform.get("/DA")
+        font_name, size, color = _parse_da(str(da) if da is not None else _DEFAULT_DA)
+        font = self._font(font_name)
+        if font is None:
+            return None
+
+        flags = int(_inherited(widget, "/Ff") or 0)
+        quadding = _inherited(widget, "/Q")
+        if quadding is None and self._acroform is not None:
+            quadding = self._acroform.get("/Q")
+        alignment = int(quadding or 0)
+        if flags & _FF_PASSWORD:
+            value = "*" * len(value)
+        try:
+            _encode(value)
+        except UnicodeEncodeError:
+            # A substitute glyph would be drawn, and flattening would bake it in
+            return None
+
+        max_len = _inherited(widget, "/MaxLen")
+        if flags & _FF_COMB and max_len and not flags & _FF_MULTILINE:
+            text_ops, size = self._comb(font, value, size, width, height, int(max_len))
+        elif flags & _FF_MULTILINE:
+            text_ops, size = self._multiline(font, value, size, width, height, alignment)
+        else:
+            text_ops, size = self._single_line(font, value, size, width, height, alignment)
+
+        inner = width - 2 * _PADDING, height - 2 * _PADDING
+        content = (
+            f"/Tx BMC\nq\n{_PADDING:.2f} {_PADDING:.2f} {max(inner[0], 0):.2f} {max(inner[1], 0):.2f} re W n\n"
+            f"BT\n/{font_name} {size:.2f} Tf\n{color}\n{text_ops}ET\nQ\nEMC\n"
+        )
+        resources = self._resources.get(font_name)
+        if resources is None:
+            resources = self._resources[font_name] = self.pdf.make_indirect(
+                pikepdf.Dictionary(Font=pikepdf.Dictionary({"/" + font_name: font.resource}))
+            )
+        stream = pikepdf.Stream(
+            self.pdf,
+            content.encode("latin-1"),
+            Type=pikepdf.Name.XObject,
+            Subtype=pikepdf.Name.Form,
+            BBox=[0, 0, width, height],
+            Resources=resources,
+        )
+        return self.pdf.make_indirect(stream)
+
+    def _baseline(self, font: _FontMetrics, size: float, height: float) -> float:
+        """Baseline that centers the font's ascent-descent box vertically."""
+        box = (font.ascent - font.descent) * size / 1000
+        return (height - box) / 2 - font.descent * size / 1000
+
+    def _single_line(
+        self, font: _FontMetrics, value: str, size: float, width: float, height: float, alignment: int
+    ) -> tuple[str, float]:
+        encoded = _encode(value.replace("\r", " ").replace("\n", " "))
+        if not size:
+            size = min(_AUTO_SIZE_MAX, (height - 2 * _PADDING) * 1000 / (font.ascent - font.descent))
+            text_width = font.width(encoded, size)
+            if text_width > width - 2 * _PADDING > 0:
+                size *= (width - 2 * _PADDING) / text_width
+            size = max(size, _AUTO_SIZE_MIN)
+        text_width = font.width(encoded, size)
+        x = self._aligned_x(text_width, width, alignment)
+        y = self._baseline(font, size, height)
+        return f"1 0 0 1 {x:.2f} {y:.2f} Tm\n{_literal(encoded)} Tj\n", size
+
+    def _aligned_x(self, text_width: float, width: float, alignment: int) -> float:
+        if alignment == 1:
+            return (width - text_width) / 2
+        if alignment == 2:
+            return width - _PADDING - text_width
+        return _PADDING
+
+    def _comb(
+        self, font: _FontMetrics, value: str, size: float, width: float, height: float, max_len: int
+    ) -> tuple[str, float]:
+        cell = width / max_len
+        if not size:
+            size = max(_AUTO_SIZE_MIN, min(_AUTO_SIZE_MAX, (height - 2 * _PADDING) * 1000 / (font.ascent - font.descent)))
+        y = self._baseline(font, size, height)
+        ops = []
+        for index, char in enumerate(value[:max_len]):
+            encoded = _encode(char)
+            x = index * cell + (cell - font.width(encoded, size)) / 2
+            ops.append(f"1 0 0 1 {x:.2f} {y:.2f} Tm\n{_literal(encoded)} Tj\n")
+        return "".join(ops), size
+
+    def _wrap(self, font: _FontMetrics, value: str, size: float, available: float) -> list[bytes]:
+        lines: list[bytes] = []
+        for paragraph in value.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+            line = b""
+            for word in _encode(paragraph).split(b" "):
+                candidate = line + b" " + word if line else word
+                if font.width(candidate, size) <= available or not line:
+                    line = candidate
+                else:
+                    lines.append(line)
+                    line = word
+                # Break words that do not fit on a line of their own
+                while font.width(line, size) > available and len(line) > 1:
+                    cut = len(line) - 1
+                    while cut > 1 and font.width(line[:cut], size) > available:
+                        cut -= 1
+                    lines.append(line[:cut])
+                    line = line[cut:]
+            lines.append(line)
+        return lines
+
+    def _multiline(
+        self, font: _FontMetrics, value: str, size: float, width: float, height: float, alignment: int
+    ) -> tuple[str, float]:
+        available = width - 2 * _PADDING
+        if size:
+            lines = self._wrap(font, value, size, available)
+        else:
+            size = _AUTO_SIZE_MAX
+            while True:
+                lines = self._wrap(font, value, size, available)
+                if size <= _AUTO_SIZE_MIN or len(lines) * size * _LINE_SPACING <= height - 2 * _PADDING:
+                    break
+                size = max(_AUTO_SIZE_MIN, size - 1)
+        leading = size * _LINE_SPACING
+        y = height - _PADDING - font.ascent * size / 1000
+        ops = []
+        for line in lines:
+            x = self._aligned_x(font.width(line, size), width, alignment)
+            ops.append(f"1 0 0 1 {x:.2f} {y:.2f} Tm\n{_literal(line)} Tj\n")
+            y -= leading
+        return "".join(ops), size
+
+
+def _normal_appearance(widget: pikepdf.Dictionary) -> pikepdf.Stream | None:
+    appearance = widget.get("/AP", {}).get("/N")
+    if isinstance(appearance, pikepdf.Dictionary) and not isinstance(appearance, pikepdf.Stream):
+        state = widget.get("/AS")
+        appearance = appearance.get(state) if state is not None else None
+    if not isinstance(appearance, pikepdf.Stream) or "/BBox" not in appearance:
+        return None
+    return appearance
+
+
+def _placement(appearance: pikepdf.Stream, rect: pikepdf.Array) -> str:
+    """
+    The `cm` matrix that maps the appearance's transformed /BBox onto the
+    annotation /Rect (ISO 32000-1 §12.5.5).
+    """
+    bx1, by1, bx2, by2 = (float(v) for v in appearance.BBox)
+    a, b, c, d, e, f = (float(v) for v in appearance.get("/Matrix", [1, 0, 0, 1, 0, 0]))
+    corners = [(a * x + c * y + e, b * x + d * y + f) for x in (bx1, bx2) for y in (by1, by2)]
+    xs, ys = [x for x, _ in corners], [y for _, y in corners]
+    rx1, ry1, rx2, ry2 = (float(v) for v in rect)
+    rx1, rx2 = min(rx1, rx2), max(rx1, rx2)
+    ry1, ry2 = min(ry1, ry2), max(ry1, ry2)
+    sx = (rx2 - rx1) / (max(xs) - min(xs)) if max(xs) != min(xs) else 1.0
+    sy = (ry2 - ry1) / (max(ys) - min(ys)) if max(ys) != min(ys) else 1.0
+    return f"{sx:.6f} 0 0 {sy:.6f} {rx1 - min(xs) * sx:.4f} {ry1 - min(ys) * sy:.4f} cm"
+
+
+def flatten_form(pdf: pikepdf.Pdf, changed: set[ObjGen] | None = None, mode: str | None = None) -> int:
+    """
+    Flatten the interactive form and return the number of widgets merged.
+
+    mode "merge" (PDF_FLATTEN_MODE default) draws each visible widget's normal
+    appearance into its page as a Form XObject, drops the widget annotations and
+    then /AcroForm, so any viewer shows the values without regenerating
+    appearances.  An appearance shared by several widgets becomes one XObject
+    resource per page.  Mode "strip" only drops /AcroForm.
+    """
+    if (mode or FLATTEN_MODE) == "merge":
+        merged = _merge_widgets(pdf, changed)
+    else:
+        merged = 0
+    if "/AcroForm" in pdf.Root:
+        del pdf.Root.AcroForm
+        if changed is not None:
+            changed.add(pdf.Root.objgen)
+    return merged
+
+
+def _merge_widgets(pdf: pikepdf.Pdf, changed: set[ObjGen] | None) -> int:
+    merged = 0
+    for page in pdf.pages:
+        annots = page.obj.get("/Annots")
+        if not annots:
+            continue
+        kept = pikepdf.Array()
+        names: dict[ObjGen, pikepdf.Name] = {}
+        xobjects = page.obj.get("/Resources", {}).get("/XObject", {})
+        operators = []
+        for annot in annots:
+            if not isinstance(annot, pikepdf.Dictionary) or annot.get("/Subtype") != pikepdf.Name.Widget:
+                kept.append(annot)
+                continue
+            appearance = _normal_appearance(annot)
+            if appearance is None or int(annot.get("/F", 0)) & (_F_HIDDEN | _F_NOVIEW) or "/Rect" not in annot:
+                continue
+            if appearance.get("/Subtype") != pikepdf.Name.Form:
+                appearance.Type = pikepdf.Name.XObject
+                appearance.Subtype = pikepdf.Name.Form
+                if changed is not None and appearance.objgen != (0, 0):
+                    changed.add(appearance.objgen)
+            name = names.get(appearance.objgen)
+            if name is None:
+                # Sequential, unused names so identical fills give identical bytes
+                name = pikepdf.Name(f"/FxFl{len(names)}")
+                while name in xobjects:
+                    name = pikepdf.Name(f"{name}_")
+                page.add_resource(appearance, pikepdf.Name.XObject, name=name)
+                names[appearance.objgen] = name
+            operators.append(f"q {_placement(appearance, annot.Rect)} {name} Do Q\n")
+            merged += 1
+
+        if operators:
+            page.contents_add(pikepdf.Stream(pdf, b"q\n"), prepend=True)
+            page.contents_add(pikepdf.Stream(pdf, ("Q\n" + "".join(operators)).encode("ascii")))
+        if len(kept):
+            page.obj.Annots = kept
+        else:
+            del page.obj["/Annots"]
+        if changed is not None:
+            changed.update(page_objgens(page))
+    return merged
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class PdfExecutorBusy(RuntimeError):
+    """Raised when the executor already holds its maximum number of queued tasks."""
+
+
+class PdfTaskTimeout(RuntimeError):
+    """Raised when a task does not finish within the executor's timeout."""
+
+
+def _warm_worker(preload_paths: tuple[str, ...]) -> None:
+    """Process-pool initializer: import the PDF stack and parse hot templates up front."""
+    import pikepdf  # noqa: F401
+    import pypdfium2  # noqa: F401
+    import PyPDF2  # noqa: F401
+    from reportlab.pdfgen import canvas  # noqa: F401
+
+    from backend.services.template_cache import template_cache
+
+    for path in preload_paths:
+        try:
+            template_cache.get(path)
+        except OSError as exc:
+            logger.warning("Could not preload template %s: %s", path, exc)
+
+
+def _worker_ready() -> None:
+    """No-op task used to start process workers (the initializer does the warming)."""
+
+
+class PdfExecutor:
+    """
+    Runs CPU-bound PDF work (pikepdf, PyPDF2, reportlab, pdfium) off the event loop.
+
+    backend="thread" keeps today's behaviour; backend="process" sidesteps the GIL
+    with a pool of warm worker processes.  Functions and arguments must then be
+    picklable, and each worker keeps its own template cache.
+
+    At most `max_pending` tasks may be queued or running; further submissions fail
+    fast with PdfExecutorBusy so callers can answer 503 instead of piling up work.
+    A task not finished within `timeout` (queue wait included) raises
+    PdfTaskTimeout; the worker is not interrupted and its slot frees up once the
+    underlying call returns.
+
+    `start()` creates and warms the pool from the app's startup hook, so the first
+    requests do not pay for process start-up and template preloading; without it
+    the pool is created cold on first use.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        max_workers: int,
+        max_pending: int,
+        timeout: float,
+        preload_paths: tuple[str, ...] = (),
+    ) -> None:
+        if backend not in {"thread", "process"}:
+            raise ValueError(f"Unknown PDF executor backend {backend!r}")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.preload_paths = preload_paths
+        self._executor: Executor | None = None
+        self._started = False
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.backend == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_warm_worker,
+                    initargs=(self.preload_paths,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="pdf-worker",
+                )
+        return self._executor
+
+    async def start(self) -> None:
+        """
+        Create the pool and warm it.  In process mode every worker process is started
+        and runs `_warm_worker`; threads share the parent's template cache, so it is
+        preloaded once.
+        """
+        if self._started:
+            return
+        executor = self._get_executor()
+        if self.backend == "process":
+            # Each submission that finds no idle worker spawns one, up to max_workers
+            warmups = [executor.submit(_worker_ready) for _ in range(self.max_workers)]
+        else:
+            warmups = [executor.submit(_warm_worker, self.preload_paths)]
+        await asyncio.gather(*(asyncio.wrap_future(warmup) for warmup in warmups))
+        self._started = True
+        logger.info(
+            "PDF executor started: %s backend, %d worker(s), %d preloaded template(s)",
+            self.backend,
+            self.max_workers,
+            len(self.preload_paths),
+        )
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise PdfExecutorBusy(f"PDF executor is at capacity ({self.max_pending} tasks)")
+
+        loop = asyncio.get_running_loop()
+        task = self._get_executor().submit(func, *args)
+        self._pending += 1
+        self.submitted += 1
+        # The slot frees when the worker finishes (or the task is cancelled before it
+        # starts), not when the caller stops waiting for it
+        task.add_done_callback(lambda _: self._release(loop))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(task), self.timeout)
+        except asyncio.TimeoutError as exc:
+            self.timeouts += 1
+            raise PdfTaskTimeout(f"PDF task exceeded {self.timeout}s") from exc
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called from the worker thread (or the process pool's management thread)
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:
+            # Event loop already closed
+            self._decrement()
+
+    def _decrement(self) -> None:
+        self._pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._started = False
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "started": self._started,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+pdf_executor = PdfExecutor(
+    backend=os.getenv("PDF_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("PDF_EXECUTOR_WORKERS", str(os.cpu_count() or 2))),
+    max_pending=int(os.getenv("PDF_EXECUTOR_MAX_PENDING", "64")),
+    timeout=float(os.getenv("PDF_TASK_TIMEOUT_SECONDS", "120")),
+    preload_paths=tuple(
+        path.strip() for path in os.getenv("PDF_PRELOAD_TEMPLATES", "").split(",") if path.strip()
+    ),
+)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from collections import deque
+
+import pikepdf
+
+
+ObjGen = tuple[int, int]
+
+
+def _candidate_names(field_id: str) -> tuple[str, ...]:
+    """
+    Name variants a schema field id may appear under in the PDF.
+
+    The schema sanitizes PDF field names ("1001" -> "f_1001", spaces -> underscores),
+    so we try the id itself, the id without its prefix and the prefix-less id with
+    underscores turned back into spaces.
+    """
+    stripped = field_id.removeprefix("f_").removeprefix("field_")
+    unsanitized = stripped.replace("_", " ")
+    return tuple(dict.fromkeys((field_id, stripped, unsanitized)))
+
+
+class FieldIndex:
+    """
+    Name -> PDF field lookup table built once per template.
+
+    Every name is registered under the same match strategies the writers used to
+    evaluate per value:
+    - exact name (also the fully qualified "parent.child" name for /Kids)
+    - suffix after any underscore (e.g. "parent_1001" matches "1001")
+    - prefix before any space (e.g. "1020 Radio Button 1" matches "1020")
+
+    Entries hold (objnum, gen) references rather than the objects themselves, so an
+    index built from one open of a template can resolve fields in another open of
+    the same file.  Field dictionaries are indirect objects per the PDF spec; the
+    rare direct ones are skipped.
+    """
+
+    def __init__(self) -> None:
+        self._exact: dict[str, ObjGen] = {}
+        self._suffix: dict[str, ObjGen] = {}
+        self._prefix: dict[str, ObjGen] = {}
+        self.names: list[str] = []
+
+    @classmethod
+    def build(cls, pdf: pikepdf.Pdf) -> FieldIndex:
+        index = cls()
+        seen: set[ObjGen] = set()
+
+        # Breadth-first so top-level fields win name collisions over nested kids
+        queue: deque[tuple[pikepdf.Object, str | None]] = deque()
+        if "/AcroForm" in pdf.Root and "/Fields" in pdf.Root.AcroForm:
+            for field in pdf.Root.AcroForm.Fields:
+                queue.append((field, None))
+
+        while queue:
+            field, parent_name = queue.popleft()
+            if not isinstance(field, pikepdf.Dictionary) or field.objgen in seen:
+                continue
+            seen.add(field.objgen)
+
+            qualified_name = parent_name
+            if "/T" in field:
+                name = str(field["/T"])
+                qualified_name = f"{parent_name}.{name}" if parent_name else name
+                index._register(name, field.objgen)
+                if qualified_name != name:
+                    index._register(qualified_name, field.objgen)
+
+            if "/Kids" in field:
+                for kid in field.Kids:
+                    queue.append((kid, qualified_name))
+
+        # Widget annotations that are not reachable from /AcroForm/Fields
+        for page in pdf.pages:
+            if "/Annots" not in page:
+                continue
+            for annot in page.Annots:
+                if not isinstance(annot, pikepdf.Dictionary) or annot.objgen in seen:
+                    continue
+                seen.add(annot.objgen)
+                if "/T" in annot:
+                    index._register(str(annot["/T"]), annot.objgen)
+
+        return index
+
+    def _register(self, name: str, objgen: ObjGen) -> None:
+        if objgen == (0, 0):
+            return
+        if name not in self._exact:
+            self.names.append(name)
+        self._exact.setdefault(name, objgen)
+        for pos, char in enumerate(name):
+            if char == "_":
+                self._suffix.setdefault(name[pos + 1:], objgen)
+            elif char == " ":
+                self._prefix.setdefault(name[:pos], objgen)
+
+    def objgens(self) -> set[ObjGen]:
+        return set(self._exact.values())
+
+    def resolve(self, field_id: str, *, match_suffix: bool = False) -> ObjGen | None:
+        """
+        Return the (objnum, gen) of the PDF field matching a schema field id.
+        Exact matches take precedence over suffix and prefix matches.
+        """
+        candidates = _candidate_names(field_id)
+        tables = [self._exact]
+        if match_suffix:
+            tables.append(self._suffix)
+        tables.append(self._prefix)
+        for table in tables:
+            for name in candidates:
+                objgen = table.get(name)
+                if objgen is not None:
+                    return objgen
+        return None
+
+    def find(
+        self,
+        pdf: pikepdf.Pdf,
+        field_id: str,
+        *,
+        match_suffix: bool = False,
+    ) -> pikepdf.Dictionary | None:
+        """Resolve a schema field id to its field dictionary in `pdf`."""
+        objgen = self.resolve(field_id, match_suffix=match_suffix)
+        if objgen is None:
+            return None
+        return pdf.get_object(objgen)
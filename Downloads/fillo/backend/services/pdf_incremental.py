@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import mmap
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import pikepdf
+
+from backend.services.pdf_field_index import ObjGen
+
+
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)\s+%%EOF")
+
+
+def _last_startxref(original: bytes | mmap.mmap) -> int:
+    matches = list(_STARTXREF_RE.finditer(original, max(0, len(original) - 4096)))
+    if not matches:
+        raise ValueError("Original PDF has no startxref; cannot append an incremental update")
+    return int(matches[-1].group(1))
+
+
+def _serialize_object(obj: pikepdf.Object, objgen: ObjGen) -> bytes:
+    num, gen = objgen
+    header = f"{num} {gen} obj\n".encode("ascii")
+    if isinstance(obj, pikepdf.Stream):
+        raw = obj.read_raw_bytes()
+        stream_dict = pikepdf.Dictionary(obj.stream_dict)
+        stream_dict.Length = len(raw)
+        return (
+            header
+            + stream_dict.unparse(resolved=True)
+            + b"\nstream\n"
+            + raw
+            + b"\nendstream\nendobj\n"
+        )
+    return header + obj.unparse(resolved=True) + b"\nendobj\n"
+
+
+def _subsections(objnums: list[int]) -> list[list[int]]:
+    runs: list[list[int]] = []
+    for num in objnums:
+        if runs and runs[-1][-1] == num - 1:
+            runs[-1].append(num)
+        else:
+            runs.append([num])
+    return runs
+
+
+def _trailer_entries(pdf: pikepdf.Pdf) -> bytes:
+    parts = [b"/Root " + pdf.trailer.Root.unparse()]
+    if "/Info" in pdf.trailer:
+        parts.append(b"/Info " + pdf.trailer.Info.unparse())
+    if "/ID" in pdf.trailer:
+        parts.append(b"/ID " + pdf.trailer.ID.unparse(resolved=True))
+    return b" ".join(parts)
+
+
+def page_objgens(page: pikepdf.Page) -> set[ObjGen]:
+    """
+    Indirect objects that change when content or resources are added to a page:
+    the page itself plus its /Resources, /Resources/Font, /Resources/XObject and
+    /Contents array when those are shared indirect objects.
+    """
+    touched = {page.obj.objgen}
+    candidates = []
+    if "/Resources" in page.obj:
+        resources = page.obj.Resources
+        candidates.append(resources)
+        for key in ("/Font", "/XObject"):
+            if key in resources:
+                candidates.append(resources[key])
+    if "/Contents" in page.obj and isinstance(page.obj.Contents, pikepdf.Array):
+        candidates.append(page.obj.Contents)
+    for obj in candidates:
+        if obj.objgen != (0, 0):
+            touched.add(obj.objgen)
+    return touched
+
+
+def created_objgens(pdf: pikepdf.Pdf, changed: Iterable[ObjGen], max_objnum: int) -> set[ObjGen]:
+    """
+    Objects created on the working copy that are reachable from the `changed` ones.
+
+    QPDF numbers new objects past the original's highest object number, and an
+    original object can only reference a new one if it was changed, so the walk
+    starts at the changed objects and descends into new objects only.  Original
+    objects are never resolved beyond those already loaded by the fill.
+    """
+    created: set[ObjGen] = set()
+    stack = [pdf.get_object(objgen) for objgen in changed]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+            children = [value for _, value in obj.items()]
+        elif isinstance(obj, pikepdf.Array):
+            children = list(obj)
+        else:
+            continue
+        for child in children:
+            if not isinstance(child, (pikepdf.Dictionary, pikepdf.Stream, pikepdf.Array)):
+                continue
+            objgen = child.objgen
+            if objgen == (0, 0):
+                stack.append(child)
+            elif objgen[0] > max_objnum and objgen not in created:
+                created.add(objgen)
+                stack.append(child)
+    return created
+
+
+def build_incremental_update(
+    original: bytes | mmap.mmap,
+    pdf: pikepdf.Pdf,
+    changed: Iterable[ObjGen],
+    max_objnum: int,
+) -> bytes:
+    """
+    Serialize the objects of `pdf` that differ from `original` as a PDF incremental
+    update (ISO 32000-1 §7.5.6) and return only the bytes to append.
+
+    `changed` are the modified objects that already existed in the original; objects
+    created on the working copy (numbered past `max_objnum`) are collected by
+    `created_objgens`.  The cross-reference section is written in the same form the
+    original uses (table or stream), chained to it through /Prev.
+    """
+    if "/Encrypt" in pdf.trailer:
+        raise ValueError("Incremental updates are not supported for encrypted PDFs")
+
+    prev_xref = _last_startxref(original)
+    uses_xref_stream = original[prev_xref:prev_xref + 4] != b"xref"
+
+    objgens = set(changed)
+    objgens |= created_objgens(pdf, objgens, max_objnum)
+
+    out = bytearray()
+    if original[-1:] not in (b"\n", b"\r"):
+        out += b"\n"
+
+    base = len(original)
+    offsets: dict[int, tuple[int, int]] = {}
+    for objgen in sorted(objgens):
+        offsets[objgen[0]] = (base + len(out), objgen[1])
+        out += _serialize_object(pdf.get_object(objgen), objgen)
+
+    size = max(int(pdf.trailer.get("/Size", 0)), max_objnum + 1, max(objgens, default=(0, 0))[0] + 1)
+    xref_offset = base + len(out)
+
+    if uses_xref_stream:
+        xref_num = size
+        size += 1
+        offsets[xref_num] = (xref_offset, 0)
+        objnums = sorted(offsets)
+        offset_width = max(4, (xref_offset.bit_length() + 7) // 8)
+        rows = bytearray()
+        for objnum in objnums:
+            offset, gen = offsets[objnum]
+            rows += b"\x01" + offset.to_bytes(offset_width, "big") + gen.to_bytes(2, "big")
+        index = " ".join(f"{run[0]} {len(run)}" for run in _subsections(objnums))
+        out += (
+            f"{xref_num} 0 obj\n<< /Type /XRef /Size {size} /Prev {prev_xref}"
+            f" /W [ 1 {offset_width} 2 ] /Index [ {index} ] /Length {len(rows)} "
+        ).encode("ascii")
+        out += _trailer_entries(pdf) + b" >>\nstream\n" + bytes(rows) + b"\nendstream\nendobj\n"
+    else:
+        out += b"xref\n"
+        for run in _subsections(sorted(offsets)):
+            out += f"{run[0]} {len(run)}\n".encode("ascii")
+            for objnum in run:
+                offset, gen = offsets[objnum]
+                out += f"{offset:010d} {gen:05d} n \n".encode("ascii")
+        out += f"trailer\n<< /Size {size} /Prev {prev_xref} ".encode("ascii")
+        out += _trailer_entries(pdf) + b" >>\n"
+
+    out += f"startxref\n{xref_offset}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def iter_incremental(
+    orig_path: str | Path,
+    delta_path: str | Path,
+    chunk_size: int = 1024 * 1024,
+) -> Iterator[bytes]:
+    """Yield a stored template followed by its stored delta, i.e. the complete PDF."""
+    for path in (orig_path, delta_path):
+        with open(path, "rb") as fh:
+            while chunk := fh.read(chunk_size):
+                yield chunk
+
+
+def assemble_incremental(orig_path: str | Path, delta_path: str | Path) -> bytes:
+    return b"".join(iter_incremental(orig_path, delta_path))
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO
+
+import pikepdf
+
+from backend.services.instrumentation import metrics, span
+
+
+@dataclass(frozen=True)
+class SaveProfile:
+    """How a filled document is serialized."""
+
+    name: str
+    linearize: bool
+    object_streams: pikepdf.ObjectStreamMode
+    # Compress streams written uncompressed (generated content, appearances)
+    compress_streams: bool
+    # Decode and re-deflate existing Flate streams at the highest level
+    recompress: bool
+    # Merge identical simple font dictionaries (the per-page checkmark fonts)
+    dedupe_fonts: bool
+
+
+SAVE_PROFILES = {
+    # Intermediate buffers and throwaway preview sources: least CPU, bytes copied as-is
+    "preview": SaveProfile(
+        name="preview",
+        linearize=False,
+        object_streams=pikepdf.ObjectStreamMode.preserve,
+        compress_streams=False,
+        recompress=False,
+        dedupe_fonts=False,
+    ),
+    # Files handed to users: smallest output, fast first page in viewers
+    "delivery": SaveProfile(
+        name="delivery",
+        linearize=True,
+        object_streams=pikepdf.ObjectStreamMode.generate,
+        compress_streams=True,
+        recompress=True,
+        dedupe_fonts=True,
+    ),
+}
+
+DEFAULT_SAVE_PROFILE = os.getenv("PDF_SAVE_PROFILE", "delivery")
+
+logger = logging.getLogger(__name__)
+
+
+def save_profile(name: str | None = None) -> SaveProfile:
+    """The profile called `name`, else PDF_SAVE_PROFILE, else "delivery"."""
+    name = name or DEFAULT_SAVE_PROFILE
+    try:
+        return SAVE_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown save profile {name!r}; choose from {sorted(SAVE_PROFILES)}") from None
+
+
+def dedupe_fonts(pdf: pikepdf.Pdf) -> int:
+    """
+    Point every page at one shared object per distinct simple font dictionary and
+    return how many references were replaced.
+
+    The reportlab overlay and merged batch documents carry a separate, identical
+    ZapfDingbats/Helvetica dictionary per page.  Fonts with a /FontDescriptor (embedded
+    or metric-bearing) are left alone.
+    """
+    canonical: dict[bytes, pikepdf.Object] = {}
+    replaced = 0
+    for page in pdf.pages:
+        fonts = page.obj.get("/Resources", {}).get("/Font")
+        if not isinstance(fonts, pikepdf.Dictionary):
+            continue
+        for name, font in list(fonts.items()):
+            if not isinstance(font, pikepdf.Dictionary) or "/FontDescriptor" in font:
+                continue
+            key = font.unparse(resolved=True)
+            shared = canonical.get(key)
+            if shared is None:
+                canonical[key] = font if font.is_indirect else pdf.make_indirect(font)
+                if not font.is_indirect:
+                    fonts[name] = canonical[key]
+            elif shared.objgen != font.objgen:
+                fonts[name] = shared
+                replaced += 1
+    if replaced:
+        logger.debug("Merged %d duplicate font reference(s)", replaced)
+    return replaced
+
+
+def save_pdf(pdf: pikepdf.Pdf, profile: SaveProfile, output: BinaryIO | None = None) -> memoryview | None:
+    """
+    Serialize `pdf` with `profile` into `output`, or into memory and return a view of
+    the buffer (no copy; storage writes accept it as is).  Every save is timed per
+    profile and counted.
+    """
+    metrics.increment(f"writer.profile.{profile.name}")
+    with span(f"writer.save_profile.{profile.name}"):
+        if profile.dedupe_fonts:
+            dedupe_fonts(pdf)
+        target = output if output is not None else BytesIO()
+        pdf.save(
+            target,
+            linearize=profile.linearize,
+            object_stream_mode=profile.object_streams,
+            compress_streams=profile.compress_streams,
+            recompress_flate=profile.recompress,
+            stream_decode_level=(
+                pikepdf.StreamDecodeLevel.generalized if profile.recompress else pikepdf.StreamDecodeLevel.none
+            ),
+        )
+    return target.getbuffer() if output is None else None
@@ -1,45 +1,66 @@
 from __future__ import annotations
 
-from io import BytesIO
+import logging
+import time
 from pathlib import Path
 from typing import Any
 
 import pikepdf
-from anyio import to_thread
 
-from backend.schemas.form_schema import FieldDefinition, FormSchema
+from backend.services.compiled_schema import CHOICE_TYPES, TEXT_TYPES, CompiledField, CompiledSchema
+from backend.services.instrumentation import metrics, span
+from backend.services.pdf_appearance import AppearanceBuilder, flatten_form
+from backend.services.pdf_executor import pdf_executor
+from backend.services.pdf_field_index import FieldIndex
+from backend.services.pdf_save import save_pdf, save_profile
 from backend.services.storage import StorageService
+from backend.services.template_cache import template_cache
 
+logger = logging.getLogger(__name__)
 
-def _fill_field_value(field_obj: pikepdf.Dictionary, field_def: FieldDefinition, value: Any) -> None:
+
+def _fill_field_value(
+    field_obj: pikepdf.Dictionary,
+    field_def: CompiledField,
+    value: Any,
+    states: tuple[str, ...] | None = None,
+    appearances: AppearanceBuilder | None = None,
+) -> None:
     """
     Directly set the value of a PDF form field using pikepdf.
     This properly fills the interactive form fields instead of drawing overlays.
+
+    `states` are the field's /AP/N appearance states when already known from the
+    template cache; otherwise they are read from the field.  Text appearances are
+    generated with `appearances` when given, else left for the viewer to rebuild.
     """
     if value in (None, ""):
         return
 
     field_type = field_def.type
-    print(f"[DEBUG] _fill_field_value: field_id={field_def.id}, type={field_type}, value={value}")
+    logger.debug("_fill_field_value: field_id=%s, type=%s, value=%s", field_def.id, field_type, value)
 
-    if field_type in {"text", "date", "number", "phone", "ssn"}:
+    if field_type in TEXT_TYPES:
         # Text fields: set /V (value) as string
         field_obj["/V"] = str(value)
-        # Also set /AP (appearance) to None to force PDF viewer to regenerate appearance
-        if "/AP" in field_obj:
+        if appearances is not None:
+            appearances.apply(field_obj, str(value))
+        elif "/AP" in field_obj:
+            # Drop the stale appearance to force the PDF viewer to regenerate it
             del field_obj["/AP"]
-        print(f"[DEBUG] Set text field /V = {str(value)}")
+        logger.debug("Set text field /V = %s", value)
 
-    elif field_type in {"checkbox", "radio"}:
-        print(f"[DEBUG] Processing checkbox/radio field")
+    elif field_type in CHOICE_TYPES:
+        logger.debug("Processing checkbox/radio field")
         # Checkbox/radio: set /V to /Yes or /Off
         truthy = str(value).lower() in {"true", "1", "yes", "on"}
         truthy = truthy or value is True
 
         if truthy:
             # Look for available states in /AP/N dictionary
-            if "/AP" in field_obj and "/N" in field_obj["/AP"]:
-                states = field_obj["/AP"]["/N"]
+            if states is None and "/AP" in field_obj and "/N" in field_obj["/AP"]:
+                states = tuple(str(key) for key in field_obj["/AP"]["/N"].keys())
+            if states:
                 # Common checkbox states: /Yes, /On, /Checked
                 if "/Yes" in states:
                     field_obj["/V"] = pikepdf.Name("/Yes")
@@ -49,10 +70,10 @@ def _fill_field_value(field_obj: pikepdf.Dictionary, field_def: FieldDefinition,
                     field_obj["/AS"] = pikepdf.Name("/On")
                 else:
                     # Use first non-Off state
-                    for state_key in states.keys():
+                    for state_key in states:
                         if state_key != "/Off":
-                            field_obj["/V"] = state_key
-                            field_obj["/AS"] = state_key
+                            field_obj["/V"] = pikepdf.Name(state_key)
+                            field_obj["/AS"] = pikepdf.Name(state_key)
                             break
             else:
                 # Default to /Yes
@@ -63,156 +84,123 @@ def _fill_field_value(field_obj: pikepdf.Dictionary, field_def: FieldDefinition,
                 field_obj["/AS"] = pikepdf.Name("/Off")
 
 
-def _find_field_by_id(pdf: pikepdf.Pdf, field_id: str) -> pikepdf.Dictionary | None:
+def _find_field_by_id(
+    pdf: pikepdf.Pdf,
+    field_id: str,
+    index: FieldIndex,
+) -> pikepdf.Dictionary | None:
     """
     Find a form field in the PDF by matching the field ID.
-    Searches through /AcroForm/Fields and page annotations.
+    Lookups go through the template's FieldIndex, which covers /AcroForm/Fields
+    (including /Kids) and page annotations.
 
     Handles field IDs that may have prefixes like "f_1001" vs PDF field names like "1001"
     Also handles radio buttons with names like "1020 Radio Button 1"
     """
-    # Strip common prefixes to match PDF field names
-    # Field IDs might be "f_1001" but PDF has "1001"
-    field_id_stripped = field_id.removeprefix("f_").removeprefix("field_")
-
-    # Try AcroForm fields first
-    if "/AcroForm" in pdf.Root and "/Fields" in pdf.Root.AcroForm:
-        for field in pdf.Root.AcroForm.Fields:
-            field_obj = field
-            if isinstance(field_obj, pikepdf.Dictionary):
-                # Check if field name matches (field ID is often the /T name)
-                if "/T" in field_obj:
-                    field_name = str(field_obj["/T"])
-                    # Try multiple matching strategies:
-                    # 1. Exact match
-                    # 2. Stripped match
-                    # 3. Suffix match (e.g., "parent_1001" matches "1001")
-                    # 4. Prefix match (e.g., "1020" matches "1020 Radio Button 1")
-                    if (field_name == field_id or
-                        field_name == field_id_stripped or
-                        field_name.endswith(f"_{field_id}") or
-                        field_name.endswith(f"_{field_id_stripped}") or
-                        field_name.startswith(f"{field_id} ") or
-                        field_name.startswith(f"{field_id_stripped} ")):
-                        return field_obj
-
-    # Also check page annotations directly
-    for page in pdf.pages:
-        if "/Annots" in page:
-            for annot in page.Annots:
-                annot_obj = annot
-                if isinstance(annot_obj, pikepdf.Dictionary):
-                    if "/T" in annot_obj:
-                        field_name = str(annot_obj["/T"])
-                        # Try exact match, stripped match, suffix match, or prefix match
-                        if (field_name == field_id or
-                            field_name == field_id_stripped or
-                            field_name.endswith(f"_{field_id}") or
-                            field_name.endswith(f"_{field_id_stripped}") or
-                            field_name.startswith(f"{field_id} ") or
-                            field_name.startswith(f"{field_id_stripped} ")):
-                            return annot_obj
-
-    print(f"[DEBUG] Failed to find field {field_id} (stripped: {field_id_stripped}), listing all PDF field names...")
-    # Debug: List all field names
-    all_field_names = []
-    if "/AcroForm" in pdf.Root and "/Fields" in pdf.Root.AcroForm:
-        for field in pdf.Root.AcroForm.Fields:
-            if isinstance(field, pikepdf.Dictionary) and "/T" in field:
-                all_field_names.append(str(field["/T"]))
-    for page in pdf.pages:
-        if "/Annots" in page:
-            for annot in page.Annots:
-                if isinstance(annot, pikepdf.Dictionary) and "/T" in annot:
-                    name = str(annot["/T"])
-                    if name not in all_field_names:
-                        all_field_names.append(name)
-    print(f"[DEBUG] Available fields in PDF: {all_field_names[:10]}...")  # First 10 only
-
-    return None
+    field_obj = index.find(pdf, field_id, match_suffix=True)
+    if field_obj is None:
+        logger.debug("Failed to find field %s, listing all PDF field names...", field_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Available fields in PDF: %s...", index.names[:10])  # First 10 only
+    return field_obj
 
 
 def _write_pdf_sync(
     form_id: str,
-    schema: FormSchema,
+    schema: CompiledSchema,
     current_values: dict[str, Any],
     orig_path: str,
     storage: StorageService,
     flatten: bool,
     output_kind: str,
+    profile: str | None = None,
 ) -> str:
     """
     Fill PDF form fields directly using pikepdf (no overlay approach).
     This is the proper way to fill interactive PDF forms.
     """
-    pdf = pikepdf.open(orig_path)
-
-    print(f"[DEBUG] Filling PDF with {len(current_values)} values")
+    with span("writer.open"):
+        template = template_cache.get(orig_path)
+        pdf = template.open()
 
-    # Map field IDs to their definitions
-    field_map = {field.id: field for field in schema.fields}
+    logger.debug("Filling PDF with %d values", len(current_values))
 
-    # Iterate through values and fill matching fields
+    # Iterate through values and fill matching fields; lookups are timed separately
     filled_count = 0
-    for field_id, value in current_values.items():
-        if field_id not in field_map:
-            print(f"[WARN] Field {field_id} not in schema")
-            continue
-
-        field_def = field_map[field_id]
-        field_obj = _find_field_by_id(pdf, field_id)
-
-        if field_obj is not None:
-            try:
-                _fill_field_value(field_obj, field_def, value)
-                filled_count += 1
-                print(f"[DEBUG] Filled field {field_id} = {value}")
-            except Exception as e:
-                print(f"[WARN] Failed to fill field {field_id}: {e}")
-        else:
-            print(f"[WARN] Could not find field object for {field_id} in PDF")
+    lookup_seconds = 0.0
+    appearances = AppearanceBuilder(pdf)
+    with span("writer.fill_fields"):
+        for field_id, value in current_values.items():
+            field_def = schema.by_id.get(field_id)
+            if field_def is None:
+                logger.warning("Field %s not in schema", field_id)
+                continue
+
+            lookup_start = time.perf_counter()
+            field_obj = _find_field_by_id(pdf, field_id, template.field_index)
+            lookup_seconds += time.perf_counter() - lookup_start
+
+            if field_obj is not None:
+                try:
+                    states = template.checkbox_states.get(field_obj.objgen)
+                    _fill_field_value(field_obj, field_def, value, states, appearances)
+                    filled_count += 1
+                    logger.debug("Filled field %s = %s", field_id, value)
+                except Exception as e:
+                    logger.warning("Failed to fill field %s: %s", field_id, e)
+            else:
+                logger.warning("Could not find field object for %s in PDF", field_id)
+    metrics.observe("writer.field_lookup", lookup_seconds * 1000)
 
-    print(f"[DEBUG] Successfully filled {filled_count}/{len(current_values)} fields")
+    logger.debug("Successfully filled %d/%d fields", filled_count, len(current_values))
 
     # Optionally flatten (remove interactivity, bake values into content)
     if flatten:
-        # Flatten by removing form fields but keeping appearances
+        # Flatten by drawing widget appearances into the pages, then removing form fields
         if "/AcroForm" in pdf.Root:
-            del pdf.Root.AcroForm
+            with span("writer.flatten"):
+                flatten_form(pdf)
 
     # Save to bytes
-    output = BytesIO()
-    pdf.save(output, linearize=True)
-    output.seek(0)
-    pdf_bytes = output.read()
+    with span("writer.save.full"):
+        pdf_bytes = save_pdf(pdf, save_profile(profile))
 
     # Save to storage
-    uri = storage.save_bytes_sync(pdf_bytes, kind=output_kind, suffix=".pdf")
+    with span("writer.storage_write"):
+        uri = storage.save_bytes_sync(pdf_bytes, kind=output_kind, suffix=".pdf")
     return uri
 
 
 async def write_filled_pdf(
     form_id: str,
-    schema: FormSchema,
+    schema: CompiledSchema,
     current_values: dict[str, Any],
     orig_pdf_uri: str,
     storage: StorageService,
     *,
     flatten: bool = True,
     output_kind: str | None = None,
+    profile: str | None = None,
 ) -> str:
     """
     Async wrapper for filling PDF form fields.
+
+    `profile` names the save profile ("preview" or "delivery", see `pdf_save`);
+    PDF_SAVE_PROFILE sets the default.
     """
+    # Reject unknown profiles before queuing work
+    save_profile(profile)
     orig_path = storage.path_from_uri(orig_pdf_uri)
     kind = output_kind or f"forms/{form_id}"
-    return await to_thread.run_sync(
-        _write_pdf_sync,
-        form_id,
-        schema,
-        current_values,
-        str(orig_path),
-        storage,
-        flatten,
-        kind,
-    )
+    with span("writer.total"):
+        return await pdf_executor.run(
+            _write_pdf_sync,
+            form_id,
+            schema,
+            current_values,
+            str(orig_path),
+            storage,
+            flatten,
+            kind,
+            profile,
+        )
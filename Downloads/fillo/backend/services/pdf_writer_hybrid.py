@@ -1,19 +1,37 @@
 from __future__ import annotations
 
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field as dataclass_field
+from functools import partial
 from io import BytesIO
 from typing import Any
 
 import pikepdf
-from anyio import to_thread
 from PyPDF2 import PdfReader, PdfWriter
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 
-from backend.schemas.form_schema import FieldDefinition, FormSchema
+from backend.services.compiled_schema import TEXT_TYPES, CompiledField, CompiledSchema
+from backend.services.instrumentation import span
+from backend.services.pdf_appearance import FLATTEN_MODE, AppearanceBuilder, flatten_form
+from backend.services.pdf_executor import pdf_executor
+from backend.services.pdf_field_index import ObjGen
+from backend.services.pdf_incremental import build_incremental_update, page_objgens
+from backend.services.pdf_save import SAVE_PROFILES, SaveProfile, save_pdf, save_profile
+from backend.services.preview_pages import preview_suffix, render_pages_sync
 from backend.services.storage import StorageService
+from backend.services.template_cache import TemplateEntry, template_cache
 
+# Most source PDFs a merge keeps open at once; larger merges go through
+# intermediate files, so open file handles do not grow with the row count
+PDF_MERGE_MAX_OPEN = int(os.getenv("PDF_MERGE_MAX_OPEN", "64"))
 
-def _draw_checkbox(c: canvas.Canvas, field: FieldDefinition, value: Any, page_height: float) -> None:
+logger = logging.getLogger(__name__)
+
+
+def _draw_checkbox(c: canvas.Canvas, field: CompiledField, value: Any, page_height: float) -> None:
     """Draw a checkbox on the canvas"""
     if value in (None, ""):
         return
@@ -41,32 +59,67 @@ def _draw_checkbox(c: canvas.Canvas, field: FieldDefinition, value: Any, page_he
         c.drawString(center_x - (font_size / 3), center_y - (font_size / 3), "4")
 
 
-def _generate_checkbox_overlay(schema: FormSchema, current_values: dict[str, Any], orig_reader: PdfReader) -> BytesIO:
-    """Generate an overlay with just checkboxes/radio buttons drawn"""
-    output = BytesIO()
-    writer = PdfWriter()
+def _is_checked(value: Any) -> bool:
+    if value in (None, ""):
+        return False
+    return value is True or str(value).lower() in {"true", "1", "yes", "on"}
 
-    for page_index, page in enumerate(orig_reader.pages, start=1):
-        media_box = page.mediabox
-        width = float(media_box.width)
-        height = float(media_box.height)
-        packet = BytesIO()
-        c = canvas.Canvas(packet, pagesize=(width or letter[0], height or letter[1]))
-        page_fields = [f for f in schema.fields if f.page == page_index and f.type in {"checkbox", "radio"}]
 
-        for field in page_fields:
-            value = current_values.get(field.id)
-            if value:
-                _draw_checkbox(c, field, value, height)
+def _checked_fields_by_page(
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    page_count: int,
+) -> dict[int, list[CompiledField]]:
+    """Group checkbox/radio fields with a truthy value by their 1-based page number."""
+    checked: dict[int, list[CompiledField]] = {}
+    for field in schema.choice_fields:
+        if not _is_checked(current_values.get(field.id)):
+            continue
+        if 1 <= field.page <= page_count:
+            checked.setdefault(field.page, []).append(field)
+    return checked
 
+
+def _generate_checkbox_overlay(
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_reader: PdfReader,
+    checked_by_page: dict[int, list[CompiledField]] | None = None,
+) -> BytesIO:
+    """
+    Generate an overlay with just checkboxes/radio buttons drawn.
+
+    Only pages that carry checked boxes get an overlay page; those are rendered into
+    one multi-page reportlab document and merged.  Every other page is passed through
+    untouched.
+    """
+    if checked_by_page is None:
+        checked_by_page = _checked_fields_by_page(schema, current_values, len(orig_reader.pages))
+
+    overlay_pages = {}
+    if checked_by_page:
+        marked_pages = sorted(checked_by_page)
+        packet = BytesIO()
+        c = canvas.Canvas(packet)
+        for page_number in marked_pages:
+            media_box = orig_reader.pages[page_number - 1].mediabox
+            width = float(media_box.width)
+            height = float(media_box.height)
+            c.setPageSize((width or letter[0], height or letter[1]))
+            for field in checked_by_page[page_number]:
+                _draw_checkbox(c, field, current_values.get(field.id), height)
+            c.showPage()
         c.save()
         packet.seek(0)
         overlay_reader = PdfReader(packet)
-        base_page = orig_reader.pages[page_index - 1]
+        overlay_pages = dict(zip(marked_pages, overlay_reader.pages))
 
-        # Only merge overlay if it has pages
-        if len(overlay_reader.pages) > 0:
-            base_page.merge_page(overlay_reader.pages[0])
+    output = BytesIO()
+    writer = PdfWriter()
+    for page_number, base_page in enumerate(orig_reader.pages, start=1):
+        overlay_page = overlay_pages.get(page_number)
+        if overlay_page is not None:
+            base_page.merge_page(overlay_page)
         writer.add_page(base_page)
 
     writer.write(output)
@@ -74,124 +127,487 @@ def _generate_checkbox_overlay(schema: FormSchema, current_values: dict[str, Any
     return output
 
 
-def _write_pdf_sync_hybrid(
+def _checkmark_operators(field: CompiledField, font_name: str) -> str:
+    """
+    Content-stream operators drawing the same ZapfDingbats mark `_draw_checkbox`
+    renders through reportlab, positioned from the field's rect.
+
+    reportlab re-encodes the "4" passed to drawString into the font's built-in
+    encoding, so the glyph it actually emits is "n"; we emit the same byte.
+    """
+    x1, y1, x2, y2 = field.rect
+    box_width = x2 - x1
+    box_height = y2 - y1
+    center_x = x1 + (box_width / 2)
+    center_y = y1 + (box_height / 2)
+    font_size = min(box_height * 0.8, 12)
+    x = center_x - (font_size / 3)
+    y = center_y - (font_size / 3)
+    return f"BT {font_name} {font_size:.4f} Tf 1 0 0 1 {x:.4f} {y:.4f} Tm (n) Tj ET\n"
+
+
+def _checkmark_font_name(page: pikepdf.Page) -> pikepdf.Name:
+    """Deterministic, unused /Font resource name so identical fills give identical bytes."""
+    fonts = page.obj.get("/Resources", {}).get("/Font", {})
+    name = "/FxZaDb"
+    suffix = 0
+    while name in fonts:
+        suffix += 1
+        name = f"/FxZaDb{suffix}"
+    return pikepdf.Name(name)
+
+
+def _stamp_checkmarks(
+    pdf: pikepdf.Pdf,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    changed: set[ObjGen] | None = None,
+) -> int:
+    """
+    Draw checkmarks for truthy checkbox/radio values straight into the page content
+    of the working document, replacing the reportlab overlay + PyPDF2 merge round trip.
+    Pages without checked boxes are left untouched.
+
+    Modified pre-existing objects are added to `changed` when given.
+    """
+    marks_by_page = _checked_fields_by_page(schema, current_values, len(pdf.pages))
+
+    font = None
+    stamped = 0
+    for page_number, fields in marks_by_page.items():
+        if font is None:
+            # One font object shared by every stamped page
+            font = pdf.make_indirect(
+                pikepdf.Dictionary(
+                    Type=pikepdf.Name.Font,
+                    Subtype=pikepdf.Name.Type1,
+                    BaseFont=pikepdf.Name.ZapfDingbats,
+                )
+            )
+        page = pdf.pages[page_number - 1]
+        font_name = _checkmark_font_name(page)
+        page.add_resource(font, pikepdf.Name.Font, name=font_name)
+        operators = "".join(_checkmark_operators(field, str(font_name)) for field in fields)
+        # Isolate the original content's graphics state, as PyPDF2's merge_page does
+        page.contents_add(pikepdf.Stream(pdf, b"q\n"), prepend=True)
+        page.contents_add(pikepdf.Stream(pdf, f"Q\nq 0 g\n{operators}Q\n".encode("ascii")))
+        if changed is not None:
+            changed.update(page_objgens(page))
+        stamped += len(fields)
+    return stamped
+
+
+def _fill_text_fields(
+    pdf: pikepdf.Pdf,
+    template: TemplateEntry,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    changed: set[ObjGen] | None = None,
+) -> int:
+    text_filled = 0
+    appearances = AppearanceBuilder(pdf)
+    for field_id, value in current_values.items():
+        field_def = schema.by_id.get(field_id)
+
+        # Only handle text fields with pikepdf
+        if field_def is None or field_def.type not in TEXT_TYPES:
+            continue
+
+        # The schema sanitizes PDF field names (spaces→underscores, etc.);
+        # the index already knows every variant of the original PDF field name
+        field_obj = template.field_index.find(pdf, field_id)
+
+        if field_obj:
+            # None clears the field
+            text = "" if value is None else str(value)
+            field_obj["/V"] = text
+            appearances.apply(field_obj, text, changed)
+            if changed is not None:
+                changed.add(field_obj.objgen)
+            text_filled += 1
+            logger.debug("Filled text field %s = %s", field_id, value)
+    return text_filled
+
+
+def _open_template(orig_path: str) -> tuple[TemplateEntry, pikepdf.Pdf]:
+    with span("writer.open"):
+        template = template_cache.get(orig_path)
+        return template, template.open()
+
+
+def _fill_document(
+    pdf: pikepdf.Pdf,
+    template: TemplateEntry,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    changed: set[ObjGen],
+) -> None:
+    """Fill text fields and stamp checkmarks into the working document."""
+    with span("writer.fill_text"):
+        text_filled = _fill_text_fields(pdf, template, schema, current_values, changed)
+    with span("writer.stamp"):
+        stamped = _stamp_checkmarks(pdf, schema, current_values, changed)
+    logger.debug("Filled %d text fields, stamped %d checkmarks", text_filled, stamped)
+
+
+def _flatten(pdf: pikepdf.Pdf, changed: set[ObjGen]) -> None:
+    if "/AcroForm" in pdf.Root:
+        with span("writer.flatten"):
+            flatten_form(pdf, changed)
+
+
+def _fill_single_pass(
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_path: str,
+    flatten: bool,
+    output_mode: str = "full",
+    profile: str | None = None,
+) -> bytes | memoryview:
+    """
+    Hybrid output produced on a single pikepdf document: text fields are filled,
+    checkmarks are stamped into page content and the form is optionally flattened
+    before the document is serialized exactly once.
+
+    output_mode:
+    - "full": rewrite the whole document with save profile `profile`
+    - "incremental": the original template bytes followed by an incremental update
+      holding only the modified and new objects
+    - "delta": only that appended update; the full PDF is the template bytes
+      followed by the delta (see `pdf_incremental.iter_incremental`)
+    """
+    logger.debug("Starting single-pass hybrid PDF fill with %d values", len(current_values))
+
+    template, pdf = _open_template(orig_path)
+    changed: set[ObjGen] = set()
+    with pdf:
+        _fill_document(pdf, template, schema, current_values, changed)
+        if flatten:
+            _flatten(pdf, changed)
+
+        with span(f"writer.save.{output_mode}"):
+            if output_mode == "full":
+                return save_pdf(pdf, save_profile(profile))
+
+            delta = build_incremental_update(
+                template.data, pdf, changed, template.max_objnum
+            )
+            if output_mode == "delta":
+                return delta
+            return b"".join((template.data, delta))
+
+
+def _write_pdf_sync_single_pass(
     form_id: str,
-    schema: FormSchema,
+    schema: CompiledSchema,
     current_values: dict[str, Any],
     orig_path: str,
     storage: StorageService,
     flatten: bool,
     output_kind: str,
+    output_mode: str = "full",
+    profile: str | None = None,
 ) -> str:
-    """
-    Hybrid approach: Use pikepdf for text fields, overlay for checkboxes
-    """
-    print(f"[DEBUG] Starting hybrid PDF fill with {len(current_values)} values")
+    pdf_bytes = _fill_single_pass(schema, current_values, orig_path, flatten, output_mode, profile)
+    suffix = ".pdfdelta" if output_mode == "delta" else ".pdf"
+    with span("writer.storage_write"):
+        uri = storage.save_bytes_sync(pdf_bytes, kind=output_kind, suffix=suffix)
+    return uri
 
-    # Step 1: Fill text fields using pikepdf
-    pdf = pikepdf.open(orig_path)
-    field_map = {field.id: field for field in schema.fields}
 
-    text_filled = 0
-    for field_id, value in current_values.items():
-        if field_id not in field_map:
-            continue
+@dataclass
+class FillArtifacts:
+    # None when the delivery PDF was not requested
+    delivery_uri: str | None = None
+    # Stored image per requested preview page, in request order
+    preview_uris: list[str] = dataclass_field(default_factory=list)
+    # The filled preview document (template plus incremental update), when kept
+    preview_source: bytes | None = None
 
-        field_def = field_map[field_id]
 
-        # Only handle text fields with pikepdf
-        if field_def.type not in {"text", "date", "number", "phone", "ssn"}:
-            continue
+def _fill_artifacts_sync(
+    form_id: str,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_path: str,
+    storage: StorageService,
+    flatten: bool,
+    output_kind: str | None,
+    preview_pages: list[int],
+    preview_dpi: int,
+    preview_kind: str,
+    profile: str | None = None,
+    keep_source: bool = False,
+) -> FillArtifacts:
+    """
+    Fill the template once and derive every artifact from that one document.
+
+    The interactive preview source is serialized in memory as an incremental update
+    over the template and rasterized straight from those bytes, never touching
+    storage.  The same document is then flattened (if requested) and saved as the
+    delivery PDF with save profile `profile`, byte-identical to what
+    `_write_pdf_sync_single_pass` writes.
+    `output_kind=None` skips the delivery PDF; `keep_source` returns the preview
+    source so more pages (or resolutions) can be rendered without filling again.
+    """
+    logger.debug(
+        "Starting shared fill with %d values, preview pages %s", len(current_values), preview_pages
+    )
+    artifacts = FillArtifacts()
+    template, pdf = _open_template(orig_path)
+    changed: set[ObjGen] = set()
+    with pdf:
+        _fill_document(pdf, template, schema, current_values, changed)
+
+        if preview_pages or keep_source:
+            with span("writer.save.incremental"):
+                delta = build_incremental_update(
+                    template.data, pdf, changed, template.max_objnum
+                )
+                preview_source = b"".join((template.data, delta))
+            if keep_source:
+                artifacts.preview_source = preview_source
+        if preview_pages:
+            with span("preview.render"):
+                images = render_pages_sync(preview_source, preview_pages, preview_dpi)
+            with span("preview.storage_write"):
+                artifacts.preview_uris = [
+                    storage.save_bytes_sync(image, kind=preview_kind, suffix=preview_suffix())
+                    for image in images
+                ]
+
+        if output_kind is not None:
+            if flatten:
+                _flatten(pdf, changed)
+            with span("writer.save.full"):
+                pdf_bytes = save_pdf(pdf, save_profile(profile))
+            with span("writer.storage_write"):
+                artifacts.delivery_uri = storage.save_bytes_sync(pdf_bytes, kind=output_kind, suffix=".pdf")
+    return artifacts
+
+
+def fill_to_path_sync(
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_path: str,
+    flatten: bool,
+    out_path: str,
+    profile: str | None = None,
+) -> int:
+    """Fill a template straight into a local file and return the output size."""
+    pdf_bytes = _fill_single_pass(schema, current_values, orig_path, flatten, profile=profile)
+    with open(out_path, "wb") as fh:
+        fh.write(pdf_bytes)
+    return len(pdf_bytes)
+
+
+def _merge_open(paths: list[str], out_path: str, profile: SaveProfile) -> None:
+    sources = []
+    try:
+        with pikepdf.new() as merged:
+            for path in paths:
+                source = pikepdf.open(path)
+                sources.append(source)
+                merged.pages.extend(source.pages)
+            with open(out_path, "wb") as fh:
+                save_pdf(merged, profile, fh)
+    finally:
+        for source in sources:
+            source.close()
+
+
+def merge_pdfs_sync(paths: list[str], out_path: str, profile: str | None = None) -> int:
+    """
+    Concatenate filled PDFs into one file and return its size.  Page content is
+    copied as-is; interactive form fields are not carried over.
+
+    Sources stay open, file-backed, until the merged document is saved, so page
+    content streams are read from disk during the save rather than held in memory.
+    At most PDF_MERGE_MAX_OPEN sources are open at once: longer lists are merged
+    in chunks into intermediate files (preview profile) next to `out_path`, and
+    those are merged in turn.
+    """
+    final_profile = save_profile(profile)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(out_path) or None) as workdir:
+        level = 0
+        while len(paths) > PDF_MERGE_MAX_OPEN:
+            chunks = [paths[i : i + PDF_MERGE_MAX_OPEN] for i in range(0, len(paths), PDF_MERGE_MAX_OPEN)]
+            parts = []
+            for number, chunk in enumerate(chunks):
+                part = os.path.join(workdir, f"{level}-{number}.pdf")
+                _merge_open(chunk, part, SAVE_PROFILES["preview"])
+                parts.append(part)
+            logger.debug("Merged %d sources into %d intermediate files", len(paths), len(parts))
+            paths = parts
+            level += 1
+        _merge_open(paths, out_path, final_profile)
+    return os.path.getsize(out_path)
 
-        # Strip prefix and find field
-        # The schema sanitizes PDF field names (spaces→underscores, etc.)
-        # We need to try multiple variants to match the original PDF field name
-        field_id_stripped = field_id.removeprefix("f_").removeprefix("field_")
-        # Also try reversing sanitization: underscores back to spaces
-        field_id_unsanitized = field_id_stripped.replace("_", " ")
-
-        # Find field in PDF
-        field_obj = None
-        if "/AcroForm" in pdf.Root and "/Fields" in pdf.Root.AcroForm:
-            for field in pdf.Root.AcroForm.Fields:
-                if isinstance(field, pikepdf.Dictionary) and "/T" in field:
-                    field_name = str(field["/T"])
-                    # Try multiple matching strategies:
-                    # 1. Exact match with original ID
-                    # 2. Match with stripped ID (no f_ prefix)
-                    # 3. Match with unsanitized ID (underscores → spaces)
-                    # 4. Prefix match (e.g., "1020 Radio Button 1" starts with "1020")
-                    if (field_name == field_id or
-                        field_name == field_id_stripped or
-                        field_name == field_id_unsanitized or
-                        field_name.startswith(f"{field_id} ") or
-                        field_name.startswith(f"{field_id_stripped} ") or
-                        field_name.startswith(f"{field_id_unsanitized} ")):
-                        field_obj = field
-                        break
 
-        if field_obj:
-            field_obj["/V"] = str(value)
-            if "/AP" in field_obj:
-                del field_obj["/AP"]
-            text_filled += 1
-            print(f"[DEBUG] Filled text field {field_id} = {value}")
+def _write_pdf_sync_hybrid(
+    form_id: str,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_path: str,
+    storage: StorageService,
+    flatten: bool,
+    output_kind: str,
+    profile: str | None = None,
+) -> str:
+    """
+    Hybrid approach: Use pikepdf for text fields, overlay for checkboxes
+
+    Only the last pikepdf save uses save profile `profile`; the buffers handed from
+    one step to the next are saved with the "preview" profile.
+    """
+    final_profile = save_profile(profile)
+    logger.debug("Starting hybrid PDF fill with %d values", len(current_values))
+
+    # Step 1: Fill text fields using pikepdf
+    with span("writer.open"):
+        template = template_cache.get(orig_path)
+        pdf = template.open()
+    with span("writer.fill_text"):
+        text_filled = _fill_text_fields(pdf, template, schema, current_values)
+    # Flatten here: the PyPDF2 overlay below does not carry /AcroForm over
+    if flatten and "/AcroForm" in pdf.Root:
+        with span("writer.flatten"):
+            flatten_form(pdf)
+    checked_by_page = _checked_fields_by_page(schema, current_values, len(template.page_sizes))
+    # Re-saved by pikepdf at the end when the overlay runs
+    final_step = bool(checked_by_page)
 
     # Save pikepdf output to temp file
-    temp_output = BytesIO()
-    pdf.save(temp_output, linearize=True)
-    temp_output.seek(0)
+    with span("writer.save.full"):
+        temp_output = BytesIO()
+        save_pdf(pdf, SAVE_PROFILES["preview"] if final_step else final_profile, temp_output)
+        temp_output.seek(0)
     pdf.close()
 
-    print(f"[DEBUG] Filled {text_filled} text fields with pikepdf")
-
-    # Step 2: Add checkbox overlay using PyPDF2
-    temp_output.seek(0)
-    orig_reader = PdfReader(temp_output)
-    final_output = _generate_checkbox_overlay(schema, current_values, orig_reader)
-
-    print(f"[DEBUG] Added checkbox overlay")
-
-    # Step 3: Optionally flatten
-    if flatten:
-        pdf_bytes = final_output.read()
-        with pikepdf.Pdf.open(BytesIO(pdf_bytes)) as pdf:
-            if "/AcroForm" in pdf.Root:
-                del pdf.Root.AcroForm
-            flattened = BytesIO()
-            pdf.save(flattened, linearize=True)
-            flattened.seek(0)
-            pdf_bytes = flattened.read()
+    logger.debug("Filled %d text fields with pikepdf", text_filled)
+
+    # Step 2: Add checkbox overlay using PyPDF2, only if some page carries a checked box
+    if checked_by_page:
+        with span("writer.overlay"):
+            orig_reader = PdfReader(temp_output)
+            final_output = _generate_checkbox_overlay(schema, current_values, orig_reader, checked_by_page)
+        logger.debug("Added checkbox overlay on %d page(s)", len(checked_by_page))
     else:
-        pdf_bytes = final_output.read()
+        final_output = temp_output
+
+    # Step 3: Save the PyPDF2 output with the chosen profile
+    if final_step:
+        with span("writer.save.full"):
+            with pikepdf.Pdf.open(final_output) as pdf:
+                pdf_bytes = save_pdf(pdf, final_profile)
+    else:
+        pdf_bytes = final_output.getbuffer()
 
     # Save to storage
-    uri = storage.save_bytes_sync(pdf_bytes, kind=output_kind, suffix=".pdf")
+    with span("writer.storage_write"):
+        uri = storage.save_bytes_sync(pdf_bytes, kind=output_kind, suffix=".pdf")
     return uri
 
 
+_WRITERS = {
+    "single_pass": _write_pdf_sync_single_pass,
+    "legacy": _write_pdf_sync_hybrid,
+}
+
+# Bump whenever the bytes written for the same inputs change
+WRITER_VERSION = 3
+
+
+def writer_mode(mode: str | None = None) -> str:
+    """The writer a call would use: `mode`, else HYBRID_WRITER_MODE, else single_pass."""
+    return mode or os.getenv("HYBRID_WRITER_MODE", "single_pass")
+
+
+def writer_version(mode: str | None = None, profile: str | None = None) -> str:
+    """Identifies the writer and save profile that would handle a call, for result caching."""
+    return f"{writer_mode(mode)}-{WRITER_VERSION}-{FLATTEN_MODE}-{save_profile(profile).name}"
+
+
 async def write_filled_pdf(
     form_id: str,
-    schema: FormSchema,
+    schema: CompiledSchema,
     current_values: dict[str, Any],
     orig_pdf_uri: str,
     storage: StorageService,
     *,
     flatten: bool = True,
     output_kind: str | None = None,
+    mode: str | None = None,
+    output_mode: str = "full",
+    profile: str | None = None,
 ) -> str:
     """
     Async wrapper for hybrid PDF filling.
+
+    `mode` picks the writer: "single_pass" (default) or "legacy", the original
+    pikepdf -> PyPDF2 -> pikepdf pipeline.  HYBRID_WRITER_MODE sets the default.
+    `output_mode` ("full", "incremental" or "delta") is only supported by single_pass.
+    `profile` names the save profile of the written PDF ("preview" or "delivery",
+    see `pdf_save`; PDF_SAVE_PROFILE sets the default).  Incremental and delta
+    output append raw objects and ignore it.
     """
     orig_path = storage.path_from_uri(orig_pdf_uri)
     kind = output_kind or f"forms/{form_id}"
-    return await to_thread.run_sync(
-        _write_pdf_sync_hybrid,
-        form_id,
-        schema,
-        current_values,
-        str(orig_path),
-        storage,
-        flatten,
-        kind,
-    )
+    writer = _WRITERS[writer_mode(mode)]
+    if output_mode != "full":
+        if writer is not _write_pdf_sync_single_pass:
+            raise ValueError(f"output_mode={output_mode!r} requires the single_pass writer")
+        writer = partial(_write_pdf_sync_single_pass, output_mode=output_mode)
+    writer = partial(writer, profile=save_profile(profile).name)
+    with span("writer.total"):
+        return await pdf_executor.run(
+            writer,
+            form_id,
+            schema,
+            current_values,
+            str(orig_path),
+            storage,
+            flatten,
+            kind,
+        )
+
+
+async def fill_and_render(
+    form_id: str,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_pdf_uri: str,
+    storage: StorageService,
+    *,
+    flatten: bool = True,
+    deliver: bool = True,
+    output_kind: str | None = None,
+    preview_pages: list[int] | None = None,
+    preview_dpi: int = 144,
+    preview_kind: str = "previews",
+    profile: str | None = None,
+    keep_source: bool = False,
+) -> FillArtifacts:
+    """
+    Shared fill pipeline: one in-memory fill yields the delivery PDF (unless
+    `deliver` is False) and rendered images of `preview_pages`.  Always uses the
+    single_pass writer; `profile` is the delivery PDF's save profile.
+    """
+    orig_path = storage.path_from_uri(orig_pdf_uri)
+    kind = (output_kind or f"forms/{form_id}") if deliver else None
+    with span("writer.total"):
+        return await pdf_executor.run(
+            _fill_artifacts_sync,
+            form_id,
+            schema,
+            current_values,
+            str(orig_path),
+            storage,
+            flatten,
+            kind,
+            list(preview_pages or []),
+            preview_dpi,
+            preview_kind,
+            save_profile(profile).name,
+            keep_source,
+        )
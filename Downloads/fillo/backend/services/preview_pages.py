@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any
+
+import pypdfium2 as pdfium
+
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.storage import StorageService
+
+
+# (template hash, schema hash, page number, hash of the page's values, dpi)
+PageKey = tuple[str, str, int, str, int]
+
+# Digest of a page that carries no values
+EMPTY_PAGE_DIGEST = hashlib.sha256(b"{}").hexdigest()
+
+# "webp" (lossless: a fraction of the PNG size for rendered form pages, and faster
+# to encode at these settings) or "png"
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "webp")
+
+# Pillow format name, file suffix and encoder options per preview format
+_ENCODINGS: dict[str, tuple[str, str, dict[str, Any]]] = {
+    "webp": ("WEBP", ".webp", {"lossless": True, "quality": 20, "method": 1}),
+    "png": ("PNG", ".png", {}),
+}
+
+
+def preview_suffix() -> str:
+    return _ENCODINGS[PREVIEW_FORMAT][1]
+
+
+def page_value_digests(
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    page_count: int,
+) -> list[str]:
+    """
+    Hash of the values shown on each page (index 0 is page 1), derived from the
+    schema's field -> page assignment.  Pages without values share the empty hash.
+    """
+    per_page: list[dict[str, Any]] = [{} for _ in range(page_count)]
+    for page_number, fields in schema.by_page.items():
+        if 1 <= page_number <= page_count:
+            per_page[page_number - 1] = {
+                field.id: current_values[field.id] for field in fields if field.id in current_values
+            }
+    return [
+        hashlib.sha256(
+            json.dumps(values, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()
+        for values in per_page
+    ]
+
+
+def render_pages_sync(source: str | bytes, page_numbers: list[int], dpi: int) -> list[bytes]:
+    """
+    Rasterize the given 1-based pages of a PDF, given as a path or in-memory bytes,
+    to PREVIEW_FORMAT image bytes, form fields included.
+    """
+    image_format, _, options = _ENCODINGS[PREVIEW_FORMAT]
+    pdf = pdfium.PdfDocument(source)
+    try:
+        # Fields whose appearance streams were dropped are drawn by the form environment
+        pdf.init_forms()
+        images = []
+        for page_number in page_numbers:
+            page = pdf[page_number - 1]
+            bitmap = page.render(scale=dpi / 72, may_draw_forms=True)
+            buffer = BytesIO()
+            bitmap.to_pil().save(buffer, format=image_format, **options)
+            images.append(buffer.getvalue())
+            page.close()
+        return images
+    finally:
+        pdf.close()
+
+
+@dataclass
+class PreviewDelta:
+    """What one broadcast changes relative to the form's previous one."""
+
+    # Per form, increases by one per broadcast; base_sequence is the broadcast the
+    # delta applies to (0: none, the client starts from an empty preview)
+    sequence: int
+    base_sequence: int
+    page_count: int
+    # 1-based page -> image URI, changed pages only
+    pages: dict[int, str]
+    # Added or changed values; removed_fields were cleared
+    values: dict[str, Any]
+    removed_fields: list[str]
+
+
+@dataclass
+class _BroadcastState:
+    sequence: int = 0
+    pages: list[str | None] = field(default_factory=list)
+    values: dict[str, Any] = field(default_factory=dict)
+    # Fields the latest value change touched, in value order
+    recent_fields: list[str] = field(default_factory=list)
+
+
+class PagePreviewCache:
+    """
+    Content-addressed cache of rendered preview pages.
+
+    Keys are (template hash, schema hash, page number, hash of the values on that
+    page, dpi), so a page renders once per distinct content and resolution no matter
+    which form or request needs it; the schema is part of the key because field
+    rects and page placement shape the image.  The cache also keeps what was last
+    broadcast per form, so broadcasts can carry only the pages and values that
+    changed.
+
+    Rendered images nothing uses are deleted from storage: an image is in use while
+    it is cached or shown in some form's last broadcast.
+    """
+
+    def __init__(self, max_entries: int, max_forms: int) -> None:
+        self.max_entries = max_entries
+        self.max_forms = max_forms
+        self._pages: OrderedDict[PageKey, str] = OrderedDict()
+        self._broadcasts: OrderedDict[str, _BroadcastState] = OrderedDict()
+        # URI -> number of forms whose last broadcast shows it
+        self._broadcast_refs: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.collected = 0
+
+    def get(self, key: PageKey) -> str | None:
+        with self._lock:
+            uri = self._pages.get(key)
+            if uri is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return uri
+
+    def put(self, key: PageKey, uri: str, storage: StorageService) -> None:
+        with self._lock:
+            released = []
+            previous = self._pages.get(key)
+            if previous is not None and previous != uri:
+                released.append(previous)
+            self._pages[key] = uri
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                released.append(self._pages.popitem(last=False)[1])
+            garbage = self._garbage(released)
+        self._collect(garbage, storage)
+
+    def _garbage(self, released: list[str]) -> list[str]:
+        cached = set(self._pages.values()) if released else set()
+        return [
+            uri for uri in dict.fromkeys(released)
+            if uri not in self._broadcast_refs and uri not in cached
+        ]
+
+    def _collect(self, garbage: list[str], storage: StorageService) -> None:
+        for uri in garbage:
+            storage.path_from_uri(uri).unlink(missing_ok=True)
+        if garbage:
+            with self._lock:
+                self.collected += len(garbage)
+
+    def _unref(self, uri: str | None, released: list[str]) -> None:
+        if uri is None:
+            return
+        count = self._broadcast_refs.get(uri, 0)
+        if count > 1:
+            self._broadcast_refs[uri] = count - 1
+        else:
+            self._broadcast_refs.pop(uri, None)
+            released.append(uri)
+
+    def record_broadcast(
+        self,
+        form_id: str,
+        page_count: int | None,
+        pages: dict[int, str],
+        values: dict[str, Any] | None,
+        storage: StorageService,
+    ) -> PreviewDelta:
+        """
+        Record a broadcast of `pages` (1-based page -> URI; other pages keep what was
+        last sent) and, unless None, the form's complete `values`, and return the
+        delta against the previous broadcast.  `page_count=None` keeps the page count
+        last broadcast, for value-only broadcasts.
+        """
+        released: list[str] = []
+        with self._lock:
+            state = self._broadcasts.pop(form_id, None) or _BroadcastState()
+            self._broadcasts[form_id] = state
+            while len(self._broadcasts) > self.max_forms:
+                for uri in self._broadcasts.popitem(last=False)[1].pages:
+                    self._unref(uri, released)
+
+            base_sequence = state.sequence
+            state.sequence = sequence = base_sequence + 1
+            if page_count is None:
+                page_count = len(state.pages)
+            for uri in state.pages[page_count:]:
+                self._unref(uri, released)
+            state.pages = (state.pages + [None] * page_count)[:page_count]
+            changed_pages = {}
+            for page_number, uri in sorted(pages.items()):
+                if 1 <= page_number <= page_count and state.pages[page_number - 1] != uri:
+                    self._unref(state.pages[page_number - 1], released)
+                    self._broadcast_refs[uri] = self._broadcast_refs.get(uri, 0) + 1
+                    state.pages[page_number - 1] = uri
+                    changed_pages[page_number] = uri
+
+            changed_values: dict[str, Any] = {}
+            removed: list[str] = []
+            if values is not None:
+                changed_values = {
+                    key: value
+                    for key, value in values.items()
+                    if key not in state.values or state.values[key] != value
+                }
+                removed = [key for key in state.values if key not in values]
+                state.values = dict(values)
+                if changed_values or removed:
+                    state.recent_fields = list(changed_values) + removed
+            garbage = self._garbage(released)
+
+        self._collect(garbage, storage)
+        return PreviewDelta(
+            sequence=sequence,
+            base_sequence=base_sequence,
+            page_count=page_count,
+            pages=changed_pages,
+            values=changed_values,
+            removed_fields=removed,
+        )
+
+    def recent_fields(self, form_id: str, values: dict[str, Any]) -> list[str]:
+        """
+        Fields of `values` that differ from the form's last broadcast, in value order;
+        if none, the fields the last value change touched.
+        """
+        with self._lock:
+            state = self._broadcasts.get(form_id)
+            if state is None:
+                return list(values)
+            changed = [
+                key for key, value in values.items()
+                if key not in state.values or state.values[key] != value
+            ]
+            changed += [key for key in state.values if key not in values]
+            return changed or list(state.recent_fields)
+
+    def broadcast_state(self, form_id: str) -> dict[str, Any] | None:
+        """The full preview last broadcast for a form, for clients (re)joining."""
+        with self._lock:
+            state = self._broadcasts.get(form_id)
+            if state is None:
+                return None
+            return {
+                "sequence": state.sequence,
+                "pages": list(state.pages),
+                "values": dict(state.values),
+            }
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._pages),
+                "max_entries": self.max_entries,
+                "forms": len(self._broadcasts),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "collected": self.collected,
+            }
+
+
+page_preview_cache = PagePreviewCache(
+    max_entries=int(os.getenv("PREVIEW_PAGE_CACHE_ENTRIES", "4096")),
+    max_forms=int(os.getenv("PREVIEW_PAGE_CACHE_FORMS", "1024")),
+)
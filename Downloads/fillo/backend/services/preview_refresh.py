@@ -1,38 +1,250 @@
 from __future__ import annotations
 
+import logging
+import os
+from dataclasses import dataclass
 from typing import Any
 
-from backend.schemas.form_schema import FormSchema
 from backend.services import pdf_writer_hybrid as pdf_writer
-from backend.services.previewer import broadcast_preview, generate_previews
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.instrumentation import metrics, span
+from backend.services.pdf_executor import pdf_executor
+from backend.services.preview_pages import (
+    EMPTY_PAGE_DIGEST,
+    PageKey,
+    PreviewDelta,
+    page_preview_cache,
+    page_value_digests,
+    preview_suffix,
+    render_pages_sync,
+)
+from backend.services.previewer import broadcast_preview
 from backend.services.storage import storage_service
+from backend.services.template_cache import template_summary
+
+
+PREVIEW_DPI = int(os.getenv("PREVIEW_DPI", "144"))
+# Resolution of the first, quick rendering of the page being edited
+PREVIEW_LOW_DPI = int(os.getenv("PREVIEW_LOW_DPI", "48"))
+PREVIEW_PROGRESSIVE = os.getenv("PREVIEW_PROGRESSIVE", "1").lower() not in ("0", "false", "no")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PreviewPlan:
+    template_digest: str
+    keys: list[PageKey]
+    # Cached image URI per page, None where the page still has to be rendered
+    pngs: list[str | None]
+    dirty: list[int]
+    # Whether any dirty page shows values, i.e. needs a filled document to render
+    needs_fill: bool
+
+    @property
+    def preview_kind(self) -> str:
+        return f"previews/{self.template_digest}"
+
+    def store(self, rendered: list[str]) -> None:
+        for page_number, uri in zip(self.dirty, rendered):
+            page_preview_cache.put(self.keys[page_number - 1], uri, storage_service)
+            self.pngs[page_number - 1] = uri
+
+
+def plan_preview(
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    template_digest: str,
+    page_count: int,
+) -> PreviewPlan:
+    """Look up every page in the preview cache and list the pages left to render."""
+    digests = page_value_digests(schema, current_values, page_count)
+    keys = [
+        (template_digest, schema.digest, page_number, digest, PREVIEW_DPI)
+        for page_number, digest in enumerate(digests, start=1)
+    ]
+    pngs = [page_preview_cache.get(key) for key in keys]
+    dirty = [page_number for page_number, uri in enumerate(pngs, start=1) if uri is None]
+    return PreviewPlan(
+        template_digest=template_digest,
+        keys=keys,
+        pngs=pngs,
+        dirty=dirty,
+        needs_fill=any(digests[page_number - 1] != EMPTY_PAGE_DIGEST for page_number in dirty),
+    )
+
+
+async def fill_with_preview(
+    form_id: str,
+    schema: CompiledSchema,
+    current_values: dict[str, Any],
+    orig_pdf_uri: str,
+    template_digest: str,
+    page_count: int,
+    *,
+    flatten: bool,
+) -> tuple[str, bytes | None]:
+    """
+    Write the delivery PDF and return (its URI, the filled preview document).
+
+    Nothing is rasterized here, so the caller can answer as soon as the PDF is
+    stored.  When preview pages with values are not cached yet, the interactive
+    document from the same fill comes back in memory; pass it to
+    `preview_scheduler.schedule` and the refresh renders from it instead of
+    filling again.  Otherwise the document is None.
+    """
+    plan = plan_preview(schema, current_values, template_digest, page_count)
+    artifacts = await pdf_writer.fill_and_render(
+        form_id,
+        schema,
+        current_values,
+        orig_pdf_uri,
+        storage_service,
+        flatten=flatten,
+        keep_source=plan.needs_fill,
+    )
+    return artifacts.delivery_uri, artifacts.preview_source
+
+
+def _render_and_store(
+    source: str | bytes,
+    page_numbers: list[int],
+    preview_kind: str,
+    dpi: int = PREVIEW_DPI,
+) -> list[str]:
+    with span("preview.render"):
+        images = render_pages_sync(source, page_numbers, dpi)
+    with span("preview.storage_write"):
+        return [
+            storage_service.save_bytes_sync(image, kind=preview_kind, suffix=preview_suffix())
+            for image in images
+        ]
+
+
+def focus_page(form_id: str, schema: CompiledSchema, current_values: dict[str, Any], dirty: list[int]) -> int:
+    """
+    The dirty page holding the most recently changed field: the last field whose
+    value differs from the form's previous broadcast.  Falls back to the first
+    dirty page.
+    """
+    for field_id in reversed(page_preview_cache.recent_fields(form_id, current_values)):
+        field = schema.by_id.get(field_id)
+        if field is not None and field.page in dirty:
+            return field.page
+    return dirty[0]
+
+
+async def _broadcast_delta(
+    form_id: str,
+    delta: PreviewDelta,
+    *,
+    version: int | None,
+    resolution: str,
+) -> None:
+    metrics.increment("preview.broadcast_pages", len(delta.pages))
+    metrics.increment("preview.broadcast_values", len(delta.values) + len(delta.removed_fields))
+    with span("preview.broadcast"):
+        await broadcast_preview(
+            form_id,
+            list(delta.pages.values()),
+            delta.values,
+            version=version,
+            changed_pages=list(delta.pages),
+            delta=True,
+            sequence=delta.sequence,
+            base_sequence=delta.base_sequence,
+            page_count=delta.page_count,
+            removed_fields=delta.removed_fields,
+            resolution=resolution,
+        )
 
 
 async def refresh_preview(
     form_id: str,
-    schema: FormSchema,
+    schema: CompiledSchema,
     current_values: dict[str, Any],
     orig_pdf_uri: str,
+    *,
+    version: int | None = None,
+    preview_source: bytes | None = None,
 ) -> None:
+    """
+    Re-render only the pages whose values changed and broadcast what changed.
+
+    Rendered pages are cached by (template hash, schema hash, page, hash of that
+    page's values, dpi); pages already in the cache are reused without filling or
+    rendering anything.  Pages with values are filled and rasterized in memory,
+    without writing a preview PDF to storage.  `preview_source`, the filled
+    document a /fill already produced for these values, is rendered from directly.
+
+    With PREVIEW_PROGRESSIVE, the page holding the most recently changed field is
+    first rendered at PREVIEW_LOW_DPI and broadcast with the changed values; the
+    dirty pages follow at PREVIEW_DPI, rendered from the same fill.  Broadcasts are
+    deltas against the previous one (see `PagePreviewCache.record_broadcast`).
+    """
     try:
-        print(f"[DEBUG] Starting preview refresh for form {form_id}")
-        preview_source_uri = orig_pdf_uri
-        if current_values:
-            preview_source_uri = await pdf_writer.write_filled_pdf(
-                form_id,
-                schema,
-                current_values,
-                orig_pdf_uri,
-                storage_service,
-                flatten=False,
-                output_kind=f"forms/{form_id}/preview",
-            )
-        print(f"[DEBUG] Generating previews from {preview_source_uri}")
-        pngs = await generate_previews(form_id, preview_source_uri, storage_service)
-        print(f"[DEBUG] Generated {len(pngs)} preview images: {pngs}")
-        await broadcast_preview(form_id, pngs, current_values)
-        print(f"[DEBUG] Broadcast complete for form {form_id}")
-    except Exception as exc:  # noqa: BLE001
-        print(f"[ERROR] preview generation failed for {form_id}: {exc}")
-        import traceback
-        traceback.print_exc()
+        logger.debug("Starting preview refresh for form %s", form_id)
+        orig_path = storage_service.path_from_uri(orig_pdf_uri)
+        with span("preview.template"):
+            template_digest, page_count = await pdf_executor.run(template_summary, str(orig_path))
+
+        plan = plan_preview(schema, current_values, template_digest, page_count)
+        if plan.dirty:
+            logger.debug("Rendering pages %s (filled: %s)", plan.dirty, plan.needs_fill)
+            source: str | bytes = preview_source if plan.needs_fill and preview_source else str(orig_path)
+            if PREVIEW_PROGRESSIVE:
+                page_number = focus_page(form_id, schema, current_values, plan.dirty)
+                low_key = plan.keys[page_number - 1][:4] + (PREVIEW_LOW_DPI,)
+                low_uri = page_preview_cache.get(low_key)
+                with span("preview.render_low"):
+                    if plan.needs_fill and isinstance(source, str):
+                        artifacts = await pdf_writer.fill_and_render(
+                            form_id,
+                            schema,
+                            current_values,
+                            orig_pdf_uri,
+                            storage_service,
+                            deliver=False,
+                            preview_pages=[] if low_uri is not None else [page_number],
+                            preview_dpi=PREVIEW_LOW_DPI,
+                            preview_kind=plan.preview_kind,
+                            keep_source=True,
+                        )
+                        source = artifacts.preview_source
+                        low_uri = low_uri or artifacts.preview_uris[0]
+                    elif low_uri is None:
+                        (low_uri,) = await pdf_executor.run(
+                            _render_and_store, source, [page_number], plan.preview_kind, PREVIEW_LOW_DPI
+                        )
+                page_preview_cache.put(low_key, low_uri, storage_service)
+                delta = page_preview_cache.record_broadcast(
+                    form_id, page_count, {page_number: low_uri}, current_values, storage_service
+                )
+                await _broadcast_delta(form_id, delta, version=version, resolution="low")
+
+            with span("preview.render_total"):
+                if plan.needs_fill and isinstance(source, str):
+                    artifacts = await pdf_writer.fill_and_render(
+                        form_id,
+                        schema,
+                        current_values,
+                        orig_pdf_uri,
+                        storage_service,
+                        deliver=False,
+                        preview_pages=plan.dirty,
+                        preview_dpi=PREVIEW_DPI,
+                        preview_kind=plan.preview_kind,
+                    )
+                    rendered = artifacts.preview_uris
+                else:
+                    rendered = await pdf_executor.run(_render_and_store, source, plan.dirty, plan.preview_kind)
+            plan.store(rendered)
+
+        delta = page_preview_cache.record_broadcast(
+            form_id, page_count, dict(enumerate(plan.pngs, start=1)), current_values, storage_service
+        )
+        logger.debug("Preview pages changed: %s of %d", list(delta.pages), page_count)
+        await _broadcast_delta(form_id, delta, version=version, resolution="full")
+        logger.debug("Broadcast complete for form %s", form_id)
+    except Exception:  # noqa: BLE001
+        logger.exception("Preview generation failed for %s", form_id)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from backend.services.compiled_schema import CompiledSchema
+from backend.services.instrumentation import span
+from backend.services.preview_refresh import refresh_preview
+
+
+@dataclass
+class _PreviewRequest:
+    schema: CompiledSchema
+    current_values: dict[str, Any]
+    orig_pdf_uri: str
+    version: int
+    preview_source: bytes | None = None
+
+
+@dataclass
+class _FormState:
+    pending: _PreviewRequest | None = None
+    timer: asyncio.TimerHandle | None = None
+    running: asyncio.Task | None = None
+
+
+class PreviewScheduler:
+    """
+    Coalescing, latest-wins scheduler for `refresh_preview`.
+
+    Requests for a form within the debounce window collapse into one refresh
+    with the latest values.  Starting a refresh cancels the form's in-flight one,
+    so a stale render can never broadcast after a fresh one, and a global semaphore
+    caps how many refreshes run at once.  Every request gets a version from a
+    process-wide monotonic counter; the broadcast carries the version it rendered.
+    """
+
+    def __init__(self, debounce: float, max_concurrency: int) -> None:
+        self.debounce = debounce
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._forms: dict[str, _FormState] = {}
+        self._versions = itertools.count(1)
+        self._waiting = 0
+        self.scheduled = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.completed = 0
+
+    def schedule(
+        self,
+        form_id: str,
+        schema: CompiledSchema,
+        current_values: dict[str, Any],
+        orig_pdf_uri: str,
+        preview_source: bytes | None = None,
+    ) -> int:
+        """
+        Queue a preview refresh for `form_id` and return the version it was given.
+        `preview_source` is a filled document for exactly `current_values`, which
+        the refresh renders from instead of filling again.
+        """
+        state = self._forms.setdefault(form_id, _FormState())
+        if state.pending is not None:
+            self.coalesced += 1
+        version = next(self._versions)
+        state.pending = _PreviewRequest(schema, dict(current_values), orig_pdf_uri, version, preview_source)
+        self.scheduled += 1
+
+        if state.timer is not None:
+            state.timer.cancel()
+        loop = asyncio.get_running_loop()
+        state.timer = loop.call_later(self.debounce, self._dispatch, form_id)
+        return version
+
+    def _dispatch(self, form_id: str) -> None:
+        state = self._forms.get(form_id)
+        if state is None or state.pending is None:
+            return
+        request, state.pending, state.timer = state.pending, None, None
+
+        if state.running is not None and not state.running.done():
+            state.running.cancel()
+            self.cancelled += 1
+        state.running = asyncio.create_task(self._run(form_id, request))
+
+    async def _run(self, form_id: str, request: _PreviewRequest) -> None:
+        try:
+            self._waiting += 1
+            try:
+                with span("preview.queue_wait"):
+                    await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+            try:
+                with span("preview.total"):
+                    await refresh_preview(
+                        form_id,
+                        request.schema,
+                        request.current_values,
+                        request.orig_pdf_uri,
+                        version=request.version,
+                        preview_source=request.preview_source,
+                    )
+                self.completed += 1
+            finally:
+                self._semaphore.release()
+        finally:
+            state = self._forms.get(form_id)
+            if state is not None and state.running is asyncio.current_task():
+                state.running = None
+                if state.pending is None and state.timer is None:
+                    del self._forms[form_id]
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "debounce_seconds": self.debounce,
+            "max_concurrency": self.max_concurrency,
+            "pending": sum(1 for state in self._forms.values() if state.pending is not None),
+            "running": sum(
+                1 for state in self._forms.values()
+                if state.running is not None and not state.running.done()
+            ) - self._waiting,
+            "waiting": self._waiting,
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "completed": self.completed,
+        }
+
+
+preview_scheduler = PreviewScheduler(
+    debounce=float(os.getenv("PREVIEW_DEBOUNCE_SECONDS", "0.3")),
+    max_concurrency=int(os.getenv("PREVIEW_MAX_CONCURRENCY", "4")),
+)
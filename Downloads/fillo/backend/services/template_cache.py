@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+
+import pikepdf
+
+from backend.services.pdf_field_index import FieldIndex, ObjGen
+
+
+@dataclass
+class TemplateEntry:
+    """
+    A parsed original PDF plus the metadata derived from it.
+
+    The original is memory-mapped read-only instead of read onto the heap, so every
+    process that maps the same stored template (uvicorn workers, PDF executor
+    processes) shares one copy of it in the OS page cache.  Stored originals are
+    immutable, which is what makes the mapping safe to keep.
+
+    The entry itself is never modified.  Each fill gets its own working copy via
+    `open()`, which QPDF maps from the same file: it only reads the xref up front and
+    loads objects on demand, so objects a fill never touches are copied straight
+    through on save.
+    """
+
+    digest: str
+    path: str
+    data: mmap.mmap
+    field_index: FieldIndex
+    page_sizes: list[tuple[float, float]]
+    # Highest object number in the file; new objects on a working copy are numbered past it
+    max_objnum: int
+    # (objnum, gen) -> appearance states available under /AP/N, for checkboxes/radios
+    checkbox_states: dict[ObjGen, tuple[str, ...]] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def open(self) -> pikepdf.Pdf:
+        try:
+            return pikepdf.open(self.path, access_mode=pikepdf.AccessMode.mmap)
+        except FileNotFoundError:
+            # Moved away since it was mapped (the mapping outlives the path): parse a copy
+            return pikepdf.open(BytesIO(self.data))
+
+
+def _map_file(path: str) -> mmap.mmap:
+    with open(path, "rb") as fh:
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _build_entry(digest: str, path: str, data: mmap.mmap) -> TemplateEntry:
+    with pikepdf.open(path, access_mode=pikepdf.AccessMode.mmap) as pdf:
+        field_index = FieldIndex.build(pdf)
+
+        page_sizes = []
+        for page in pdf.pages:
+            x1, y1, x2, y2 = (float(v) for v in page.mediabox)
+            page_sizes.append((abs(x2 - x1), abs(y2 - y1)))
+
+        checkbox_states: dict[ObjGen, tuple[str, ...]] = {}
+        for objgen in field_index.objgens():
+            obj = pdf.get_object(objgen)
+            if "/AP" in obj and "/N" in obj.AP and isinstance(obj.AP.N, pikepdf.Dictionary):
+                checkbox_states[objgen] = tuple(str(key) for key in obj.AP.N.keys())
+
+        # Read from the cross-reference table, so no object is resolved for it
+        max_objnum = max((objgen[0] for objgen in pdf.get_xref_table()), default=0)
+
+    return TemplateEntry(
+        digest=digest,
+        path=path,
+        data=data,
+        field_index=field_index,
+        page_sizes=page_sizes,
+        max_objnum=max_objnum,
+        checkbox_states=checkbox_states,
+    )
+
+
+class TemplateCache:
+    """
+    Bounded LRU cache of parsed templates keyed by the content hash of the file.
+
+    Original PDFs are immutable once stored, so the (path, mtime, size) -> digest
+    mapping is memoized as well and a hit never rereads the file.  `max_bytes`
+    bounds the mapped size of the cached originals.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, TemplateEntry] = OrderedDict()
+        self._digests: dict[tuple[str, int, int], str] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str | Path) -> TemplateEntry:
+        path = str(path)
+        stat = os.stat(path)
+        stat_key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            digest = self._digests.get(stat_key)
+            entry = self._entries.get(digest) if digest else None
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry
+
+        data = _map_file(path)
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            self._digests[stat_key] = digest
+            entry = self._entries.get(digest)
+            if entry is not None:
+                # Same content stored under another path
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = _build_entry(digest, path, data)
+
+        with self._lock:
+            if digest not in self._entries:
+                self._entries[digest] = entry
+                self._bytes += entry.size
+                self._evict()
+        return entry
+
+    def digest_for(self, path: str | Path) -> str:
+        return self.get(path).digest
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            digest, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+            for stat_key in [key for key, value in self._digests.items() if value == digest]:
+                del self._digests[stat_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def template_summary(path: str | Path) -> tuple[str, int]:
+    """(content hash, page count) of a template, for callers that don't need the document."""
+    entry = template_cache.get(path)
+    return entry.digest, len(entry.page_sizes)
+
+
+template_cache = TemplateCache(
+    max_entries=int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "64")),
+    max_bytes=int(os.getenv("TEMPLATE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from backend.benchmarks.suite import LocalStorage
+from backend.benchmarks.synthetic_form import FormSpec, generate_form, sample_values
+
+
+@pytest.fixture
+def storage(tmp_path: Path) -> LocalStorage:
+    """Filesystem storage under the test's temporary directory."""
+    return LocalStorage(str(tmp_path / "storage"))
+
+
+@pytest.fixture
+def small_form(tmp_path: Path) -> tuple[Path, dict[str, Any], dict[str, Any]]:
+    """A one-page synthetic AcroForm: (pdf path, serialized schema, sample values)."""
+    path = tmp_path / "form.pdf"
+    schema_data = generate_form(FormSpec(pages=1, text_fields=6, checkboxes=2, radios=1), str(path))
+    return path, schema_data, sample_values(schema_data)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+
+from backend.schemas.form_schema import FormSchema
+from backend.services.compiled_schema import CompiledSchemaCache, InvalidValue, schema_digest
+
+
+@pytest.fixture
+def schema(small_form):
+    _, schema_data, _ = small_form
+    schema_data = {
+        **schema_data,
+        "fields": [
+            *schema_data["fields"],
+            {"id": "ssn", "label": "SSN", "type": "ssn", "page": 1, "rect": [10, 10, 120, 30]},
+            {"id": "income", "label": "Income", "type": "number", "page": 1, "rect": [10, 40, 120, 60]},
+        ],
+    }
+    return CompiledSchemaCache(max_entries=4).get(schema_data)
+
+
+def _field_of_type(schema, field_type: str) -> str:
+    return schema.by_type[field_type][0].id
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("123456789", "123-45-6789"), ("123 45 6789", "123-45-6789"), ("12-345", "12-345")],
+)
+def test_ssn_nine_digits_are_dashed(schema, value, expected):
+    assert schema.normalize("ssn", value) == expected
+
+
+@pytest.mark.parametrize(("value", "expected"), [("$1,250.50", "1250.50"), (42, "42"), (" 3.5 ", "3.5")])
+def test_number_drops_currency_and_grouping(schema, value, expected):
+    assert schema.normalize("income", value) == expected
+
+
+@pytest.mark.parametrize("value", ["twelve", True, [1]])
+def test_number_rejects_non_numbers(schema, value):
+    with pytest.raises(InvalidValue):
+        schema.normalize("income", value)
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [(True, True), ("Yes", True), ("x", True), (1, True), ("off", False), ("", False), (0, False)],
+)
+def test_checkbox_words(schema, value, expected):
+    assert schema.normalize(_field_of_type(schema, "checkbox"), value) is expected
+
+
+@pytest.mark.parametrize("value", ["maybe", 2.5, {"on": True}])
+def test_checkbox_rejects_other_values(schema, value):
+    with pytest.raises(InvalidValue):
+        schema.normalize(_field_of_type(schema, "checkbox"), value)
+
+
+def test_radio_keeps_option_names(schema):
+    radio = _field_of_type(schema, "radio")
+    assert schema.normalize(radio, "Female") == "Female"
+    with pytest.raises(InvalidValue):
+        schema.normalize(radio, ["Female"])
+
+
+def test_text_keeps_scalars_and_none_clears(schema):
+    text = _field_of_type(schema, "text")
+    assert schema.normalize(text, 7) == "7"
+    assert schema.normalize(text, None) is None
+    with pytest.raises(InvalidValue):
+        schema.normalize(text, {"a": 1})
+    with pytest.raises(KeyError):
+        schema.normalize("no_such_field", "x")
+
+
+def test_model_and_stored_dict_share_a_digest(small_form):
+    _, schema_data, _ = small_form
+    model = FormSchema.model_validate(schema_data)
+    stored = model.model_dump(mode="json")
+    reordered = dict(reversed(list(stored.items())))
+    assert schema_digest(model) == schema_digest(stored) == schema_digest(reordered)
+
+    cache = CompiledSchemaCache(max_entries=4)
+    assert cache.get(model) is cache.get(stored)
+    assert cache.stats()["misses"] == 1
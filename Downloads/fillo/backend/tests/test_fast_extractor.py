@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+
+from backend.services.compiled_schema import CompiledSchemaCache
+from backend.services.fast_extractor import extract
+
+
+def _field(field_id: str, label: str, field_type: str, top: float) -> dict:
+    return {"id": field_id, "label": label, "type": field_type, "page": 1, "rect": [10, top, 200, top + 20]}
+
+
+@pytest.fixture(scope="module")
+def schema():
+    return CompiledSchemaCache(max_entries=1).get(
+        {
+            "fields": [
+                _field("full_name", "Full name", "text", 700),
+                _field("dob", "Date of birth", "date", 670),
+                _field("ssn", "Social security number", "ssn", 640),
+                _field("phone", "Home phone", "phone", 610),
+                _field("income", "Annual income", "number", 580),
+                _field("married", "Married", "checkbox", 550),
+            ]
+        }
+    )
+
+
+def test_typed_clauses_resolve_without_the_model(schema):
+    result = extract(schema, "SSN 123-45-6789, DOB 4/1/1990; home phone 555-123-4567 and check married")
+    assert result.applied == {
+        "ssn": "123-45-6789",
+        "dob": "4/1/1990",
+        "phone": "555-123-4567",
+        "married": True,
+    }
+    assert not result.needs_model
+
+
+@pytest.mark.parametrize(
+    ("utterance", "expected"),
+    [("income $85,000", "85000"), ("income 1,250,000.50", "1250000.50"), ("income 4200", "4200")],
+)
+def test_thousands_separators(schema, utterance, expected):
+    assert extract(schema, utterance).applied == {"income": expected}
+
+
+@pytest.mark.parametrize(
+    "utterance", ["income 1,2", "income 1,2345", "income 12,34,567", "income 3,5 and DOB 4/1/1990"]
+)
+def test_ambiguous_comma_numbers_go_to_the_model(schema, utterance):
+    result = extract(schema, utterance)
+    assert "income" not in result.applied
+    assert result.leftover.startswith("income")
+    assert result.needs_model
+
+
+def test_comma_before_text_still_splits_clauses(schema):
+    result = extract(schema, "income 5000,DOB 4/1/1990")
+    assert result.applied == {"income": "5000", "dob": "4/1/1990"}
+
+
+def test_unresolved_clauses_are_left_over(schema):
+    result = extract(schema, "my name is Ann Lee, income 40000")
+    assert result.applied == {"income": "40000"}
+    assert result.leftover == "my name is Ann Lee"
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from backend.services.fill_cache import FillResultCache, fill_key
+
+
+def _write(storage, name: str = "output") -> str:
+    return storage.save_bytes_sync(name.encode(), kind="forms/f", suffix=".pdf")
+
+
+def _exists(storage, uri: str) -> bool:
+    return storage.path_from_uri(uri).exists()
+
+
+def test_fill_key_ignores_value_order():
+    first = fill_key("t", "s", {"a": 1, "b": "x"}, True, "v1")
+    assert first == fill_key("t", "s", {"b": "x", "a": 1}, True, "v1")
+    assert first != fill_key("t", "s", {"a": 1, "b": "x"}, False, "v1")
+
+
+def test_lookup_returns_recorded_output(storage):
+    cache = FillResultCache(max_entries=4)
+    uri = _write(storage)
+    cache.produced(uri)
+    cache.record("form-1", "key", uri, None, storage)
+    assert cache.lookup("key", storage) == uri
+    assert cache.lookup("other", storage) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_released_fresh_output_is_deleted(storage):
+    # The /fill commit failed: the produced output is never recorded
+    cache = FillResultCache(max_entries=4)
+    uri = _write(storage)
+    cache.produced(uri)
+    cache.release(uri, storage)
+    assert not _exists(storage, uri)
+    assert cache.stats()["collected"] == 1
+    assert cache.stats()["pinned"] == 0
+
+
+def test_released_lookup_keeps_the_cached_output(storage):
+    cache = FillResultCache(max_entries=4)
+    uri = _write(storage)
+    cache.produced(uri)
+    cache.record("form-1", "key", uri, None, storage)
+    assert cache.lookup("key", storage) == uri
+    cache.release(uri, storage)
+    assert _exists(storage, uri)
+
+
+def test_pinned_lookup_survives_eviction(storage):
+    cache = FillResultCache(max_entries=1)
+    first = _write(storage, "first")
+    cache.produced(first)
+    cache.record("form-1", "first", first, None, storage)
+    assert cache.lookup("first", storage) == first
+
+    # form-1 moves on and "first" is evicted while a second fill still holds it
+    second = _write(storage, "second")
+    cache.produced(second)
+    cache.record("form-1", "second", second, first, storage)
+    assert _exists(storage, first)
+
+    cache.record("form-2", "first", first, None, storage)
+    assert _exists(storage, first)
+
+
+def test_unreferenced_outputs_are_collected(storage):
+    cache = FillResultCache(max_entries=1)
+    first = _write(storage, "first")
+    cache.produced(first)
+    cache.record("form-1", "first", first, None, storage)
+    second = _write(storage, "second")
+    cache.produced(second)
+    cache.record("form-1", "second", second, first, storage)
+    assert not _exists(storage, first)
+    assert _exists(storage, second)
+
+
+def test_outputs_of_other_processes_are_never_deleted(storage):
+    cache = FillResultCache(max_entries=4)
+    foreign = _write(storage, "foreign")
+    uri = _write(storage)
+    cache.produced(uri)
+    cache.record("form-1", "key", uri, foreign, storage)
+    cache.release(foreign, storage)
+    assert _exists(storage, foreign)
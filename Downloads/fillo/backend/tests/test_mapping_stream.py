@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from backend.services.mapping_stream import MappingStreamParser
+
+
+def _feed_chars(parser: MappingStreamParser, text: str) -> list[list[tuple[str, object]]]:
+    return [parser.feed(char) for char in text]
+
+
+def test_flat_members_are_emitted_as_they_complete() -> None:
+    parser = MappingStreamParser()
+    assert parser.feed('{"name": "Ann", "age"') == [("name", "Ann")]
+    assert parser.feed(": 3") == []
+    assert parser.feed("}") == [("age", 3)]
+    assert parser.complete
+
+
+def test_applied_shape_emits_members_and_collects_unmatched() -> None:
+    parser = MappingStreamParser()
+    text = '{"applied": {"name": "Ann", "dob": "2001-02-03"}, "unmatched": ["pet"]}'
+    pairs = [pair for batch in _feed_chars(parser, text) for pair in batch]
+    assert pairs == [("name", "Ann"), ("dob", "2001-02-03")]
+    assert parser.unmatched == ["pet"]
+    assert parser.complete
+
+
+def test_structural_characters_inside_strings_are_ignored() -> None:
+    parser = MappingStreamParser()
+    text = '{"address": "1 Main St, {Apt} \\"B\\"", "tags": ["a", "b"]}'
+    pairs = [pair for batch in _feed_chars(parser, text) for pair in batch]
+    assert pairs == [("address", '1 Main St, {Apt} "B"'), ("tags", ["a", "b"])]
+
+
+def test_text_around_the_object_is_ignored() -> None:
+    parser = MappingStreamParser()
+    pairs = parser.feed('```json\n{"name": "Ann"}\n```\nDone, {"extra": 1}')
+    assert pairs == [("name", "Ann")]
+    assert parser.feed('{"late": 2}') == []
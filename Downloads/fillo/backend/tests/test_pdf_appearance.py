@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import pikepdf
+import pytest
+
+from backend.services.pdf_appearance import AppearanceBuilder
+
+
+def _text_field(pdf: pikepdf.Pdf) -> pikepdf.Dictionary:
+    return next(field for field in pdf.Root.AcroForm.Fields if field.get("/FT") == "/Tx")
+
+
+def test_latin_value_gets_an_appearance_stream(small_form):
+    path, _, _ = small_form
+    with pikepdf.open(path) as pdf:
+        field = _text_field(pdf)
+        changed: set = set()
+        assert AppearanceBuilder(pdf).apply(field, "Zoë Müller – 5 €", changed) == 1
+        assert b"(Zo\xeb M\xfcller \x96 5 \x80) Tj" in field.AP.N.read_bytes()
+        assert not pdf.Root.AcroForm.get("/NeedAppearances", False)
+
+
+@pytest.mark.parametrize("value", ["Ζωή Παπαδοπούλου", "山田 太郎", "Ann 🙂"])
+def test_value_outside_winansi_is_left_to_the_viewer(small_form, value):
+    path, _, _ = small_form
+    with pikepdf.open(path) as pdf:
+        field = _text_field(pdf)
+        field.AP = pikepdf.Dictionary(N=pdf.make_indirect(pikepdf.Stream(pdf, b"")))
+        changed: set = set()
+        assert AppearanceBuilder(pdf).apply(field, value, changed) == 0
+        assert "/AP" not in field
+        assert pdf.Root.AcroForm.NeedAppearances
+        assert pdf.Root.AcroForm.objgen in changed
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from backend.services.pdf_executor import PdfExecutor, PdfExecutorBusy, PdfTaskTimeout
+from backend.services.template_cache import template_cache
+
+
+def test_start_preloads_templates_before_the_first_task(small_form):
+    path = str(small_form[0])
+    template_cache.clear()
+    executor = PdfExecutor("thread", max_workers=2, max_pending=4, timeout=5, preload_paths=(path,))
+
+    async def scenario() -> None:
+        await executor.start()
+        assert executor.metrics()["started"]
+        assert template_cache.stats()["entries"] == 1
+        hits = template_cache.stats()["hits"]
+        await executor.run(template_cache.get, path)
+        assert template_cache.stats()["hits"] == hits + 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert not executor.metrics()["started"]
+
+
+def test_timed_out_task_keeps_its_slot_until_it_finishes():
+    executor = PdfExecutor("thread", max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+
+    async def scenario() -> None:
+        with pytest.raises(PdfTaskTimeout):
+            await executor.run(release.wait, 5)
+        with pytest.raises(PdfExecutorBusy):
+            await executor.run(int)
+        release.set()
+        for _ in range(100):
+            if executor.metrics()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await executor.run(int, "7") == 7
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import pikepdf
+import pytest
+
+from backend.services.pdf_field_index import FieldIndex
+
+# The page-only widget is deliberate
+pytestmark = pytest.mark.filterwarnings("ignore:This document has .* not reachable from /AcroForm")
+
+
+@pytest.fixture
+def field_pdf(tmp_path):
+    """Fields under /AcroForm (flat, nested and oddly named) plus one page-only widget."""
+    pdf = pikepdf.new()
+    page = pdf.add_blank_page()
+
+    def widget(**entries) -> pikepdf.Dictionary:
+        return pdf.make_indirect(
+            pikepdf.Dictionary(Type=pikepdf.Name.Annot, Subtype=pikepdf.Name.Widget, Rect=[0, 0, 10, 10], **entries)
+        )
+
+    plain = widget(T="1001")
+    radio = widget(T="1020 Radio Button 1")
+    prefixed = widget(T="parent_2002")
+    spaced = widget(T="first name")
+    kid = widget(T="name")
+    section = pdf.make_indirect(pikepdf.Dictionary(T="section", Kids=pikepdf.Array([kid])))
+    kid.Parent = section
+    # Same partial name as a top-level field, one level down
+    shadow = widget(T="1001")
+    group = pdf.make_indirect(pikepdf.Dictionary(T="group", Kids=pikepdf.Array([shadow])))
+    page_only = widget(T="page_only")
+
+    pdf.Root.AcroForm = pdf.make_indirect(
+        pikepdf.Dictionary(Fields=pikepdf.Array([group, plain, radio, prefixed, spaced, section]))
+    )
+    page.obj.Annots = pikepdf.Array([plain, radio, prefixed, spaced, kid, shadow, page_only])
+    path = tmp_path / "fields.pdf"
+    pdf.save(path)
+    return path
+
+
+def _name(pdf: pikepdf.Pdf, index: FieldIndex, field_id: str, **kwargs) -> str | None:
+    field = index.find(pdf, field_id, **kwargs)
+    return None if field is None else str(field.T)
+
+
+def test_exact_and_sanitized_ids(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+        assert _name(pdf, index, "1001") == "1001"
+        assert _name(pdf, index, "f_1001") == "1001"
+        assert _name(pdf, index, "field_1001") == "1001"
+        assert _name(pdf, index, "first_name") == "first name"
+        assert _name(pdf, index, "missing") is None
+
+
+def test_top_level_field_wins_name_collisions(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+        found = index.find(pdf, "1001")
+        assert "/Parent" not in found
+        assert index.find(pdf, "group.1001").objgen != found.objgen
+
+
+def test_qualified_names_for_kids(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+        assert _name(pdf, index, "section.name") == "name"
+        assert _name(pdf, index, "name") == "name"
+
+
+def test_suffix_match_is_opt_in(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+        assert _name(pdf, index, "2002") is None
+        assert _name(pdf, index, "2002", match_suffix=True) == "parent_2002"
+
+
+def test_prefix_before_space(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+        assert _name(pdf, index, "1020") == "1020 Radio Button 1"
+        assert _name(pdf, index, "f_1020") == "1020 Radio Button 1"
+
+
+def test_widgets_only_on_pages_are_indexed(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+        assert _name(pdf, index, "page_only") == "page_only"
+        assert index.names.count("1001") == 1
+
+
+def test_index_resolves_in_another_open_of_the_file(field_pdf):
+    with pikepdf.open(field_pdf) as pdf:
+        index = FieldIndex.build(pdf)
+    with pikepdf.open(field_pdf) as other:
+        field = index.find(other, "section.name")
+        field.V = pikepdf.String("written")
+        assert str(other.Root.AcroForm.Fields[5].Kids[0].V) == "written"
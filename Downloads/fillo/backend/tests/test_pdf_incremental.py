@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import pikepdf
+import pytest
+
+from backend.services.pdf_incremental import build_incremental_update, created_objgens
+from backend.services.template_cache import template_cache
+
+
+def _with_xref_stream(path):
+    out = path.with_name("form_xref_stream.pdf")
+    with pikepdf.open(path) as pdf:
+        pdf.save(out, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    return out
+
+
+def _first_text_widget(pdf: pikepdf.Pdf) -> pikepdf.Dictionary:
+    return next(field for field in pdf.Root.AcroForm.Fields if field.get("/FT") == "/Tx")
+
+
+def _fill_with_new_appearance(pdf: pikepdf.Pdf) -> set:
+    """Set a value and give the widget a new appearance stream with a new font."""
+    # Created but never referenced: leaves a gap in the new object numbers
+    pdf.make_indirect(pikepdf.Dictionary(Orphan=True))
+    widget = _first_text_widget(pdf)
+    widget.V = pikepdf.String("incremental value")
+    font = pdf.make_indirect(
+        pikepdf.Dictionary(Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name.Courier)
+    )
+    appearance = pikepdf.Stream(pdf, b"BT /Cour 10 Tf 2 4 Td (incremental value) Tj ET")
+    appearance.Type = pikepdf.Name.XObject
+    appearance.Subtype = pikepdf.Name.Form
+    appearance.BBox = [0, 0, 160, 16]
+    appearance.Resources = pikepdf.Dictionary(Font=pikepdf.Dictionary(Cour=font))
+    widget.AP = pikepdf.Dictionary(N=pdf.make_indirect(appearance))
+    return {widget.objgen}
+
+
+@pytest.mark.parametrize("xref_stream", [False, True])
+def test_update_round_trips_through_pikepdf(small_form, tmp_path, xref_stream):
+    path = small_form[0]
+    if xref_stream:
+        path = _with_xref_stream(path)
+    template = template_cache.get(path)
+    with template.open() as pdf:
+        changed = _fill_with_new_appearance(pdf)
+        delta = build_incremental_update(template.data, pdf, changed, template.max_objnum)
+
+    out = tmp_path / "filled.pdf"
+    out.write_bytes(bytes(template.data) + delta)
+    with pikepdf.open(out) as filled:
+        widget = _first_text_widget(filled)
+        assert str(widget.V) == "incremental value"
+        appearance = widget.AP.N
+        assert appearance.read_bytes().endswith(b"(incremental value) Tj ET")
+        assert appearance.Resources.Font.Cour.BaseFont == "/Courier"
+        assert len(filled.pages) == len(template.page_sizes)
+        assert filled.check_pdf_syntax() == []
+
+
+def test_update_skips_unreferenced_and_unchanged_objects(small_form):
+    template = template_cache.get(small_form[0])
+    with template.open() as pdf:
+        changed = _fill_with_new_appearance(pdf)
+        created = created_objgens(pdf, changed, template.max_objnum)
+        delta = build_incremental_update(template.data, pdf, changed, template.max_objnum)
+
+    # The appearance stream and its font, but not the orphan
+    assert len(created) == 2
+    assert all(num > template.max_objnum for num, _ in created)
+    assert delta.count(b" 0 obj\n") == len(changed) + len(created)
+
+
+def test_update_chains_to_the_original_xref(small_form):
+    template = template_cache.get(small_form[0])
+    with template.open() as pdf:
+        delta = build_incremental_update(template.data, pdf, set(), template.max_objnum)
+    assert b"/Prev " in delta
+    assert delta.rstrip().endswith(b"%%EOF")
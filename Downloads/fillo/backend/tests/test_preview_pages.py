@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from backend.services.preview_pages import PagePreviewCache
+
+
+def _image(storage, name: str) -> str:
+    return storage.save_bytes_sync(name.encode(), kind="previews", suffix=".png")
+
+
+def test_first_broadcast_carries_everything(storage):
+    cache = PagePreviewCache(max_entries=8, max_forms=8)
+    one, two = _image(storage, "p1"), _image(storage, "p2")
+    delta = cache.record_broadcast("form", 2, {1: one, 2: two}, {"name": "Ann"}, storage)
+    assert (delta.sequence, delta.base_sequence, delta.page_count) == (1, 0, 2)
+    assert delta.pages == {1: one, 2: two}
+    assert delta.values == {"name": "Ann"}
+    assert delta.removed_fields == []
+
+
+def test_later_broadcasts_carry_only_changes(storage):
+    cache = PagePreviewCache(max_entries=8, max_forms=8)
+    one, two, two_b = _image(storage, "p1"), _image(storage, "p2"), _image(storage, "p2b")
+    cache.record_broadcast("form", 2, {1: one, 2: two}, {"name": "Ann", "age": "3"}, storage)
+
+    delta = cache.record_broadcast("form", 2, {1: one, 2: two_b}, {"name": "Ann", "city": "Oslo"}, storage)
+    assert (delta.sequence, delta.base_sequence) == (2, 1)
+    assert delta.pages == {2: two_b}
+    assert delta.values == {"city": "Oslo"}
+    assert delta.removed_fields == ["age"]
+    assert cache.broadcast_state("form") == {
+        "sequence": 2,
+        "pages": [one, two_b],
+        "values": {"name": "Ann", "city": "Oslo"},
+    }
+
+
+def test_value_only_broadcast_keeps_pages(storage):
+    cache = PagePreviewCache(max_entries=8, max_forms=8)
+    one = _image(storage, "p1")
+    cache.record_broadcast("form", 1, {1: one}, {}, storage)
+
+    delta = cache.record_broadcast("form", None, {}, {"name": "Ann"}, storage)
+    assert delta.page_count == 1
+    assert delta.pages == {}
+    assert delta.values == {"name": "Ann"}
+    assert cache.broadcast_state("form")["pages"] == [one]
+
+    unchanged = cache.record_broadcast("form", None, {}, None, storage)
+    assert (unchanged.sequence, unchanged.values, unchanged.removed_fields) == (3, {}, [])
+
+
+def test_replaced_page_image_is_collected_unless_cached(storage):
+    cache = PagePreviewCache(max_entries=8, max_forms=8)
+    shown, cached, fresh = _image(storage, "a"), _image(storage, "b"), _image(storage, "c")
+    cache.put(("t", "s", 1, "v", 144), cached, storage)
+    cache.record_broadcast("form", 2, {1: shown, 2: cached}, None, storage)
+
+    cache.record_broadcast("form", 2, {1: fresh, 2: fresh}, None, storage)
+    assert not storage.path_from_uri(shown).exists()
+    assert storage.path_from_uri(cached).exists()
+    assert cache.stats()["collected"] == 1
+
+
+def test_shrinking_page_count_drops_trailing_pages(storage):
+    cache = PagePreviewCache(max_entries=8, max_forms=8)
+    one, two = _image(storage, "p1"), _image(storage, "p2")
+    cache.record_broadcast("form", 2, {1: one, 2: two}, None, storage)
+
+    delta = cache.record_broadcast("form", 1, {}, None, storage)
+    assert delta.page_count == 1
+    assert cache.broadcast_state("form")["pages"] == [one]
+    assert not storage.path_from_uri(two).exists()
+
+
+def test_recent_fields_fall_back_to_the_last_change(storage):
+    cache = PagePreviewCache(max_entries=8, max_forms=8)
+    assert cache.recent_fields("form", {"a": 1}) == ["a"]
+    cache.record_broadcast("form", 0, {}, {"a": 1}, storage)
+    cache.record_broadcast("form", 0, {}, {"a": 1, "b": 2}, storage)
+    assert cache.recent_fields("form", {"a": 1, "b": 2}) == ["b"]
+    assert cache.recent_fields("form", {"a": 5}) == ["a", "b"]
@@ -4,6 +4,7 @@ import { FormEvent, useEffect, useMemo, useState } from 'react';
 import { v4 as uuid } from 'uuid';
 
 import { mapValues } from '../lib/api';
+import { streamMapValues } from '../lib/mapStream';
 import { useFormStore } from '../lib/store';
 import { formatFieldValue } from '../lib/validators';
 import { ChatMessage, FieldDefinition } from '../lib/types';
@@ -27,6 +28,8 @@ export function ChatPanel() {
   const [input, setInput] = useState('');
   const [isSending, setIsSending] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Values the mapper has streamed so far for the in-flight request
+  const [streamedValues, setStreamedValues] = useState<typeof currentValues>({});
 
   useEffect(() => {
     if (highlighted.length === 0) {
@@ -41,6 +44,11 @@ export function ChatPanel() {
     return Object.fromEntries(schema.fields.map((field) => [field.id, field]));
   }, [schema]);
 
+  const streamedFields = useMemo(
+    () => Object.entries(streamedValues).filter(([fieldId]) => fieldLookup[fieldId]),
+    [streamedValues, fieldLookup]
+  );
+
   const handleSubmit = async (event: FormEvent<HTMLFormElement>) => {
     event.preventDefault();
     if (!formId || input.trim() === '') {
@@ -58,7 +66,9 @@ export function ChatPanel() {
     addMessage(userMessage);
 
     try {
-      const result = await mapValues(formId, input.trim(), 'append');
+      const result = await streamMapValues(formId, input.trim(), (values) =>
+        setStreamedValues((prev) => ({ ...prev, ...values }))
+      );
       applyMapResult(result);
       addMessage({
         id: uuid(),
@@ -80,6 +90,7 @@ export function ChatPanel() {
       });
     } finally {
       setIsSending(false);
+      setStreamedValues({});
     }
   };
 
@@ -132,7 +143,10 @@ export function ChatPanel() {
             const field = fieldLookup[fieldId];
             if (!field) return null;
             return (
-              <li key={fieldId} className={highlighted.includes(fieldId) ? 'text-emerald-400' : 'text-slate-200'}>
+              <li
+                key={fieldId}
+                className={highlighted.includes(fieldId) || fieldId in streamedValues ? 'text-emerald-400' : 'text-slate-200'}
+              >
                 <span className="font-medium">{field.label}:</span> {formatFieldValue(field, value)}
               </li>
             );
@@ -142,6 +156,25 @@ export function ChatPanel() {
     );
   };
 
+  const renderStreamedFields = () => {
+    if (!isSending || streamedFields.length === 0) {
+      return null;
+    }
+    return (
+      <div className="rounded-md border border-emerald-500/40 bg-slate-900/60 p-3 text-sm">
+        <div className="mb-2 font-semibold text-emerald-300">Filling in…</div>
+        <ul className="space-y-1">
+          {streamedFields.map(([fieldId, value]) => (
+            <li key={fieldId} className="animate-pulse text-emerald-400">
+              <span className="font-medium">{fieldLookup[fieldId].label}:</span>{' '}
+              {formatFieldValue(fieldLookup[fieldId], value)}
+            </li>
+          ))}
+        </ul>
+      </div>
+    );
+  };
+
   return (
     <div className="flex h-full flex-col gap-4">
       <div className="flex-1 overflow-y-auto rounded-lg bg-slate-900/70 p-4 shadow-inner">
@@ -166,6 +199,7 @@ export function ChatPanel() {
         )}
       </div>
 
+      {renderStreamedFields()}
       {renderFieldSummary()}
 
       <form onSubmit={handleSubmit} className="space-y-3">
@@ -0,0 +1,57 @@
+import type { mapValues } from './api';
+
+type MapResult = Awaited<ReturnType<typeof mapValues>>;
+type FieldValues = MapResult['applied_values'];
+
+type MapStreamEvent =
+  | { type: 'values'; values: FieldValues }
+  | ({ type: 'result' } & MapResult)
+  | { type: 'error'; detail: string };
+
+const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL ?? 'http://localhost:8000';
+
+/**
+ * Append-mode mapping over POST /map/stream.  `onValues` gets each batch of fields
+ * as the model produces it; the promise resolves with the same result /map returns
+ * once the values are saved.
+ */
+export async function streamMapValues(
+  formId: string,
+  text: string,
+  onValues: (values: FieldValues) => void
+): Promise<MapResult> {
+  const response = await fetch(`${API_BASE}/map/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ form_id: formId, text })
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Mapping failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+      if (!chunk.startsWith('data: ')) continue;
+      const event = JSON.parse(chunk.slice('data: '.length)) as MapStreamEvent;
+      if (event.type === 'values') {
+        onValues(event.values);
+      } else if (event.type === 'error') {
+        throw new Error(event.detail);
+      } else {
+        const { type: _type, ...result } = event;
+        return result as MapResult;
+      }
+    }
+  }
+  throw new Error('Mapping stream ended without a result');
+}